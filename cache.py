@@ -0,0 +1,132 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+
+
+# increase when the format of the cached objects changes
+CACHE_VERSION = 1
+
+
+def cache_folder():
+    '''
+    Returns the folder of the on-disk cache
+
+    The folder is taken from the AXLS_CACHE_DIR environment variable, by
+    default it is ~/.cache/axls
+    '''
+    folder = os.environ.get("AXLS_CACHE_DIR")
+    if not folder:
+        folder = os.path.join(os.path.expanduser("~"), ".cache", "axls")
+    return folder
+
+
+def cache_key(files=(), values=()):
+    '''
+    Computes the key of a cache entry from the content of some files and
+    some extra values
+
+    Parameters
+    ----------
+    files : array
+        paths of the files whose content identifies the entry. A missing file
+        is hashed as empty.
+    values : array
+        strings that also identify the entry, like the name of a module
+
+    Returns
+    -------
+    string
+        sha256 hex digest
+    '''
+    digest = hashlib.sha256(f"axls-cache-{CACHE_VERSION}".encode())
+    for filename in files:
+        digest.update(b"\0file\0")
+        if os.path.exists(filename):
+            with open(filename, "rb") as file:
+                digest.update(file.read())
+    for value in values:
+        digest.update(b"\0value\0")
+        digest.update(str(value).encode())
+    return digest.hexdigest()
+
+
+def content_key(value):
+    '''
+    Computes a key of a file or an array from its content, to use it as a
+    value of `cache_key`
+
+    The key of a file is computed again only when its size or modification
+    time change, so large datasets are read once per process.
+
+    Parameters
+    ----------
+    value : string | array
+        path of a file, or an array
+
+    Returns
+    -------
+    string
+        sha256 hex digest
+    '''
+    if isinstance(value, (str, os.PathLike)):
+        status = os.stat(value)
+        return file_key(os.path.abspath(value), status.st_mtime_ns,
+            status.st_size)
+    array = np.ascontiguousarray(value)
+    digest = hashlib.sha256(f"{array.dtype}{array.shape}".encode())
+    digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=64)
+def file_key(filename, modified, size):
+    '''
+    Returns the `cache_key` of a file, memoized by its modification time and
+    size, see `content_key`
+    '''
+    return cache_key([filename])
+
+
+def load(key):
+    '''
+    Returns the object stored with a key, or None if there is no entry or it
+    can not be read
+    '''
+    filename = os.path.join(cache_folder(), f"{key}.pickle")
+    try:
+        with open(filename, "rb") as file:
+            return pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError,
+        ImportError):
+        return None
+
+
+def store(key, value):
+    '''
+    Stores an object with a key
+
+    The entry is written to a temporary file and then renamed, so processes
+    that read the cache at the same time never see a partial entry. Errors
+    writing the cache are ignored, the cache is only an optimization, but
+    objects that can not be pickled raise their error. The temporary file is
+    removed in both cases.
+    '''
+    folder = cache_folder()
+    try:
+        os.makedirs(folder, exist_ok=True)
+        entry_file, entry_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    except OSError:
+        return
+    try:
+        with os.fdopen(entry_file, "wb") as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(entry_path, os.path.join(folder, f"{key}.pickle"))
+    except OSError:
+        pass
+    finally:
+        if os.path.exists(entry_path):
+            os.remove(entry_path)
@@ -1,21 +1,38 @@
 import os
 import re
+import shutil
+import subprocess
+import tempfile
+import weakref
 
 from graphviz import Digraph
-from os import path, remove, system, rename
+from os import path, remove, rename
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from random import randint
 from re import findall
 import xml.etree.ElementTree as ET
 
-from circuiterror import compute_error
+from cache import cache_key, content_key, load, store
+from circuiterror import BINARY_MAGIC, BINARY_VERSION, SequentialTest, \
+    compute_error, is_binary_output, read_outputs, read_summaries, \
+    read_summary, required_samples, sample_errors
+from graph import CircuitGraph
 from netlist import Netlist
+from optimization import simplify_netlist, structural_hash
+from power import PowerModel
+from timing import TimingModel
+from simulator import Simulator, IncrementalSimulator
 from synthesis import synthesis, resynthesis, ys_get_area
 from technology import Technology
-from utils import get_name, get_random
+from utils import LOW_DISCREPANCY, get_name, random_columns, read_dataset, \
+    write_dataset
 import numpy as np
 
 
-
+# seconds of the units of a saif TIMESCALE
+SAIF_TIMESCALES = {"": 1.0, "m": 1e-3, "u": 1e-6, "n": 1e-9, "p": 1e-12,
+    "f": 1e-15}
 
 
 class Circuit:
@@ -34,13 +51,50 @@ class Circuit:
         path to the synthesized netlist file
     tech_root : ElementTree.Element
         references to the root element of the Technology Library Cells tree
+    graph : CircuitGraph
+        indexed view of netl_root used to answer graph queries in O(1)
+    simulator : Simulator
+        native simulator of the circuit, created on the first native
+        simulation
+    masked_executable : string
+        path to the executable created by `compile_masked`
+    masked_workdir : string
+        folder where the simulations of `masked_executable` run
+    masked_setup : tuple
+        keys of the dataset, the exact output and the early exit the masked
+        executable of `masked_error` was compiled for, and its exact output
+    observers : list
+        functions called with the node id every time a node is deleted or
+        restored
+    node_areas : numpy.ndarray
+        liberty area of every node of `graph`
+    total_area : float
+        area of the nodes that are not deleted, updated by `delete` and
+        `undodelete`
+    saif_duration : float
+        duration of the saif file in seconds, None if there is no saif file
+    power : PowerModel
+        power model of the circuit, created by the first `get_power`
+    timing : TimingModel
+        timing model of the circuit, created by the first `get_delay`
+    result_cache : bool
+        true if the results of yosys and iverilog are cached on disk, see
+        `result_key` and `netlist_key`
     '''
 
 
-    def __init__(self, rtl, tech, saif = ""):
+    def __init__(self, rtl, tech, saif = "", cache=True, result_cache=False):
         '''
         Parse a rtl circuit into a xml tree using a specific technology library
 
+        The synthesized netlist and the parsed circuit are stored in an
+        on-disk cache (see `cache.py`) keyed by the content of the rtl file,
+        the technology files, the synthesis script and the modules that
+        synthesize and parse it, so building the same circuit again skips
+        yosys and the netlist parser. With result_cache
+        the results of yosys and iverilog for every state of the circuit are
+        cached too, see `result_key`.
+
         Parameters
         ----------
         rtl : string
@@ -49,29 +103,104 @@ class Circuit:
             path to the technology file
         saif : string
             path to the saif file
+        cache : bool
+            if false, the circuit is always synthesized and parsed again
+        result_cache : bool
+            if true, the resynthesized netlists, the yosys areas and the
+            iverilog errors are cached on disk. The entries are never evicted
+            and a search stores one entry per candidate, so it is off by
+            default.
         '''
 
 
         self.rtl_file = rtl
         self.tech_file = tech
         self.topmodule = rtl.split('/')[-1].replace(".v","")
-        self.netl_file = synthesis (rtl, tech, self.topmodule)
         self.technology = Technology(tech)
-        # extract the usefull attributes of netlist
-        netlist = Netlist(self.netl_file, self.technology)
-        self.netl_root = netlist.root
-        self.inputs = netlist.circuit_inputs
-        self.outputs = netlist.circuit_outputs
-
-        self.raw_inputs = netlist.raw_inputs
-        self.raw_outputs = netlist.raw_outputs
-        self.raw_parameters = netlist.raw_parameters
+        self.result_cache = result_cache
+
+        current_dir=os.path.dirname(os.path.abspath(__file__))
+        key = cache_key([rtl,
+            f"{current_dir}/templates/{tech}.v",
+            f"{current_dir}/templates/{tech}.lib",
+            f"{current_dir}/templates/synth.ys",
+            f"{current_dir}/templates/abc.script",
+            f"{current_dir}/synthesis.py",
+            f"{current_dir}/technology.py",
+            f"{current_dir}/netlist.py",
+            f"{current_dir}/graph.py"], [self.topmodule])
+        parsed = load(key) if cache else None
+
+        if parsed is None:
+            self.netl_file = synthesis (rtl, tech, self.topmodule)
+            # extract the usefull attributes of netlist
+            netlist = Netlist(self.netl_file, self.technology)
+            with open(self.netl_file, 'r') as netlist_file:
+                netlist_text = netlist_file.read()
+            netl_root = netlist.root
+            parsed = {
+                "netlist": netlist_text,
+                "netl_root": netl_root,
+                "graph": CircuitGraph(netl_root),
+                "inputs": netlist.circuit_inputs,
+                "outputs": netlist.circuit_outputs,
+                "raw_inputs": netlist.raw_inputs,
+                "raw_outputs": netlist.raw_outputs,
+                "raw_parameters": netlist.raw_parameters,
+            }
+            if cache:
+                store(key, parsed)
+        else:
+            # the netlist file is expected next to the rtl file, it is only
+            # written if it is missing or holds another netlist
+            self.netl_file = path.dirname(path.abspath(rtl)) + "/netlist.v"
+            current = None
+            if path.exists(self.netl_file):
+                with open(self.netl_file, 'r') as netlist_file:
+                    current = netlist_file.read()
+            if current != parsed["netlist"]:
+                with open(self.netl_file, 'w') as netlist_file:
+                    netlist_file.write(parsed["netlist"])
+
+        self.netl_root = parsed["netl_root"]
+        self.graph = parsed["graph"]
+        self.simulator = None
+        self.masked_executable = None
+        self.masked_workdir = None
+        self.masked_setup = None
+        self.observers = []
+        self.inputs = parsed["inputs"]
+        self.outputs = parsed["outputs"]
+
+        self.raw_inputs = parsed["raw_inputs"]
+        self.raw_outputs = parsed["raw_outputs"]
+        self.raw_parameters = parsed["raw_parameters"]
+        self.count_area()
+        self.saif_duration = None
+        self.power = None
+        self.timing = None
 
         if (saif != ""):
             self.saif_parser(saif)
 
         self.output_folder = path.dirname(path.abspath(rtl))
 
+    def __getstate__(self):
+        '''
+        The simulators, the masked executable, the power and timing models
+        and the observers are not copied when the circuit is pickled, for
+        example to send it to another process
+        '''
+        state = self.__dict__.copy()
+        state["simulator"] = None
+        state["masked_executable"] = None
+        state["masked_workdir"] = None
+        state["masked_setup"] = None
+        state["power"] = None
+        state["timing"] = None
+        state["observers"] = []
+        return state
+
     def get_circuit_xml(self):
         '''
         Returns the circuit netlist in xml format
@@ -98,7 +227,7 @@ class Circuit:
         ElementTree.Element
             Node instance we are looking for
         '''
-        return self.netl_root.find(f"./node[@var='{node_var}']")
+        return self.graph.node(node_var)
 
 
     def delete(self, node_var):
@@ -110,9 +239,12 @@ class Circuit:
         node_var : string
             name of the node to be deleted
         '''
-        node_to_delete = self.netl_root.find(f"./node[@var='{node_var}']")
+        node_to_delete = self.graph.node(node_var)
         if (node_to_delete is not None):
+            if node_to_delete.get("delete") != "yes":
+                self.total_area -= self.node_areas[self.graph.node_ids[node_var]]
             node_to_delete.set("delete", "yes")
+            self.notify(node_var)
         else:
             print(f"Node {node_var} not found")
 
@@ -125,14 +257,52 @@ class Circuit:
         node_var : string
             name of the node to be preserved
         '''
-        node_to_delete = self.netl_root.find(f"./node[@var='{node_var}']")
+        node_to_delete = self.graph.node(node_var)
         if (node_to_delete is not None):
             node_to_delete.attrib.pop("delete")
+            self.total_area += self.node_areas[self.graph.node_ids[node_var]]
+            self.notify(node_var)
         else:
             print(f"Node {node_var} not found")
 
+    def count_area(self):
+        '''
+        Computes the liberty area of every node and the area of the nodes
+        that are not deleted, see `get_area`
+        '''
+        areas = self.technology.areas
+        self.node_areas = np.array([areas.get(name, 0.0)
+            for name in self.graph.node_names])
+        self.total_area = float(self.node_areas[~self.graph.deleted()].sum())
+
     # this are some auxiliary functions for write_to_disk
 
+    def add_observer(self, observer):
+        '''
+        Registers a function to call every time a node is deleted or restored
+
+        Parameters
+        ----------
+        observer : function
+            receives the id of the node in `graph`
+        '''
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        '''
+        Unregisters a function added with `add_observer`
+        '''
+        self.observers.remove(observer)
+
+    def notify(self, node_var):
+        '''
+        Calls the observers after the delete label of a node changed
+        '''
+        node_id = self.graph.node_ids[node_var]
+        for observer in self.observers:
+            observer(node_id)
+
+
     def is_node_deletable(self, node):
         '''
         Returns true if a node can be deleted, returns false if the node should
@@ -154,18 +324,17 @@ class Circuit:
             true if the node can be deleted
         '''
 
-        root = self.netl_root
+        graph = self.graph
 
         node_output = node.findall("output")[0]
-        wire = node_output.attrib["wire"]
+        wire = graph.wire_ids[node_output.attrib["wire"]]
 
         # children of node
-        re = f"./node/input[@wire='{wire}']/.."
-        node_children = root.findall(re)
+        node_children = graph.fanout(wire)
 
         # children of node that had to be deleted
-        re = f"./node[@delete='yes']/input[@wire='{wire}']/.."
-        node_children_to_be_deleted = root.findall(re)
+        node_children_to_be_deleted = [c for c in node_children
+            if graph.is_deleted(c)]
 
         # If no nodes have this node as an input, it means that this node must
         # connect directly to a circuit output.
@@ -179,7 +348,7 @@ class Circuit:
         return node_can_be_deleted
 
 
-    def node_to_constant(self, node):
+    def node_to_constant(self, node, output=0):
         '''
         Returns the constant value for which the node can be replaced
 
@@ -187,13 +356,16 @@ class Circuit:
         ----------
         node : ElementTree.Element
             node we want to make constant
+        output : int
+            index of the output of the node, cells like FA_X1 have an output
+            probability for every output
 
         Returns
         -------
         integer
             logic 1 or 0
         '''
-        node_output = node.findall("output")[0]
+        node_output = node.findall("output")[output]
         if "t0" in node_output.attrib:
             t1 = int(node_output.attrib["t1"])
             t0 = int(node_output.attrib["t0"])
@@ -201,6 +373,25 @@ class Circuit:
         else:
             return 0
 
+    def node_constants(self, node):
+        '''
+        Returns the constant of every output of the node, see
+        `node_to_constant`
+
+        Parameters
+        ----------
+        node : ElementTree.Element
+            node we want to make constant
+
+        Returns
+        -------
+        array
+            logic 1 or 0 of every output, in the order of the outputs of the
+            node
+        '''
+        return [self.node_to_constant(node, i)
+            for i in range(len(node.findall("output")))]
+
 
     def get_circuit_wires(self):
         '''
@@ -211,13 +402,15 @@ class Circuit:
         array
             list of circuit wires names
         '''
-        outputs = self.netl_root.findall("./node/output")
-        wires = list(set([output.attrib["wire"] for output in outputs]))
+        graph = self.graph
+        wires = dict.fromkeys(graph.wire_names[w] for w in graph.out_wires)
+        # wires tied to a constant by `simplify` may have no driver
+        wires.update(dict.fromkeys(graph.wire_names[lhs]
+            for lhs, _ in graph.assignments))
 
         # make sure there are not any inputsoutputs in wires
-        wires = [wire for wire in wires if wire not in self.inputs]
-        wires = [wire for wire in wires if wire not in self.outputs]
-        return wires
+        ports = set(self.inputs) | set(self.outputs)
+        return [wire for wire in wires if wire not in ports]
 
 
     def get_circuit_nodes(self):
@@ -229,8 +422,7 @@ class Circuit:
         array
             list of circuit nodes names
         '''
-        nodes = self.netl_root.findall("./node")
-        return [node.attrib["var"] for node in nodes]
+        return list(self.graph.node_vars)
 
     def get_nodes_to_delete(self):
         '''
@@ -241,8 +433,8 @@ class Circuit:
         array
             list of nodes variable names
         '''
-        nodes_to_delete = self.netl_root.findall("./node[@delete='yes']")
-        return [node.attrib["var"] for node in nodes_to_delete]
+        graph = self.graph
+        return [graph.node_vars[i] for i in np.flatnonzero(graph.deleted())]
 
 
     def get_wires_to_be_deleted(self):
@@ -250,6 +442,10 @@ class Circuit:
         Returns two lists with the wires that will be deleted completely and
         another list with the wires that should be assigned a constant.
 
+        Every output wire of a node marked to be deleted is considered. A wire
+        can be deleted if it has children and all of them will be deleted as
+        well, otherwise it is assigned its constant, see `node_constants`.
+
         Returns
         -------
         ( array, dictionary )
@@ -258,90 +454,194 @@ class Circuit:
         '''
         wires_to_be_deleted = [] # {wire1, wire2, ... }
         wires_to_be_assigned = {}   # { wire: value, ... }
-        nodes_to_delete = self.netl_root.findall("./node[@delete='yes']")
-        for node in nodes_to_delete:
-            node_output = node.findall("output")[0]
-            if self.is_node_deletable(node):
-                # the wire could be DELETED
-                wire = node_output.attrib["wire"]
-                wires_to_be_deleted.append(wire)
-            else:
-                # the wire needs to be ASSIGNED
-                wire = node_output.attrib["wire"]
-                constant = self.node_to_constant(node)
-                wires_to_be_assigned[wire] = constant
+        graph = self.graph
+
+        deleted = graph.deleted()
+        fanout_count = graph.fanout_count()
+
+        # number of children of every wire that will remain in the circuit
+        fanout_wires = np.repeat(np.arange(len(fanout_count)), fanout_count)
+        alive_count = np.bincount(fanout_wires[~deleted[graph.fanout_nodes]],
+            minlength=len(fanout_count))
+
+        for node_id in np.flatnonzero(deleted):
+            constants = None
+            for i, wire in enumerate(graph.outputs(node_id)):
+                if fanout_count[wire] > 0 and alive_count[wire] == 0:
+                    # the wire could be DELETED
+                    wires_to_be_deleted.append(graph.wire_names[wire])
+                else:
+                    # the wire needs to be ASSIGNED
+                    if constants is None:
+                        constants = self.node_constants(graph.elements[node_id])
+                    wires_to_be_assigned[graph.wire_names[wire]] = constants[i]
         return wires_to_be_deleted, wires_to_be_assigned
 
 
 
-    def write_to_disk (self, filename=""):
+    def write_to_disk (self, filename="", topmodule=None, in_memory=None,
+        masked=False):
         '''
         Write the xml circuit into a netlist file considering the nodes to be
         deleted (marked with an attribute delete='yes')
 
+        The netlist is built in a single pass over the circuit graph and
+        written with one call, so the cost is linear in the circuit size.
+
+        A masked netlist ignores the delete labels and keeps every node, but
+        each node output can be overridden at simulation time with a mask
+        file passed as `+mask=<file>` (see `write_mask`), so one compiled
+        simulation can evaluate any set of deleted nodes.
+
+        Parameters
+        ----------
+        filename : string
+            name of the netlist file without extension, it is created inside
+            the output folder. A random name is used by default.
+        topmodule : string
+            name of the written module, defaults to the circuit topmodule
+        in_memory : None | "str" | "bytes"
+            if given, no file is created and the netlist is returned as a
+            string or as utf-8 encoded bytes
+        masked : bool
+            if true, writes the masked netlist
+
         Returns
         -------
-        string
-            path of the recently created netlist
+        string | bytes
+            path of the recently created netlist, or the netlist itself when
+            in_memory is used
         '''
+        graph = self.graph
+        topmodule = self.topmodule if topmodule is None else topmodule
 
-        def format_io(node, io):
-            ioputs = node.findall(f"{io}put")
-            return [f".{x.attrib['name']}({x.attrib['wire']})" for x in ioputs]
-
-        nodes_to_delete = self.get_nodes_to_delete()
-        to_be_deleted, to_be_assigned = self.get_wires_to_be_deleted()
+        if masked:
+            deleted = np.zeros(len(graph), dtype=bool)
+            to_be_deleted, to_be_assigned = set(), {}
+        else:
+            deleted = graph.deleted()
+            to_be_deleted, to_be_assigned = self.get_wires_to_be_deleted()
+            to_be_deleted = set(to_be_deleted)
+
+        lines = ["/* Generated by poisonoak */"]
+        lines.append(f"module {topmodule} ({self.raw_parameters});")
+
+        for wire in self.get_circuit_wires():
+            if wire not in to_be_deleted:
+                lines.append(f"\twire {wire};")
+        for port in dict.fromkeys(self.raw_outputs + self.raw_inputs):
+            lines.append("\t" + port)
+
+        wire_names = graph.wire_names
+        mask_wire = len(wire_names)
+        if masked:
+            lines += self.mask_declarations()
+            wire_names = wire_names + [f"mask_raw_{i}"
+                for i in range(len(graph.out_wires))]
+        in_pins, out_pins = graph.in_pins, graph.out_pins
+        in_wires, out_wires = graph.in_wires.tolist(), graph.out_wires.tolist()
+        in_ptr, out_ptr = graph.in_ptr.tolist(), graph.out_ptr.tolist()
+        for node_id in np.flatnonzero(~deleted).tolist():
+            # a masked node drives the raw wire of each output
+            outputs = ",".join(f".{out_pins[i]}({wire_names[mask_wire + i]})"
+                if masked else f".{out_pins[i]}({wire_names[out_wires[i]]})"
+                for i in range(out_ptr[node_id], out_ptr[node_id + 1]))
+            inputs = ",".join(f".{in_pins[i]}({wire_names[in_wires[i]]})"
+                for i in range(in_ptr[node_id], in_ptr[node_id + 1]))
+            lines.append(f"\t{graph.node_names[node_id]} "
+                f"{graph.node_vars[node_id]} ({outputs},{inputs});")
+
+        for wire,value in to_be_assigned.items():
+            lines.append(f"\tassign {wire} = 1'b{value};")
+
+        if masked:
+            for i, wire in enumerate(out_wires):
+                lines.append(f"\tassign {wire_names[wire]} = mask_enable[{i}] "
+                    f"? mask_value[{i}] : {wire_names[mask_wire + i]};")
+
+        for lhs, rhs in graph.assignments: #support for special assignments
+            lines.append(f"\tassign {wire_names[lhs]} = {rhs};")
+
+        lines.append("endmodule\n")
+        netlist = "\n".join(lines)
+
+        if in_memory == "str":
+            return netlist
+        elif in_memory == "bytes":
+            return netlist.encode()
+        elif in_memory is not None:
+            raise ValueError(f"{in_memory} is not a valid in_memory option")
 
         filename = filename if filename != "" else str(randint(9999,999999))
         filepath = f"{self.output_folder}{path.sep}{filename}.v"
-
         with open(filepath, 'w') as netlist_file:
-
-            def writeln(file, text):
-                file.write(text + "\n")
-
-            header = "/* Generated by poisonoak */"
-            writeln(netlist_file, header)
-
-            params = self.raw_parameters
-            module = f"module {self.topmodule} ({params});"
-            writeln(netlist_file, module)
-
-            for wire in self.get_circuit_wires():
-                if wire not in to_be_deleted:
-                    writeln(netlist_file, f"\twire {wire};")
-            used_outputs=[]
-            for output in self.raw_outputs:
-                if output not in used_outputs:
-                    writeln(netlist_file, "\t" + output)
-                    used_outputs.append(output)
-            for output in self.raw_inputs:
-                if output not in used_outputs:
-                    writeln(netlist_file, "\t" + output)
-                    used_outputs.append(output)
-
-            for node_var in self.get_circuit_nodes():
-                if node_var not in nodes_to_delete:
-                    node = self.get_node(node_var)
-                    instance = f"\t{node.attrib['name']} {node.attrib['var']}"
-                    inputs = format_io(node, "in")
-                    outputs = format_io(node, "out")
-                    instance += f" ({','.join(outputs)},{','.join(inputs)});"
-                    writeln(netlist_file, instance)
-
-            for wire,value in to_be_assigned.items():
-                assign = f"\tassign {wire} = 1'b{value};"
-                writeln(netlist_file, assign)
-
-            assignments=self.netl_root.findall('./assignments/assign')
-            for a in assignments: #support for special assignments
-                assign=f"\tassign {a.attrib['var']} = {a.attrib['val']};"
-                writeln(netlist_file, assign)
-
-            writeln(netlist_file, "endmodule")
+            netlist_file.write(netlist)
         return filepath
 
 
+    def mask_declarations(self):
+        '''
+        Returns the verilog lines of a masked netlist that declare the mask
+        registers and load them from the `+mask=<file>` argument
+
+        Every node output has one bit in `mask_enable` and one in
+        `mask_value`, in the order of `graph.out_wires`. When the enable bit
+        is 1 the output takes the value bit instead of the cell output.
+        '''
+        size = len(self.graph.out_wires)
+        wires = [f"\twire mask_raw_{i};" for i in range(size)]
+        return wires + [
+            f"\treg [{size - 1}:0] mask_enable;",
+            f"\treg [{size - 1}:0] mask_value;",
+            f"\treg [{size - 1}:0] mask_memory [0:1];",
+            "\treg [8*1024-1:0] mask_file;",
+            "\tinitial begin",
+            "\t\tmask_enable = 0;",
+            "\t\tmask_value = 0;",
+            "\t\tif ($value$plusargs(\"mask=%s\", mask_file)) begin",
+            "\t\t\t$readmemb(mask_file, mask_memory);",
+            "\t\t\tmask_enable = mask_memory[0];",
+            "\t\t\tmask_value = mask_memory[1];",
+            "\t\tend",
+            "\tend",
+        ]
+
+    def write_mask(self, filename):
+        '''
+        Writes the mask file that reproduces the current deleted nodes on a
+        masked netlist
+
+        The outputs of the deleted nodes are enabled in the mask and take
+        their constant, see `node_constants`.
+
+        Parameters
+        ----------
+        filename : string
+            path of the mask file, it is overwritten if it exists
+
+        Returns
+        -------
+        string
+            path of the mask file
+        '''
+        graph = self.graph
+        size = len(graph.out_wires)
+        enable = ["0"] * size
+        value = ["0"] * size
+        out_ptr = graph.out_ptr.tolist()
+        for node_id in np.flatnonzero(graph.deleted()).tolist():
+            constants = self.node_constants(graph.elements[node_id])
+            for i, constant in zip(range(out_ptr[node_id],
+                    out_ptr[node_id + 1]), constants):
+                enable[i] = "1"
+                value[i] = str(constant)
+        # $readmemb reads the most significant bit first
+        with open(filename, 'w') as mask_file:
+            mask_file.write("".join(enable[::-1]) + "\n")
+            mask_file.write("".join(value[::-1]) + "\n")
+        return filename
+
+
     def show (self, filename=None, show_deletes=False, view=True, format="png"):
         '''
         Renders the circuit as an image of the graph.
@@ -360,7 +660,7 @@ class Circuit:
         format: str (defaults to "png")
             The format to create render the image with
         '''
-        root = self.netl_root
+        graph = self.graph
         f = Digraph(self.topmodule)
 
         # we get the circuit inputs and outputs
@@ -378,40 +678,34 @@ class Circuit:
         # nodes to be deleted will be in a different color
         if (show_deletes):
             f.attr('node',style='filled',fillcolor='#f17e7e',shape='circle')
-            for p in root.findall("./node[@delete='yes']"):
-                f.node(p.attrib['var'])
+            for p in np.flatnonzero(graph.deleted()):
+                f.node(graph.node_vars[p])
         # the rest of the nodes will be a white circle
         f.attr('node', style='filled', fillcolor='white', shape='circle')
 
         # draw the edges
-        for n in root.findall("node"):
+        for n in range(len(graph)):
+            start = graph.node_vars[n]
             # iterate every node output to find edges to their children
-            for o in n.findall("output"):
-                wire = o.attrib["wire"]
-                children = root.findall(f".//input[@wire='{wire}']/..")
+            for wire in graph.outputs(n):
+                children = graph.fanout(wire)
+                label = graph.wire_names[wire]
                 # create a new conection between every node and its child
                 for c in children:
-                    start = n.attrib["var"]
-                    end = c.attrib["var"]
-                    label = wire
+                    end = graph.node_vars[c]
                     f.edge(start, end, label=label)
 
                 # if node has no children, is connected to a circuit output.
                 if (len(children) == 0):
-                    start = n.attrib["var"]
-                    end = wire.replace('[','_').replace(']','')
+                    end = label.replace('[','_').replace(']','')
                     f.edge(start, end)
 
             # inputs are not represented as nodes, so they have to be connected
-            for i in n.findall("input"):
-                wire = i.attrib["wire"]
-                parents = root.findall(f".//output[@wire='{wire}']/..")
-
+            for wire in graph.inputs(n):
                 # if node has no parents, is connected to a circuit input
-                if (len(parents) == 0):
-                    start = wire.replace('[','_').replace(']','')
-                    end = n.attrib["var"]
-                    f.edge(start, end)
+                if (graph.driver[wire] < 0):
+                    begin = graph.wire_names[wire].replace('[','_').replace(']','')
+                    f.edge(begin, start)
 
         return(f.render(filename=filename, format=format, view=view, cleanup=True))
 
@@ -422,6 +716,9 @@ class Circuit:
         Captures the t0, t1 and tc parameters for each component/variable and store
         them directly in the xml file of the netlist
 
+        The circuit inputs are annotated in their port element, and the
+        duration of the saif file is stored in `saif_duration`, in seconds.
+
         Parameters
         ----------
         saif : string
@@ -430,6 +727,14 @@ class Circuit:
         with open(saif, 'r') as technology_file:
             content = technology_file.read()
 
+            timescale = re.search(r'\(TIMESCALE\s+([0-9.]+)\s*([a-z]*)s\s*\)',
+                content)
+            duration = re.search(r'\(DURATION\s+([0-9.eE+-]+)\s*\)', content)
+            if duration is not None:
+                scale = 1e-9 if timescale is None else float(timescale[1]) \
+                    * SAIF_TIMESCALES[timescale[2]]
+                self.saif_duration = float(duration[1]) * scale
+
             expreg = r'\((.+)\n.*\(T0 ([0-9]+)\).*\(T1 ([0-9]+)\).*\n.*\(TC ([0-9]+)\).*\n.*\)'
             saif_cells = findall(expreg, content)
 
@@ -446,7 +751,7 @@ class Circuit:
 
                 if (saif_cell_name[0] == "w"):
                     my_saif_cell_name = "_" + saif_cell_name[1:] + "_"
-                    cells = self.netl_root.find(f"./node/output[@wire='{my_saif_cell_name}']")
+                    cells = self.graph.output_element(my_saif_cell_name)
 
                     if (cells is not None):
                         cells.set('t0',saif_cell_t0)
@@ -455,16 +760,22 @@ class Circuit:
 
                 elif ((saif_cell_name[0],saif_cell_name[-1]) == ("_","_")): #Yosys 19.
                     my_saif_cell_name = "_" + saif_cell_name[1:-1] + "_"
-                    cells = self.netl_root.find(f"./node/output[@wire='{my_saif_cell_name}']")
+                    cells = self.graph.output_element(my_saif_cell_name)
 
                     if (cells is not None):
                         cells.set('t0',saif_cell_t0)
                         cells.set('t1',saif_cell_t1)
                         cells.set('tc',saif_cell_tc)
 
+                elif (saif_cell_name.replace('\\','') in self.inputs):
+                    cells = self.graph.ports[saif_cell_name.replace('\\','')]
+                    cells.set('t0',saif_cell_t0)
+                    cells.set('t1',saif_cell_t1)
+                    cells.set('tc',saif_cell_tc)
+
                 elif (saif_cell_name.replace('\\','') in self.outputs):
                     my_saif_cell_name = saif_cell_name.replace('\\','')
-                    cells = self.netl_root.find(f"./node/output[@wire='{my_saif_cell_name}']")
+                    cells = self.graph.output_element(my_saif_cell_name)
 
                     if (cells is not None):
                         cells.set('t0',saif_cell_t0)
@@ -493,36 +804,64 @@ class Circuit:
         '''
 
 
-        name = get_name(5)
-        rtl = self.write_to_disk(name)
+        output = self.run_testbench(testbench)
+        rename(output, output_file)
 
-        top = self.topmodule
-        current_dir=os.path.dirname(__file__)
-        tech = f"{current_dir}/templates/" + self.tech_file
-        out = self.output_folder
+        return
 
-        """Better to temporarily change cwd when executing iverilog"""
-        cwd=os.getcwd()
-        os.chdir(current_dir)
+    def exact_netlist (self, filename):
+        '''
+        Writes the actual circuit tree (with deletions) as the exact circuit
+        of a miter testbench, a module named `<topmodule>_exact`
 
-        # - - - - - - - - - - - - - - - Execute icarus - - - - - - - - - - - - -
-        # iverilog -l tech.v -o executable testbench.v netlist.v
-        kon = f"iverilog -l \"{tech}.v\" -o \"{out}/{top}\" {testbench} \"{rtl}\""
-        system(kon)
+        Call it before deleting nodes, like `exact_output`. A miter testbench
+        simulates the exact circuit next to the approximate one, so the exact
+        outputs are never written to a file.
 
-        # - - - - - - - - - - - - - Execute the testbench  - - - - - - - - - - -
-        system(f"cd \"{out}\"; ./{top}")
+        Parameters
+        ----------
+        filename : string
+            name of the netlist file without extension, it is created inside
+            the output folder
 
-        os.chdir(cwd)
+        Returns
+        -------
+        string
+            path to the exact netlist
+        '''
+        return self.write_to_disk(filename, f"{self.topmodule}_exact")
 
-        remove(rtl)
-        remove(f"{out}/{top}")
+    def simulate_miter_and_compute_error (self, testbench, metric,
+        exact_netlist):
+        '''
+        Simulates the actual circuit tree (with deletions) next to the exact
+        circuit with a miter testbench, written by `write_tb` with
+        miter=True, and returns the error accumulated by the simulation
 
-        rename(out + "/output.txt", output_file)
+        Parameters
+        ----------
+        testbench : string
+            path to the miter testbench file
+        metric : string | array
+            equation to compute the error, or a list of them
+            options er, hd, med, wce, wcre, mred, msed
+        exact_netlist : string
+            path to the exact netlist created by `exact_netlist`
 
-        return
+        Returns
+        -------
+        float | dict
+            error of the current circuit tree, or a dict with the error of
+            every metric when a list is given
+        '''
+        output = self.run_testbench(testbench, exact_netlist=exact_netlist)
+        metrics = [metric] if isinstance(metric, str) else metric
+        errors = read_summary(output, metrics)
+        remove(output)
 
-    def simulate_and_compute_error (self, testbench, metric, exact_output, new_output):
+        return errors[metric] if isinstance(metric, str) else errors
+
+    def simulate_and_compute_error (self, testbench, metric, exact_output, new_output, max_error=None):
         '''
         Simulates the actual circuit tree (with deletions)
         Creates an executable using icarus, end then execute it to obtain the
@@ -544,6 +883,10 @@ class Circuit:
             exists, it will be overwritten.
         clean : bool
             if true, deletes all the generated files
+        max_error : int
+            the `max_error` of a testbench written with it. The testbench
+            stops at the first vector above it, so the output can be shorter
+            than the exact output.
 
         Returns
         -------
@@ -552,43 +895,865 @@ class Circuit:
         '''
 
 
-        name = get_name(5)
-        rtl = self.write_to_disk(name)
+        output = self.run_testbench(testbench)
+        rename(output, new_output)
+
+        error = compute_error(metric, exact_output, new_output,
+            partial=max_error is not None)
+
+        return error
+
+    def compile_testbench(self, testbench, executable, workdir=None,
+        masked=False, exact_netlist=None, variants=None):
+        '''
+        Compiles the actual circuit tree (with deletions) and a testbench with
+        icarus
+
+        Parameters
+        ----------
+        testbench : string
+            path to the testbench file, relative paths start at the folder of
+            this framework
+        executable : string
+            path of the executable to create
+        workdir : string
+            folder where the temporary netlist is written, by default the
+            output folder
+        masked : bool
+            if true, compiles the masked netlist, see `write_to_disk`
+        exact_netlist : string
+            path to the exact netlist of a miter testbench, created with
+            `exact_netlist`
+        variants : array
+            list of lists of node names, compiles the variants of a testbench
+            written with `variants` instead of the actual circuit, see
+            `variant_netlists`
 
-        top = self.topmodule
-        tech = "./templates/" + self.tech_file
-        out = self.output_folder
+        Returns
+        -------
+        string
+            path to the executable
+        '''
+        workdir = self.output_folder if workdir is None else workdir
+        rtl = f"{workdir}{path.sep}{get_name(5)}.v"
+        with open(rtl, 'w') as netlist_file:
+            if variants is None:
+                netlist_file.write(self.write_to_disk(in_memory="str",
+                    masked=masked))
+            else:
+                netlist_file.write(self.variant_netlists(variants))
 
-        """Better to temporarily change cwd when executing iverilog"""
-        cwd=os.getcwd()
-        current_dir=os.path.dirname(__file__)
-        os.chdir(current_dir)
+        current_dir=os.path.dirname(os.path.abspath(__file__))
+        tech = f"{current_dir}/templates/" + self.tech_file
 
         # - - - - - - - - - - - - - - - Execute icarus - - - - - - - - - - - - -
         # iverilog -l tech.v -o executable testbench.v netlist.v
-        kon = f"iverilog -l \"{tech}.v\" -o \"{out}/{top}\" {testbench} \"{rtl}\""
-        system(kon)
+        kon = f"iverilog -l \"{tech}.v\" -o \"{executable}\" {testbench} \"{rtl}\""
+        if exact_netlist is not None:
+            kon = f"{kon} \"{os.path.abspath(exact_netlist)}\""
+        result = subprocess.run(kon, shell=True, cwd=current_dir)
+
+        remove(rtl)
+        if result.returncode != 0:
+            raise RuntimeError(f"iverilog failed to compile {testbench}")
+        return executable
+
+    def run_testbench(self, testbench, workdir=None, exact_netlist=None,
+        variants=None):
+        '''
+        Simulates the actual circuit tree (with deletions) with icarus
+
+        Every file is created inside `workdir` with a unique name, so several
+        simulations can run at the same time in different folders.
+
+        Parameters
+        ----------
+        testbench : string
+            path to the testbench file
+        workdir : string
+            folder where the testbench runs, by default the output folder
+        exact_netlist : string
+            path to the exact netlist of a miter testbench, see
+            `compile_testbench`
+        variants : array
+            deletion sets of the variants of the testbench, see
+            `compile_testbench`
+
+        Returns
+        -------
+        string
+            path to the output file written by the testbench, variant j of a
+            testbench that is not a miter writes `output_variant<j>.txt` in
+            the same folder
+        '''
+        workdir = self.output_folder if workdir is None else workdir
+        executable = self.compile_testbench(testbench,
+            f"{workdir}{path.sep}{get_name(5)}", workdir,
+            exact_netlist=exact_netlist, variants=variants)
 
         # - - - - - - - - - - - - - Execute the testbench  - - - - - - - - - - -
-        system(f"cd \"{out}\"; ./{top}")
-        os.chdir(cwd)
+        result = subprocess.run([executable], cwd=workdir)
 
-        rename(out + "/output.txt", new_output)
+        remove(executable)
+        if result.returncode != 0:
+            raise RuntimeError(f"vvp failed to simulate {testbench}")
+        return f"{workdir}{path.sep}output.txt"
 
-        error = compute_error(metric, exact_output, new_output)
+    def evaluate_deletions(self, deletion_set, metric, dataset_file,
+        exact_output, method="native", workdir=None, max_error=None,
+        key=None):
+        '''
+        Computes the error of the circuit with some extra nodes deleted, the
+        circuit is restored afterwards
 
-        remove(rtl)
-        remove(f"{out}/{top}")
+        Parameters
+        ----------
+        deletion_set : array
+            names of the nodes to delete, on top of the nodes already deleted
+        metric : string
+            equation to compute the error
+            options med, wce, wcre,mred, msed
+        dataset_file : string
+            Path to the dataset file which can be created with
+            `generate_dataset`.
+        exact_output : string | array
+            Output of the exact circuit, a path to the file created by
+            `exact_output` or, for the native method, the values returned by
+            `simulate_native`.
+        method : string
+            "native" to use the in-process simulator, "iverilog" to compile
+            and run a testbench or "masked" to run a testbench compiled once
+            with the masked netlist, see `masked_error`
+        workdir : string
+            folder where the temporary folder of an iverilog simulation is
+            created, by default the system temporary folder
+        max_error : int
+            bound of the worst case error. With the wce metric the simulation
+            stops at the first vector above it, and the returned error is then
+            above max_error but not necessarily the worst case.
+        key : string
+            `error_key` of the candidate, computed here when `result_cache`
+            is true and it is not given
 
-        return error
+        Returns
+        -------
+        float
+            error of the circuit with the nodes deleted
+        '''
+        added = self.delete_extra(deletion_set)
+        try:
+            if method == "native":
+                return self.simulate_native_and_compute_error(dataset_file,
+                    metric, exact_output, max_error=max_error)
+            elif method in ("iverilog", "masked"):
+                if not self.result_cache:
+                    key = None
+                elif key is None:
+                    key = self.result_key("error", metric,
+                        content_key(dataset_file), content_key(exact_output),
+                        max_error)
+                error = None if key is None else load(key)
+                if error is not None:
+                    return error
+                if method == "masked":
+                    error = self.masked_error(metric, dataset_file,
+                        exact_output, workdir, max_error)
+                else:
+                    job_folder = tempfile.mkdtemp(dir=workdir)
+                    try:
+                        testbench = f"{job_folder}{path.sep}testbench.v"
+                        exact_output = self.evaluation_testbench(testbench,
+                            dataset_file, metric, exact_output, max_error)
+                        output = self.run_testbench(testbench, job_folder)
+                        error = compute_error(metric, exact_output, output,
+                            partial=max_error is not None)
+                    finally:
+                        shutil.rmtree(job_folder)
+                if key is not None:
+                    store(key, error)
+                return error
+            else:
+                raise ValueError(f"{method} is not a valid evaluation method")
+        finally:
+            for n in added:
+                self.undodelete(n)
 
-    def generate_dataset(self, filename, samples, distribution='uniform', **kwargs):
+    def evaluation_testbench(self, testbench, dataset_file, metric,
+        exact_output, max_error=None):
+        '''
+        Writes the testbench of `evaluate_deletions`, that stops at the first
+        vector above max_error with the wce metric
+
+        Parameters
+        ----------
+        testbench : string
+            path of the testbench file
+        dataset_file, metric, exact_output, max_error :
+            see `evaluate_deletions`
+
+        Returns
+        -------
+        string | array
+            the exact output to compare the output of the testbench with. An
+            early exit needs a text file, so native values are written to
+            `exact.txt` next to the testbench.
+        '''
+        if max_error is None or metric != "wce":
+            self.write_tb(testbench, dataset_file)
+            return exact_output
+        if not isinstance(exact_output, (str, os.PathLike)):
+            exact_file = f"{path.dirname(testbench)}{path.sep}exact.txt"
+            np.savetxt(exact_file, read_outputs(exact_output), fmt="%d")
+            exact_output = exact_file
+        self.write_tb(testbench, dataset_file, exact_output=exact_output,
+            max_error=max_error)
+        return exact_output
+
+    def masked_error(self, metric, dataset_file, exact_output, workdir=None,
+        max_error=None):
+        '''
+        Computes the error of the current circuit tree (with deletions) with
+        a testbench compiled once with the masked netlist
+
+        The testbench is compiled by the first call in its own temporary
+        folder inside `workdir`, and again only when the dataset, the exact
+        output or the early exit change. Every process has its own
+        executable, see `__getstate__`, so the workers of `evaluate_many`
+        compile once and then only run vvp for every candidate.
+
+        Parameters
+        ----------
+        metric, dataset_file, exact_output, workdir, max_error :
+            see `evaluate_deletions`
+
+        Returns
+        -------
+        float
+            error of the current circuit tree
+        '''
+        early_exit = max_error if metric == "wce" else None
+        setup = (content_key(dataset_file), content_key(exact_output),
+            early_exit)
+        if self.masked_setup is None or self.masked_setup[0] != setup \
+            or not path.exists(self.masked_executable):
+            folder = tempfile.mkdtemp(dir=workdir)
+            weakref.finalize(self, shutil.rmtree, folder, True)
+            testbench = f"{folder}{path.sep}testbench.v"
+            exact = self.evaluation_testbench(testbench, dataset_file, metric,
+                exact_output, max_error)
+            self.compile_masked(testbench, folder)
+            self.masked_setup = (setup, exact)
+        output = f"{self.masked_workdir}{path.sep}{get_name(5)}.txt"
+        try:
+            self.simulate_masked(output)
+            return compute_error(metric, self.masked_setup[1], output,
+                partial=max_error is not None)
+        finally:
+            if path.exists(output):
+                remove(output)
+
+    def evaluate_variants(self, deletion_sets, metric, dataset_file, exact,
+        workdir=None, miter=False, keys=None):
+        '''
+        Computes the error of several candidate circuits with one iverilog
+        compilation and simulation
+
+        Every candidate is the current circuit with one set of extra nodes
+        deleted, written as a variant module of a single testbench, so the
+        candidates share the compilation, the startup of the simulator and
+        the reading of the dataset. The circuit is restored afterwards.
+
+        If `result_cache` is true, the errors are cached and candidates with
+        the same `error_key` are simulated once.
+
+        Parameters
+        ----------
+        deletion_sets : array
+            list of lists of node names, one per candidate
+        metric : string
+            equation to compute the error
+            options er, hd, med, wce, wcre, mred, msed
+        dataset_file : string
+            Path to the dataset file which can be created with
+            `generate_dataset`.
+        exact : string | array
+            Output of the exact circuit, see `evaluate_deletions`, or with
+            miter the path to the netlist created by `exact_netlist`.
+        workdir : string
+            folder where the temporary folder of the simulation is created, by
+            default the system temporary folder
+        miter : bool
+            if true, the error is accumulated during the simulation, see
+            `write_tb`
+        keys : array
+            `error_key` of every candidate, computed here when `result_cache`
+            is true and they are not given
+
+        Returns
+        -------
+        array
+            error of every candidate, in the order of deletion_sets
+        '''
+        deletion_sets = [list(d) for d in deletion_sets]
+        if not self.result_cache:
+            keys = [("candidate", j) for j in range(len(deletion_sets))]
+        elif keys is None:
+            keys = [self.error_key(d, metric, dataset_file, exact)
+                for d in deletion_sets]
+        errors = {}
+        if self.result_cache:
+            for key in set(keys):
+                error = load(key)
+                if error is not None:
+                    errors[key] = error
+
+        # one candidate of every key that is not cached
+        pending = {}
+        for key, deletion_set in zip(keys, deletion_sets):
+            if key not in errors and key not in pending:
+                pending[key] = deletion_set
+        if pending:
+            simulated = list(pending.values())
+            job_folder = tempfile.mkdtemp(dir=workdir)
+            try:
+                testbench = f"{job_folder}{path.sep}testbench.v"
+                self.write_tb(testbench, dataset_file, progress=0, miter=miter,
+                    variants=len(simulated))
+                if miter:
+                    output = self.run_testbench(testbench, job_folder,
+                        exact_netlist=exact, variants=simulated)
+                    results = [summary[metric]
+                        for summary in read_summaries(output, [metric])]
+                else:
+                    self.run_testbench(testbench, job_folder,
+                        variants=simulated)
+                    results = [compute_error(metric, exact,
+                        f"{job_folder}{path.sep}output_variant{j}.txt")
+                        for j in range(len(simulated))]
+            finally:
+                shutil.rmtree(job_folder)
+            for key, error in zip(pending, results):
+                errors[key] = error
+                if self.result_cache:
+                    store(key, error)
+        return [errors[key] for key in keys]
+
+    def variant_netlists(self, deletion_sets):
+        '''
+        Returns the netlists of several variants of the circuit as a single
+        string, variant j is the current circuit with the nodes of
+        deletion_sets[j] deleted, in a module named `<topmodule>_variant<j>`
+
+        The circuit is restored afterwards.
+        '''
+        modules = []
+        for j, deletion_set in enumerate(deletion_sets):
+            added = self.delete_extra(deletion_set)
+            try:
+                modules.append(self.write_to_disk(
+                    topmodule=f"{self.topmodule}_variant{j}", in_memory="str"))
+            finally:
+                for n in added:
+                    self.undodelete(n)
+        return "\n".join(modules)
+
+    def delete_extra(self, deletion_set):
+        '''
+        Deletes the nodes of a set that are not deleted yet
+
+        Returns
+        -------
+        array
+            names of the nodes deleted now, to undo them afterwards
+        '''
+        added = [n for n in deletion_set
+            if self.get_node(n) is not None
+            and self.get_node(n).get("delete") != "yes"]
+        for n in added:
+            self.delete(n)
+        return added
+
+    def error_key(self, deletion_set, metric, dataset_file, exact,
+        max_error=None):
+        '''
+        Returns the `result_key` of the error of the circuit with some extra
+        nodes deleted. The circuit is restored afterwards.
+
+        The key depends on the content of the dataset and of the exact
+        output (or exact netlist), not on their paths, so candidates with the
+        same key have the same error.
+        '''
+        added = self.delete_extra(deletion_set)
+        try:
+            return self.result_key("error", metric, content_key(dataset_file),
+                content_key(exact), max_error)
+        finally:
+            for n in added:
+                self.undodelete(n)
+
+    def evaluate_adaptive(self, deletion_set, metric, dataset_file,
+        exact_output, threshold, confidence=0.95, min_samples=1024,
+        samples=None, base=16):
+        '''
+        Decides whether the error of the circuit with some extra nodes
+        deleted is within a threshold, simulating only as many test vectors
+        as needed
+
+        The dataset is simulated natively in chunks that double in size,
+        starting with `min_samples` rows. After every chunk a confidence
+        interval of the error is compared with the threshold, and the
+        simulation stops once the circuit is clearly accepted or rejected, see
+        `circuiterror.SequentialTest`. Candidates far from the threshold only
+        cost a few chunks. The circuit is restored afterwards.
+
+        Parameters
+        ----------
+        deletion_set : array
+            names of the nodes to delete, on top of the nodes already deleted
+        metric : string
+            equation to compute the error
+            options er, hd, med, wce, wcre, mred, msed
+        dataset_file : string | numpy.ndarray
+            Path to the dataset file which can be created with
+            `generate_dataset`, or the matrix returned by
+            `utils.read_dataset` to avoid reading it on every call.
+        exact_output : string | array
+            Output of the exact circuit, a path to the file created by
+            `exact_output` or the values returned by `simulate_native`.
+        threshold : float
+            maximum error of an accepted circuit
+        confidence : float
+            probability that an early decision is right
+        min_samples : int
+            rows of the first chunk, and rows needed to accept the circuit
+        samples : int
+            How many rows of the dataset to use at most, by default every row.
+        base : int
+            Base of the numbers of the dataset.
+
+        Returns
+        -------
+        dict
+            "accepted" True if the error is within the threshold, the "error"
+            of the simulated rows, the half width of its confidence
+            "interval" and the amount of rows simulated in "samples"
+        '''
+        data, exact = self.dataset_matrix(dataset_file, exact_output, samples,
+            base)
+        simulator = self.simulator
+
+        # chunks double in size, so there are only a few looks at the error
+        stops = [min(min_samples, len(data))]
+        while stops[-1] < len(data):
+            stops.append(min(2 * stops[-1], len(data)))
+        widths = [1 if left is None else abs(left - right) + 1
+            for _, left, right in simulator.outputs]
+        test = SequentialTest(metric, threshold, confidence, len(stops),
+            width=max(widths), min_samples=min(min_samples, len(data)))
+
+        added = self.delete_extra(deletion_set)
+        try:
+            start = 0
+            decision = None
+            for stop in stops:
+                approximate = simulator.run(data[start:stop])
+                test.update(exact[start:stop], approximate)
+                start = stop
+                decision = test.decision()
+                if decision is not None:
+                    break
+        finally:
+            for n in added:
+                self.undodelete(n)
+
+        if decision is None:
+            decision = test.error <= threshold
+        return {"accepted": decision, "error": test.error,
+            "interval": test.interval, "samples": test.samples}
+
+    def dataset_matrix(self, dataset_file, exact_output, samples=None,
+        base=16):
+        '''
+        Returns the test vectors of a dataset and the exact output values as
+        matrices with a row per test vector, and prepares the native simulator
+
+        Parameters
+        ----------
+        dataset_file : string | numpy.ndarray
+            path to the dataset file or the matrix returned by
+            `utils.read_dataset`
+        exact_output : string | array
+            output of the exact circuit, a path to the file created by
+            `exact_output` or the values returned by `simulate_native`
+        samples : int
+            How many rows of the dataset to use, by default every row.
+        base : int
+            Base of the numbers of the dataset.
+        '''
+        if self.simulator is None or self.simulator.graph is not self.graph:
+            self.simulator = Simulator(self)
+        simulator = self.simulator
+        data = read_dataset(dataset_file, base, samples) \
+            if isinstance(dataset_file, (str, os.PathLike)) \
+            else np.asarray(dataset_file)[:samples]
+        exact = read_outputs(exact_output)[:len(data) * len(simulator.outputs)] \
+            .reshape(len(data), len(simulator.outputs))
+        return data, exact
+
+    def evaluate_many(self, deletion_sets, metric, dataset_file, exact_output,
+        workers=None, method="native", max_error=None, batch=1):
+        '''
+        Computes the error of many candidate circuits in a pool of processes
+
+        Every candidate is the current circuit with one set of extra nodes
+        deleted, see `evaluate_deletions`. Each worker process receives a copy
+        of the circuit once, and iverilog simulations run in their own
+        temporary folder (in /dev/shm when it is available), so no files are
+        shared between candidates. With the masked method every worker
+        compiles the masked testbench once, in its own folder, and then only
+        simulates. With the iverilog and masked methods and
+        `result_cache`, the workers compute the `error_key` of every
+        candidate, the candidates with the same key are simulated once and
+        the cached errors are not simulated again.
+
+        Parameters
+        ----------
+        deletion_sets : array
+            list of lists of node names, one per candidate
+        metric : string
+            equation to compute the error
+            options med, wce, wcre,mred, msed
+        dataset_file : string
+            Path to the dataset file which can be created with
+            `generate_dataset`.
+        exact_output : string | array
+            Output of the exact circuit, see `evaluate_deletions`.
+        workers : int
+            amount of processes, by default the amount of cpus. With 1 the
+            candidates are evaluated in this process.
+        method : string
+            "native", "iverilog" or "masked", see `evaluate_deletions`
+        max_error : int
+            bound of the worst case error, see `evaluate_deletions`
+        batch : int
+            with the iverilog method, amount of candidates simulated together
+            in one testbench, see `evaluate_variants`. Not used with a
+            max_error.
+
+        Returns
+        -------
+        array
+            error of every candidate, in the order of deletion_sets
+        '''
+        deletion_sets = [list(d) for d in deletion_sets]
+        # the folders of the workers are removed with this one
+        workdir = tempfile.mkdtemp(dir="/dev/shm"
+            if os.access("/dev/shm", os.W_OK) else None)
+        task = (metric, dataset_file, exact_output, method, workdir, max_error)
+
+        workers = os.cpu_count() if workers is None else workers
+        try:
+            if workers == 1:
+                start_worker(self, task)
+                try:
+                    return self.evaluate_pool(deletion_sets, task, batch, map)
+                finally:
+                    start_worker(None, None)
+            with ProcessPoolExecutor(max_workers=workers,
+                initializer=start_worker, initargs=(self, task)) as pool:
+                return self.evaluate_pool(deletion_sets, task, batch,
+                    lambda function, items: pool.map(function, items,
+                    chunksize=max(1, len(items) // (workers * 4))))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def evaluate_pool(self, deletion_sets, task, batch, run):
+        '''
+        Computes the error of every candidate with the worker functions, see
+        `evaluate_many`
+
+        Parameters
+        ----------
+        deletion_sets : array
+            list of lists of node names, one per candidate
+        task : tuple
+            (metric, dataset_file, exact_output, method, workdir, max_error)
+            arguments of `evaluate_deletions`
+        batch : int
+            amount of candidates simulated together by iverilog
+        run : function
+            maps a worker function over a list of items, like `map` or the map
+            of the process pool
+
+        Returns
+        -------
+        array
+            error of every candidate, in the order of deletion_sets
+        '''
+        metric, dataset_file, exact_output, method, workdir, max_error = task
+        keyed = method in ("iverilog", "masked") and self.result_cache
+        keys = [None] * len(deletion_sets)
+        pending = list(range(len(deletion_sets)))
+        errors = {}
+        if keyed and deletion_sets:
+            # simulate one candidate of every key that is not cached
+            keys = list(run(key_in_worker, deletion_sets))
+            unique = {}
+            for j, key in enumerate(keys):
+                unique.setdefault(key, j)
+            for key in unique:
+                error = load(key)
+                if error is not None:
+                    errors[key] = error
+            pending = [j for key, j in unique.items() if key not in errors]
+        candidates = [(deletion_sets[j], keys[j]) for j in pending]
+
+        if method == "iverilog" and batch > 1 and max_error is None:
+            # lists of candidates simulated by the same testbench
+            batches = [candidates[i:i + batch]
+                for i in range(0, len(candidates), batch)]
+            results = [error for batch_errors in
+                run(evaluate_batch_in_worker, batches)
+                for error in batch_errors]
+        else:
+            results = list(run(evaluate_in_worker, candidates))
+        if not keyed:
+            return results
+        errors.update((keys[j], error) for j, error in zip(pending, results))
+        return [errors[key] for key in keys]
+
+    def compile_masked(self, testbench, workdir=None):
+        '''
+        Compiles the masked netlist of the circuit with a testbench
+
+        The executable can simulate any set of deleted nodes without being
+        compiled again, see `simulate_masked`. The executable of a previous
+        call is removed.
+
+        Parameters
+        ----------
+        testbench : string
+            path to the testbench file
+        workdir : string
+            folder where the executable is created and the simulations run,
+            by default the output folder. Every simulation writes
+            `output.txt` in it, so circuits or processes that simulate at the
+            same time need different folders, like with `run_testbench`.
+
+        Returns
+        -------
+        string
+            path to the compiled executable
+        '''
+        workdir = self.output_folder if workdir is None else workdir
+        executable = f"{workdir}{path.sep}{get_name(5)}"
+        self.compile_testbench(testbench, executable, workdir, masked=True)
+
+        if self.masked_executable is not None \
+            and path.exists(self.masked_executable):
+            remove(self.masked_executable)
+        self.masked_executable = executable
+        self.masked_workdir = workdir
+        self.masked_setup = None
+        return executable
+
+    def simulate_masked(self, new_output):
+        '''
+        Simulates the actual circuit tree (with deletions) with the executable
+        created by `compile_masked`, without compiling it again
+
+        Parameters
+        ----------
+        new_output : string
+            Path to the output file where simulation results will be written.
+            The user must provide the full file path and name. If the file
+            exists, it will be overwritten.
+        '''
+        if self.masked_executable is None:
+            raise RuntimeError("Call compile_masked before simulate_masked")
+
+        workdir = self.masked_workdir
+        mask = self.write_mask(f"{workdir}{path.sep}{get_name(5)}.mask")
+        try:
+            result = subprocess.run(["vvp", self.masked_executable,
+                f"+mask={mask}"], cwd=workdir)
+        finally:
+            remove(mask)
+        if result.returncode != 0:
+            raise RuntimeError(f"vvp failed to simulate "
+                f"{self.masked_executable}")
+        rename(f"{workdir}{path.sep}output.txt", new_output)
+
+    def simulate_masked_and_compute_error(self, metric, exact_output,
+        new_output, max_error=None):
+        '''
+        Simulates the actual circuit tree (with deletions) with the executable
+        created by `compile_masked` and computes its error
+
+        Parameters
+        ----------
+        metric : string
+            equation to compute the error
+            options med, wce, wcre,mred, msed
+        exact_output : string
+            Path to the output file of the original exact circuit to compare
+            against. This file can be created with the `exact_output` method.
+        new_output : string
+            Path to the output file where simulation results will be written.
+        max_error : int
+            the `max_error` of the testbench, see `simulate_and_compute_error`
+
+        Returns
+        -------
+        float
+            error of the current circuit tree
+        '''
+        self.simulate_masked(new_output)
+        return compute_error(metric, exact_output, new_output,
+            partial=max_error is not None)
+
+    def simulate_native(self, dataset_file, samples=None, base=16):
+        '''
+        Simulates the actual circuit tree (with deletions) in process, without
+        writing the netlist nor calling icarus
+
+        Parameters
+        ----------
+        dataset_file : string
+            Path to the dataset file which can be created with
+            `generate_dataset`.
+        samples : int
+            How many rows of the dataset to simulate, by default every row.
+        base : int
+            Base of the numbers of the dataset, 16 for the default format of
+            `generate_dataset`.
+
+        Returns
+        -------
+        numpy.ndarray
+            output values with a row per test vector and a column per circuit
+            output, in the same order as the output file of `write_tb`
+        '''
+        if self.simulator is None or self.simulator.graph is not self.graph:
+            self.simulator = Simulator(self)
+        return self.simulator.simulate(dataset_file, samples, base)
+
+    def simulate_native_and_compute_error(self, dataset_file, metric,
+        exact_output, samples=None, base=16, max_error=None):
+        '''
+        Simulates the actual circuit tree (with deletions) in process and
+        computes its error
+
+        Parameters
+        ----------
+        dataset_file : string
+            Path to the dataset file which can be created with
+            `generate_dataset`.
+        metric : string
+            equation to compute the error
+            options med, wce, wcre,mred, msed
+        exact_output : string | array
+            Path to the output file of the original exact circuit, created
+            with `exact_output`, or the values returned by `simulate_native`
+            for the exact circuit.
+        samples : int
+            How many rows of the dataset to simulate, by default every row.
+        base : int
+            Base of the numbers of the dataset.
+        max_error : int
+            bound of the worst case error. With the wce metric the simulation
+            stops at the first chunk of vectors above it, the returned error is
+            then above max_error but not necessarily the worst case. The
+            dataset can then also be the matrix returned by
+            `utils.read_dataset`.
+
+        Returns
+        -------
+        float
+            error of the current circuit tree
+        '''
+        if max_error is not None and metric == "wce":
+            data, exact = self.dataset_matrix(dataset_file, exact_output,
+                samples, base)
+            return self.simulator.worst_case_error(data, exact, max_error)[0]
+        new_output = self.simulate_native(dataset_file, samples, base)
+        return compute_error(metric, exact_output, new_output)
+
+    def incremental_simulation(self, dataset_file, samples=None, base=16):
+        '''
+        Starts a native simulation that follows the changes of the circuit
+
+        The values of every wire are kept for the whole dataset. Every call to
+        `delete` or `undodelete` evaluates again only the fanout cone of the
+        node, which is much faster than simulating the whole circuit when
+        trying one node after another.
+
+        Parameters
+        ----------
+        dataset_file : string
+            Path to the dataset file which can be created with
+            `generate_dataset`.
+        samples : int
+            How many rows of the dataset to simulate, by default every row.
+        base : int
+            Base of the numbers of the dataset.
+
+        Returns
+        -------
+        IncrementalSimulator
+            its `results` attribute holds the output values of the current
+            circuit, in the same order as the output file of `write_tb`. Call
+            its `close` method to stop following the circuit.
+        '''
+        data = read_dataset(dataset_file, base, samples)
+        return IncrementalSimulator(self, data)
+
+    def get_node_errors(self, dataset_file, exact_output=None, constant=None,
+        samples=None, base=16):
+        '''
+        Measures in one pass the error caused by replacing each node of the
+        circuit with a constant
+
+        Parameters
+        ----------
+        dataset_file : string
+            Path to the dataset file which can be created with
+            `generate_dataset`.
+        exact_output : string | array
+            Path to the output file of the exact circuit, created with
+            `exact_output`, or the values returned by `simulate_native`. By
+            default the error is measured against the current circuit.
+        constant : int | string
+            0 or 1 to tie every node to that value, None to use
+            `node_constants`, or "best" to keep the value with the smaller
+            mean error distance.
+        samples : int
+            How many rows of the dataset to simulate, by default every row.
+        base : int
+            Base of the numbers of the dataset.
+
+        Returns
+        -------
+        dict
+            maps every node that is not deleted to a dictionary with its
+            "constant" and the "med", "wce" and "er" of the circuit with that
+            node replaced
+        '''
+        simulation = self.incremental_simulation(dataset_file, samples, base)
+        try:
+            exact = None if exact_output is None \
+                else read_outputs(exact_output)
+            return simulation.node_errors(exact, constant)
+        finally:
+            simulation.close()
+
+    def generate_dataset(self, filename, samples, distribution='uniform', seed=None, **kwargs):
         '''
 
         Generates a dataset of randomly distributed data for each input of the circuit.
         By Default, data is written in columns of n-bit hexadecimal numbers, being each column an input and n its bitwidth.
-        Will create a `dataset` file in the same folder where the original
-        circuit RTL is located.
+        Every number is padded with zeros to the digits of the largest
+        value of its input.
 
         Parameters
         ----------
@@ -603,7 +1768,14 @@ class Circuit:
                 "gaussian" or "normal" for a normal distribution.
                 "uniform" or "rectangular" for a uniform distribution.
                 "triangular" for a triangular distribution.
+                "sobol", "halton" or "stratified" for low-discrepancy
+                samples that need less rows for the same accuracy, see
+                `utils.random_columns`. Use `required_samples` to compare
+                them.
                 TODO: Add more distributions
+        seed: int
+            Seed of the random data, the same seed generates the same
+            dataset. By default the dataset is different every time.
 
         **kwargs: (optional)
 
@@ -611,7 +1783,7 @@ class Circuit:
             The center of the distribution (works only for certain distributions)
         std: int
             Standard deviation of the destribution (only gaussian/normal distribution)
-        limits: int tuple
+        low_limit, high_limit: int
             Lower and upper limit of the dataset. By default it takes the whole range of numbers: [0,2^n-1]
         format: string
             A format identifier to convert data into a desired base. Could be:
@@ -619,38 +1791,89 @@ class Circuit:
                 d for decimal
                 b for binary
                 o for octal
+        start: int
+            Index of the first row. Workers that use the same seed can
+            generate shards of a dataset, from row `start` to `start+samples`,
+            and concatenate them.
         '''
 
+        write_dataset(filename, self.input_widths(), samples, distribution, seed, **kwargs)
 
-        data=[]
-
-        format=kwargs['format'] if ('format' in kwargs) else 'x'
-
+        return
 
-        '''Get inputs information'''
-        inputs_info={}
+    def input_widths(self):
+        '''
+        Returns the bitwidth of every input of the circuit, in the order of
+        the columns of the dataset
+        '''
+        widths=[]
         for i in self.raw_inputs:
-            name=re.search(r' (\S+);', i)
             bits=re.findall(r'[\:[](\d+)', i)
 
             if bits:
-                bitwidth=1+int(bits[0])-int(bits[1])
-                inputs_info[name]=bitwidth
+                widths.append(1+int(bits[0])-int(bits[1]))
             else:
-                inputs_info[name]=1
+                widths.append(1)
+        return widths
 
-        '''Iterate inputs'''
+    def required_samples(self, metric='med', distribution='uniform', confidence=0.95,
+        tolerance=None, relative_tolerance=0.05, pilot=4096, replicates=16, seed=None, **kwargs):
+        '''
+        Estimates how many rows of a dataset are needed to measure the error
+        of the actual circuit tree (with deletions) within a tolerance
 
-        for bitwidth in inputs_info.values():
-            rows=get_random(bitwidth,distribution,samples, **kwargs)
-            format=f'0{bitwidth}b' if format=='b' else format #ensure right number of bits if binary
-            data.append([f'{i:{format}}' for i in rows])
-        data=list(zip(*data)) # Transpose data see: https://stackoverflow.com/questions/10169919/python-matrix-transpose-and-zip
-        np.savetxt(filename,data,fmt='%s')
+        Several pilot datasets are generated in memory with different seeds
+        and simulated natively with and without the deletions. Compare the
+        result of each distribution to choose the dataset size.
 
-        return
+        Parameters
+        ----------
+        metric : string
+            error to measure, one of er, hd, med, mred, msed
+        distribution : string
+            sampling method of the dataset, see `generate_dataset`
+        confidence : float
+            probability that the measured error is within the tolerance
+        tolerance : float
+            maximum absolute difference between the measured and the true
+            error
+        relative_tolerance : float
+            tolerance as a fraction of the error, used if `tolerance` is None
+        pilot : int
+            rows of every pilot dataset, a power of 2 for sobol
+        replicates : int
+            amount of pilot datasets
+        seed : int
+            seed of the pilot datasets
+        **kwargs :
+            parameters of the distribution, see `generate_dataset`
 
-    def write_tb(self, filename, dataset_file, iterations=None, timescale= '10ns / 1ps', delay=10, format='h', dump_vcd=False):
+        Returns
+        -------
+        dict
+            "samples" needed, the pilot "error", the half width of its
+            confidence "interval" and the convergence "rate" of the error,
+            see `circuiterror.required_samples`
+        '''
+        if self.simulator is None or self.simulator.graph is not self.graph:
+            self.simulator = Simulator(self)
+        widths = self.input_widths()
+        nothing_deleted = np.zeros(len(self.graph), dtype=bool)
+
+        errors = []
+        for sequence in np.random.SeedSequence(seed).spawn(replicates):
+            replicate_seed = int(sequence.generate_state(1, np.uint64)[0])
+            data = np.concatenate([np.column_stack(columns) for columns in
+                random_columns(widths, pilot, distribution, replicate_seed, **kwargs)])
+            exact = self.simulator.run(data, nothing_deleted)
+            approximate = self.simulator.run(data)
+            errors.append(sample_errors(metric, exact, approximate)
+                .reshape(exact.shape).mean(axis=1))
+
+        return required_samples(np.array(errors), confidence, tolerance,
+            relative_tolerance, distribution not in LOW_DISCREPANCY)
+
+    def write_tb(self, filename, dataset_file, iterations=None, timescale= '10ns / 1ps', delay=10, format='h', dump_vcd=False, binary=False, progress=1, exact_output=None, max_error=None, miter=False, variants=None):
         '''
         Writes a basic testbench for the circuit.
 
@@ -675,12 +1898,55 @@ class Circuit:
                 'o' for octal
                 'd' for decimal
                 'b' for binary
+        binary: bool
+            Write the outputs as raw binary records instead of decimal text
+            lines. See `circuiterror.map_binary_outputs` for the format, the
+            error functions of `circuiterror` read both formats. Outputs with
+            x or z bits are written as 0. The format relies on the %u records
+            of Icarus, checked by `IcarusTest.test_binary_output` in test.py,
+            so it is off by default.
+        progress: int
+            Display the progress every `progress` iterations, 0 to never
+            display it.
+        exact_output: string
+            Path to the text output file of the exact circuit, created by
+            `exact_output`. Required by `max_error`.
+        max_error: int
+            Bound of the worst case error. After every vector the outputs are
+            compared with the exact output, and the simulation stops at the
+            first output whose error distance is above the bound. The output
+            file then ends with that vector.
+        miter: bool
+            Write a miter testbench, that simulates the circuit next to the
+            exact circuit, a module named `<topmodule>_exact` written with
+            `exact_netlist`. The error of every output is accumulated during
+            the simulation, and the output file only has a summary line, read
+            it with `circuiterror.read_summary`.
+        variants: int
+            Simulate several variants of the circuit with the same test
+            vectors, modules named `<topmodule>_variant<j>` written with
+            `variant_netlists`. Variant j writes its outputs to
+            `output_variant<j>.txt`, or its summary to line j of the output
+            file of a miter testbench.
 
         Returns
         -------
             path to generated file
         '''
 
+        if max_error is not None:
+            if exact_output is None:
+                raise ValueError("write_tb needs the exact_output to check a max_error")
+            if is_binary_output(exact_output):
+                raise ValueError("The exact_output of a testbench with max_error must be a text file")
+        if miter and (binary or max_error is not None):
+            raise ValueError("A miter testbench writes a summary line, it can not be binary or have a max_error")
+        if variants is not None and max_error is not None:
+            raise ValueError("A testbench with variants can not have a max_error")
+
+        '''Suffix of the outputs, modules and accumulators of every variant'''
+        suffixes=[''] if variants is None else [f'_variant{j}' for j in range(variants)]
+
         '''Check for existing dataset'''
         if iterations is None:
             if os.path.exists(dataset_file):
@@ -724,11 +1990,12 @@ class Circuit:
 
         '''Define inputs/outpus reg/wires and variables'''
 
-        for name, bitwidth in zip(outputs_info.keys(), outputs_info.values()):
-            if bitwidth==1:
-                text= f'{text}wire {name};\n'
-            else:
-                text= f'{text}wire [{bitwidth-1}:0] {name};\n'
+        for s in suffixes:
+            for name, bitwidth in zip(outputs_info.keys(), outputs_info.values()):
+                if bitwidth==1:
+                    text= f'{text}wire {name}{s};\n'
+                else:
+                    text= f'{text}wire [{bitwidth-1}:0] {name}{s};\n'
 
 
         for name, bitwidth in zip(inputs_info.keys(), inputs_info.values()):
@@ -738,17 +2005,43 @@ class Circuit:
                 text= f'{text}reg [{bitwidth-1}:0] {name};\n'
 
 
+        if max_error is not None:
+            for name, bitwidth in zip(outputs_info.keys(), outputs_info.values()):
+                text= f'{text}reg [{bitwidth-1}:0] expected_{name};\n'
+
+        if miter:
+            '''Outputs of the exact circuit and error accumulators'''
+            width=max(outputs_info.values())
+            for name, bitwidth in zip(outputs_info.keys(), outputs_info.values()):
+                if bitwidth==1:
+                    text= f'{text}wire exact_{name};\n'
+                else:
+                    text= f'{text}wire [{bitwidth-1}:0] exact_{name};\n'
+            text= f'{text}reg [{width-1}:0] distance, difference;\n' \
+                  f'real relative;\n'
+            for s in suffixes:
+                text= f'{text}reg [{width-1}:0] worst_case{s};\n' \
+                      f'reg [{width+63}:0] distance_sum{s};\n' \
+                      f'reg [{2*width+63}:0] square_sum{s};\n' \
+                      f'reg [63:0] errors{s}, hamming{s};\n' \
+                      f'real relative_sum{s}, worst_relative{s};\n'
+
+        files=['file'] if miter else [f'file{s}' for s in suffixes]
         text= f'{text}\n' \
-              f'integer i, file, mem, temp;\n' \
+              f'integer i, {", ".join(files)}, mem, temp{", exact, stop" if max_error is not None else ""}{", k" if miter else ""};\n' \
               f'\n' \
 
         '''Instantiate DUT'''
-        text= f'{text}{self.topmodule} U0('
         params=self.raw_parameters.split(', ')
-        for p in params[0:-1]:
-            text= f'{text}{p},'
-        text= f'{text}{params[-1]});\n' \
-              f'\n' \
+        for s in suffixes:
+            dut_params=[f'{p}{s}' if p in outputs_info else p for p in params]
+            text= f'{text}{self.topmodule}{s} U0{s}({",".join(dut_params)});\n' \
+                  f'\n'
+
+        if miter:
+            exact_params=[f'exact_{p}' if p in outputs_info else p for p in params]
+            text= f'{text}{self.topmodule}_exact U1({",".join(exact_params)});\n' \
+                  f'\n'
 
         '''Initial statement'''
         text= f'{text}initial begin\n $display("-- Beginning Simulation --");\n\n'
@@ -758,12 +2051,39 @@ class Circuit:
 
         relative_dataset_path = os.path.relpath(dataset_file, start=os.path.dirname(filename))
 
-        text=f'{text} file=$fopen("output.txt","w");\n' \
-             f' mem=$fopen("{relative_dataset_path}", "r");\n'
+        if miter:
+            text=f'{text} file=$fopen("output.txt","w");\n'
+        else:
+            for s in suffixes:
+                text=f'{text} file{s}=$fopen("output{s}.txt","{"wb" if binary else "w"}");\n'
+        text=f'{text} mem=$fopen("{relative_dataset_path}", "r");\n'
+        if max_error is not None:
+            relative_exact_path = os.path.relpath(exact_output, start=os.path.dirname(filename))
+            text=f'{text} exact=$fopen("{relative_exact_path}", "r");\n'
+        if binary:
+            '''Header: magic, version, amount of outputs and words of each output'''
+            words=[(outputs_info[o]+31)//32 for o in list(outputs_info.keys())[::-1]]
+            header=[BINARY_MAGIC, BINARY_VERSION, len(words)] + words
+            for f in files:
+                text=f'{text} $fwrite({f}, "{"%u"*len(header)}"'
+                for h in header:
+                    text=f'{text}, 32\'h{h:08x}'
+                text=f'{text});\n'
+        if miter:
+            for s in suffixes:
+                text=f'{text} distance_sum{s} = 0;\n' \
+                     f' square_sum{s} = 0;\n' \
+                     f' worst_case{s} = 0;\n' \
+                     f' errors{s} = 0;\n' \
+                     f' hamming{s} = 0;\n' \
+                     f' relative_sum{s} = 0.0;\n' \
+                     f' worst_relative{s} = 0.0;\n'
         for i in inputs_info.keys():
             text=f'{text} {i} = 0;\n'
+        if max_error is not None:
+            text=f'{text} stop = 0;\n'
         text=f'{text} #{delay}\n' \
-             f' for (i=0;i<{iterations};i=i+1) begin\n' \
+             f' for (i=0;i<{iterations}{" && !stop" if max_error is not None else ""};i=i+1) begin\n' \
              f'  temp=$fscanf(mem,"'
         for i in range(len(inputs_info)):
             text=f'{text}%{format} '
@@ -771,19 +2091,61 @@ class Circuit:
         for i in inputs_info.keys():
             text=f'{text},{i}'
         text=f'{text});\n' \
-             f'  #{delay}\n' \
-             f'  $fwrite(file, "'
-        for o in range(len(outputs_info.keys())):
-            text=f'{text}%d\\n '
-        text=f'{text}",'
-        for o in list(outputs_info.keys())[::-1][0:-1]:
-            text= f'{text}{o},'
-        text= f'{text}{list(outputs_info.keys())[0]});\n'\
-            + f'  $display("-- Progress: %d/{iterations} --",i+1);\n'\
-              f' end\n' \
-              f' $fclose(file);\n' \
-              f' $fclose(mem);\n' \
-              f' $finish;\n' \
+             f'  #{delay}\n'
+        if miter:
+            '''Accumulate the error of every output'''
+            for s in suffixes:
+                for o in list(outputs_info.keys())[::-1]:
+                    text=f'{text}  distance = {o}{s}>exact_{o} ? {o}{s}-exact_{o} : exact_{o}-{o}{s};\n' \
+                         f'  difference = {o}{s}^exact_{o};\n' \
+                         f'  errors{s} = errors{s} + (distance != 0);\n' \
+                         f'  distance_sum{s} = distance_sum{s} + distance;\n' \
+                         f'  square_sum{s} = square_sum{s} + distance*distance;\n' \
+                         f'  if (distance > worst_case{s}) worst_case{s} = distance;\n' \
+                         f'  for (k=0;k<{width};k=k+1) hamming{s} = hamming{s} + difference[k];\n' \
+                         f'  if (exact_{o} != 0) begin\n' \
+                         f'   relative = distance;\n' \
+                         f'   relative = relative / exact_{o};\n' \
+                         f'   relative_sum{s} = relative_sum{s} + relative;\n' \
+                         f'   if (relative > worst_relative{s}) worst_relative{s} = relative;\n' \
+                         f'  end\n'
+        else:
+            for s in suffixes:
+                text=f'{text}  $fwrite(file{s}, "'
+                for o in range(len(outputs_info.keys())):
+                    text=f'{text}%u' if binary else f'{text}%d\\n '
+                text=f'{text}",'
+                for o in list(outputs_info.keys())[::-1][0:-1]:
+                    text= f'{text}{o}{s},'
+                text= f'{text}{list(outputs_info.keys())[0]}{s});\n'
+        if max_error is not None:
+            '''Stop at the first output above the error bound'''
+            for o in list(outputs_info.keys())[::-1]:
+                text=f'{text}  temp=$fscanf(exact,"%d\\n",expected_{o});\n'
+            bound=f"{max(max(outputs_info.values()), int(max_error).bit_length())}'d{int(max_error)}"
+            checks=[f'({o}>expected_{o} ? {o}-expected_{o} : expected_{o}-{o})>{bound}'
+                for o in list(outputs_info.keys())[::-1]]
+            text=f'{text}  if ({" || ".join(checks)}) begin\n' \
+                 f'   $display("-- Error bound exceeded at vector %d --",i+1);\n' \
+                 f'   stop = 1;\n' \
+                 f'  end\n'
+        if progress == 1:
+            text=f'{text}  $display("-- Progress: %d/{iterations} --",i+1);\n'
+        elif progress:
+            text=f'{text}  if ((i+1)%{progress}==0 || i+1=={iterations})\n' \
+                 f'   $display("-- Progress: %d/{iterations} --",i+1);\n'
+        text=f'{text} end\n'
+        if miter:
+            '''Summary: samples, errors, hamming, distance, square and relative sums, worst cases'''
+            for s in suffixes:
+                text=f'{text} $fwrite(file, "%0d %0d %0d %0d %0d %0d %.17g %.17g\\n", ' \
+                     f'i*{len(outputs_info)}, errors{s}, hamming{s}, distance_sum{s}, square_sum{s}, worst_case{s}, relative_sum{s}, worst_relative{s});\n'
+        for f in files:
+            text=f'{text} $fclose({f});\n'
+        text=f'{text} $fclose(mem);\n'
+        if max_error is not None:
+            text=f'{text} $fclose(exact);\n'
+        text=f'{text} $finish;\n' \
               f'end\n' \
               f'endmodule\n'
 
@@ -793,15 +2155,90 @@ class Circuit:
 
         return
 
+    def structural_hash(self):
+        '''
+        Returns a canonical hash of the logic of the circuit with its
+        deletions, see `optimization.structural_hash`
+
+        Circuits with the same cells, connections and constants get the same
+        hash, even if they were reached with different deletion sets or the
+        deletions leave the same logic after the constants are propagated.
+
+        :return: string
+            sha256 hex digest
+        '''
+        return structural_hash(self)
+
+    def result_key(self, kind, *values):
+        '''
+        Returns the key of a result of the current circuit state in the
+        on-disk cache (see `cache.py`)
+
+        The key combines the structural hash of the circuit, the technology
+        files and the scripts and modules the results depend on, so the
+        results of a circuit with the same logic are reused across candidates
+        and processes. Only results that depend on the function of the
+        circuit, like the errors, can use it, the results of yosys depend on
+        the cells and use `netlist_key`. The results are only cached if
+        `result_cache` is true.
+
+        :param kind: string
+            name of the result, like "error"
+        :param values: strings
+            other values the result depends on
+        :return: string
+            the cache key
+        '''
+        return cache_key(values=[results_key(self.tech_file), kind,
+            self.structural_hash(), *values])
+
+    def netlist_key(self, kind, netlist, *values):
+        '''
+        Returns the key of a result of yosys in the on-disk cache, like
+        `result_key` but keyed by the written netlist instead of the
+        structural hash, since `simplify` keeps the logic but changes the
+        cells
+
+        :param kind: string
+            name of the result, like "resynth" or "area"
+        :param netlist: string
+            netlist returned by `write_to_disk(in_memory="str")`
+        :param values: strings
+            other values the result depends on
+        :return: string
+            the cache key
+        '''
+        return cache_key(values=[results_key(self.tech_file), kind, netlist,
+            *values])
+
     def resynth(self):
         '''
         Calls resynthesis function to reduce circuit structure using logic synthesis optimizations/mapping
 
+        The resynthesized netlist is cached by the written netlist, so the
+        same netlist is not resynthesized again, see `netlist_key`.
+
         :return: path-like string
             path to resynthetized file
         '''
-        name=get_name(5)
-        self.netl_file =resynthesis(self.write_to_disk(name),self.tech_file,self.topmodule)
+        netlist = self.write_to_disk(in_memory="str")
+        key = self.netlist_key("resynth", netlist) if self.result_cache \
+            else None
+        cached = None if key is None else load(key)
+        if cached is None:
+            name=get_name(5)
+            with open(f'{self.output_folder}/{name}.v', 'w') as netlist_file:
+                netlist_file.write(netlist)
+            self.netl_file =resynthesis(f'{self.output_folder}/{name}.v',self.tech_file,self.topmodule)
+            os.remove(f'{self.output_folder}/{name}.v')
+            if key is not None:
+                with open(self.netl_file, 'r') as netlist_file:
+                    store(key, netlist_file.read())
+        else:
+            # the same netlist was resynthesized before
+            self.netl_file = f"{self.output_folder}{path.sep}netlist.v"
+            with open(self.netl_file, 'w') as netlist_file:
+                netlist_file.write(cached)
 
         netlist = Netlist(self.netl_file, self.technology)
         self.netl_root = netlist.root
@@ -810,25 +2247,203 @@ class Circuit:
         self.raw_inputs = netlist.raw_inputs
         self.raw_outputs = netlist.raw_outputs
         self.raw_parameters = netlist.raw_parameters
-
-        os.remove(f'{self.output_folder}/{name}.v')
+        self.rebuild_graph()
 
         return self.netl_file
 
-    def get_area(self, method = 'yosys'):
+    def simplify(self):
+        '''
+        Removes the logic that became constant or dangling after the
+        deletions without leaving python, see `simplify_netlist`
+
+        The deleted nodes are replaced by their constants, the constants are
+        propagated through the cell functions, buffers and pairs of
+        inverters are removed, the cells fed by constants are replaced by
+        smaller cells and the nodes that do not drive any output are
+        removed. The circuit tree is changed in place and the graph is built
+        again, so it takes milliseconds instead of a full `resynth`. The
+        nodes that remain keep their names, so there are no delete labels
+        left afterwards.
+
+        :return: dict
+            amount of nodes that were deleted, constant, buffers, dead,
+            resized or split
+        '''
+        stats = simplify_netlist(self)
+        self.rebuild_graph()
+        return stats
+
+    def rebuild_graph(self):
+        '''
+        Builds the graph again after the circuit tree changed, the
+        simulators, the power and timing models and the observers of the
+        previous graph are dropped
         '''
-        Calls yosys script to estimate circuit area
+        self.graph = CircuitGraph(self.netl_root)
+        self.simulator = None
+        self.masked_executable = None
+        self.masked_setup = None
+        # the observers refer to the nodes of the previous graph
+        self.observers = []
+        self.power = None
+        self.timing = None
+        self.count_area()
+
+    def get_area(self, method = 'native'):
+        '''
+        Estimates the circuit area
         Add here any other method for area estimation implemented in the future
 
-        :return: string
+        The native method adds the liberty area of the nodes that are not
+        deleted. The total is updated by `delete` and `undodelete`, so it
+        costs nothing. The yosys method runs the yosys stat command on the
+        netlist, which gives the same area, and the resynth method
+        resynthesizes a copy of the netlist first (the circuit is not
+        modified). The yosys results are cached by the written netlist, see
+        `netlist_key`.
+
+        :param method: string
+            "native", "yosys" or "resynth"
+        :return: float
             area estimation value
         '''
 
+        if method == 'native':
+            return round(self.total_area, 6)
+        elif method not in ('yosys', 'resynth'):
+            raise ValueError(f'{method} is not a valid/implemented area estimation method')
+
+        netlist = self.write_to_disk(in_memory="str")
+        key = self.netlist_key("area", netlist, method) if self.result_cache \
+            else None
+        area = None if key is None else load(key)
+        if area is not None:
+            return area
+
         if method == 'yosys':
             name=get_name(5)
-            area=ys_get_area(self.write_to_disk(name),self.tech_file,self.topmodule)
+            with open(f'{self.output_folder}/{name}.v', 'w') as netlist_file:
+                netlist_file.write(netlist)
+            area=ys_get_area(f'{self.output_folder}/{name}.v',self.tech_file,self.topmodule)
             os.remove(f'{self.output_folder}/{name}.v')
-
-            return area
         else:
-            raise ValueError(f'{method} is not a valid/implemented area estimation method')
+            folder = tempfile.mkdtemp(dir=self.output_folder)
+            try:
+                rtl = f"{folder}{path.sep}{self.topmodule}.v"
+                with open(rtl, 'w') as netlist_file:
+                    netlist_file.write(netlist)
+                netlist = resynthesis(rtl, self.tech_file, self.topmodule,
+                    folder)
+                area = ys_get_area(netlist, self.tech_file, self.topmodule,
+                    folder)
+            finally:
+                shutil.rmtree(folder)
+
+        if key is not None:
+            store(key, area)
+        return area
+
+    def get_power(self, duration=None):
+        '''
+        Estimates the circuit power from the saif activity and the liberty
+        leakage and internal and switching energies, see `PowerModel`
+
+        The power model is created by the first call and it observes the
+        circuit, so after `delete` and `undodelete` only the nodes next to
+        the changed node are evaluated again. The activity of the saif file
+        is not recomputed for the deletions. Without a saif file only the
+        leakage is counted.
+
+        :param duration: float
+            seconds the saif toggle counts were measured over, by default
+            the DURATION of the saif file. A new value builds the model again.
+        :return: float
+            power of the nodes that are not deleted, in watts
+        '''
+        if self.power is None or (duration is not None
+            and duration != self.power.duration):
+            if self.power is not None:
+                self.remove_observer(self.power.update)
+            self.power = PowerModel(self, duration)
+        return self.power.total
+
+    def get_delay(self, path=False):
+        '''
+        Computes the critical path delay with the liberty NLDM tables, see
+        `TimingModel`
+
+        The timing model is created by the first call and it observes the
+        circuit, so after `delete` and `undodelete` only the arrival times of
+        the affected cone are computed again. The deleted nodes and the
+        wires assigned to constants are not part of any path.
+
+        :param path: bool
+            if true, the names of the nodes of the critical path are also
+            returned
+        :return: float | (float, list)
+            arrival time of the latest output, in the time unit of the
+            liberty file, and the critical path
+        '''
+        if self.timing is None:
+            self.timing = TimingModel(self)
+        if path:
+            return self.timing.delay, self.timing.critical_path()
+        return self.timing.delay
+
+
+# circuit and evaluation parameters of the worker processes of evaluate_many
+worker_state = None
+
+@lru_cache(maxsize=None)
+def results_key(tech):
+    '''
+    Returns the key of the files the results of `Circuit.result_key` and
+    `Circuit.netlist_key` depend on: the technology files, the yosys scripts
+    and the modules that write, resynthesize and simulate the netlist
+    '''
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return cache_key([f"{current_dir}/templates/{tech}.v",
+        f"{current_dir}/templates/{tech}.lib",
+        f"{current_dir}/templates/resynth.ys",
+        f"{current_dir}/templates/abc.script",
+        f"{current_dir}/templates/stat.ys",
+        f"{current_dir}/synthesis.py", f"{current_dir}/circuit.py",
+        f"{current_dir}/circuiterror.py", f"{current_dir}/optimization.py"],
+        ["results"])
+
+def start_worker(circuit, task):
+    '''
+    Stores the circuit copy of a worker process of `Circuit.evaluate_many`
+    '''
+    global worker_state
+    worker_state = (circuit, task)
+
+def key_in_worker(deletion_set):
+    '''
+    Computes the `Circuit.error_key` of one candidate inside a worker process
+    of `Circuit.evaluate_many`
+    '''
+    circuit, (metric, dataset_file, exact_output, _, _, max_error) = \
+        worker_state
+    return circuit.error_key(deletion_set, metric, dataset_file, exact_output,
+        max_error)
+
+def evaluate_in_worker(candidate):
+    '''
+    Evaluates one (deletion set, key) candidate inside a worker process of
+    `Circuit.evaluate_many`
+    '''
+    circuit, task = worker_state
+    deletion_set, key = candidate
+    return circuit.evaluate_deletions(deletion_set, *task, key=key)
+
+def evaluate_batch_in_worker(candidates):
+    '''
+    Evaluates a batch of (deletion set, key) candidates with one testbench
+    inside a worker process of `Circuit.evaluate_many`
+    '''
+    circuit, (metric, dataset_file, exact_output, _, workdir, _) = worker_state
+    deletion_sets = [deletion_set for deletion_set, _ in candidates]
+    keys = [key for _, key in candidates]
+    return circuit.evaluate_variants(deletion_sets, metric, dataset_file,
+        exact_output, workdir, keys=None if None in keys else keys)
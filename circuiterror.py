@@ -1,5 +1,30 @@
+import os
+from itertools import zip_longest
+from statistics import NormalDist
+
 import numpy as np
 
+# metrics computed by `compute_errors`
+METRICS = ("er", "hd", "med", "wce", "wcre", "mred", "msed")
+
+# metrics that are the mean of an error of every sample
+MEAN_METRICS = ("er", "hd", "med", "mred", "msed")
+
+# amount of numbers compared at a time by `compute_errors`
+CHUNK_SIZE = 2**20
+
+# bytes read at a time from an output text file
+BLOCK_SIZE = 2**22
+
+# first words of the binary output files written by `Circuit.write_tb`,
+# the magic number reads "AXLS" in little endian
+BINARY_MAGIC = 0x534C5841
+BINARY_VERSION = 1
+
+# popcount of every byte value, used to compute hamming distances
+BYTE_ONES = np.array([bin(byte).count("1") for byte in range(256)],
+    dtype=np.uint8)
+
 def extract_numbers(filename):
     '''
     Reads a txt file and returns the list of numbers inside the file
@@ -25,7 +50,268 @@ def extract_numbers(filename):
     return result
 
 
-def compute_error(metric, original, approximate):
+def load_numbers(filename):
+    '''
+    Reads a txt file and returns the numbers inside the file as an integer
+    array
+
+    Same result as `extract_numbers`, but the file is parsed by numpy when it
+    only has digits. Rows that are not a number, like the x values of a
+    simulation, are skipped.
+
+    Parameters
+    ----------
+    filename : string
+        name of the text file to read
+
+    Returns
+    -------
+    numpy.ndarray
+        numbers of each row of the file, uint64 or object if some number
+        needs more than 64 bits
+    '''
+    with open(filename, 'rb') as file:
+        return parse_numbers(file.read())
+
+
+def iter_numbers(filename, chunk_size=CHUNK_SIZE):
+    '''
+    Reads a txt file in blocks and yields the numbers inside the file
+
+    Only one block of the file is in memory at a time.
+
+    Parameters
+    ----------
+    filename : string
+        name of the text file to read
+    chunk_size : int
+        amount of numbers of every chunk, the last one can be shorter
+
+    Returns
+    -------
+    generator
+        integer arrays with the numbers of the file, like `load_numbers`
+    '''
+    return rechunk(read_blocks(filename), chunk_size)
+
+
+def read_blocks(filename):
+    '''
+    Yields the numbers of every block of BLOCK_SIZE bytes of a txt file
+    '''
+    rest = b""
+    with open(filename, 'rb') as file:
+        while True:
+            block = file.read(BLOCK_SIZE)
+            if not block:
+                break
+            # a number can be cut at the end of the block
+            cut = max(block.rfind(c) for c in (b" ", b"\t", b"\r", b"\n"))
+            if cut >= 0:
+                yield parse_numbers(rest + block[:cut + 1])
+                rest = block[cut + 1:]
+            else:
+                rest = rest + block
+    yield parse_numbers(rest)
+
+
+def rechunk(arrays, chunk_size):
+    '''
+    Yields the values of a sequence of arrays in chunks of `chunk_size`
+    values, the last one can be shorter
+    '''
+    pending = np.zeros(0, dtype=np.uint64)
+    for values in arrays:
+        if values.dtype != pending.dtype:
+            values = values.astype(object)
+            pending = pending.astype(object)
+        pending = np.concatenate((pending, values))
+        while len(pending) >= chunk_size:
+            yield pending[:chunk_size]
+            pending = pending[chunk_size:]
+    if len(pending):
+        yield pending
+
+
+def parse_numbers(content):
+    '''
+    Returns the numbers of the text rows of a testbench output file as an
+    integer array, see `load_numbers`
+    '''
+    if not content.strip():
+        return np.zeros(0, dtype=np.uint64)
+    if not content.translate(None, b"0123456789 \t\r\n"):
+        values = np.fromstring(content, dtype=np.uint64, sep=' ')
+        # numbers that do not fit in 64 bits saturate
+        if values.max() < np.iinfo(np.uint64).max:
+            return values
+    return to_integers([int(token) for token in content.split()
+        if token.isdigit()])
+
+
+def to_integers(values):
+    '''
+    Returns an uint64 array with the values, or an object array of python
+    integers if some value does not fit in 64 bits
+    '''
+    if all(0 <= v < 2**64 for v in values):
+        return np.array(values, dtype=np.uint64)
+    result = np.empty(len(values), dtype=object)
+    result[:] = values
+    return result
+
+
+def is_binary_output(filename):
+    '''
+    Returns True if the file is a binary output file written by a testbench
+    created with `Circuit.write_tb(..., binary=True)`
+    '''
+    with open(filename, 'rb') as file:
+        return file.read(4) == BINARY_MAGIC.to_bytes(4, "little")
+
+
+def map_binary_outputs(filename):
+    '''
+    Maps the records of a binary output file without reading them
+
+    The file starts with a header of 32 bit words: BINARY_MAGIC,
+    BINARY_VERSION, the amount of outputs and the amount of words of each
+    output. Then there is one record per test vector with the value of every
+    output, in the same order as the rows of the text output file, as little
+    endian 32 bit words with the least significant word first. An incomplete
+    last record is ignored.
+
+    Parameters
+    ----------
+    filename : string
+        path to the binary output file
+
+    Returns
+    -------
+    numpy.memmap, array
+        uint32 matrix with one row per record, and the amount of words of
+        each output
+    '''
+    header = np.fromfile(filename, dtype="<u4", count=3)
+    if len(header) < 3 or header[0] != BINARY_MAGIC:
+        raise ValueError(f"{filename} is not a binary output file")
+    if header[1] != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary output version {header[1]}")
+    words = np.fromfile(filename, dtype="<u4", count=3 + int(header[2]))[3:]
+    words = [int(w) for w in words]
+    offset = 4 * (3 + len(words))
+    record = sum(words)
+    samples = (os.path.getsize(filename) - offset) // (4 * record)
+    if samples == 0:
+        return np.zeros((0, record), dtype="<u4"), words
+    records = np.memmap(filename, dtype="<u4", mode="r", offset=offset,
+        shape=(samples, record))
+    return records, words
+
+
+def binary_values(records, words):
+    '''
+    Returns the output values of some records of a binary output file
+
+    Parameters
+    ----------
+    records : numpy.ndarray
+        rows of the matrix returned by `map_binary_outputs`
+    words : array
+        amount of words of each output
+
+    Returns
+    -------
+    numpy.ndarray
+        output values, in the order of the text output file
+    '''
+    columns = []
+    start = 0
+    for count in words:
+        part = records[:, start:start + count]
+        if count <= 2:
+            column = part[:, 0].astype(np.uint64)
+            if count == 2:
+                column |= part[:, 1].astype(np.uint64) << np.uint64(32)
+        else:
+            column = np.zeros(len(part), dtype=object)
+            for w in range(count):
+                column += part[:, w].astype(object) << (32 * w)
+        columns.append(column)
+        start += count
+    if any(c.dtype == object for c in columns):
+        columns = [c.astype(object) for c in columns]
+    return np.stack(columns, axis=1).ravel()
+
+
+def read_outputs(outputs):
+    '''
+    Returns the output numbers of a simulation
+
+    Parameters
+    ----------
+    outputs : string | array
+        path to a testbench output file, text or binary, or the output values
+        of a native simulation
+
+    Returns
+    -------
+    numpy.ndarray
+        numbers in the order of the testbench output file, uint64 or object
+        if some number needs more than 64 bits
+    '''
+    if isinstance(outputs, (str, os.PathLike)):
+        if is_binary_output(outputs):
+            return binary_values(*map_binary_outputs(outputs))
+        return load_numbers(outputs)
+    return as_outputs(outputs)
+
+
+def iter_outputs(outputs, chunk_size=CHUNK_SIZE):
+    '''
+    Yields the output numbers of a simulation in chunks
+
+    Parameters
+    ----------
+    outputs : string | array
+        path to a testbench output file, text or binary, or the output values
+        of a native simulation, which can be a `numpy.memmap`
+    chunk_size : int
+        amount of numbers of every chunk, the last one can be shorter
+
+    Returns
+    -------
+    generator
+        integer arrays like the one returned by `read_outputs`
+    '''
+    if isinstance(outputs, (str, os.PathLike)):
+        if is_binary_output(outputs):
+            records, words = map_binary_outputs(outputs)
+            rows = max(chunk_size // len(words), 1)
+            yield from rechunk((binary_values(records[i:i + rows], words)
+                for i in range(0, len(records), rows)), chunk_size)
+        else:
+            yield from iter_numbers(outputs, chunk_size)
+        return
+    outputs = np.asarray(outputs).ravel()
+    for start in range(0, len(outputs), chunk_size):
+        yield as_outputs(outputs[start:start + chunk_size])
+
+
+def as_outputs(values):
+    '''
+    Returns an array of output values as uint64, or object if some value does
+    not fit in 64 bits
+    '''
+    values = np.asarray(values).ravel()
+    if values.dtype == object or values.dtype == np.uint64:
+        return values
+    if values.size and values.min() < 0:
+        return to_integers(values.tolist())
+    return values.astype(np.uint64)
+
+
+def compute_error(metric, original, approximate, partial=False):
     '''
     Computes the error between two different testbench output files
 
@@ -33,60 +319,575 @@ def compute_error(metric, original, approximate):
     ----------
     metric : string
         equation to measure the error
-        options med, wce, wcre,mred, msed
-    original : string
-        path to the original results text file
-    approximate : string
-        path to the approximate results text file
+        options er, hd, med, wce, wcre, mred, msed
+    original : string | array
+        path to the original results text file, or the output values returned
+        by `Circuit.simulate_native`
+    approximate : string | array
+        path to the approximate results text file, or the output values
+        returned by `Circuit.simulate_native`
+    partial : bool
+        allow an approximate output shorter than the original, see
+        `compute_errors`
     '''
+    return compute_errors(original, approximate, [metric],
+        partial=partial)[metric]
+
+
+def compute_errors(original, approximate, metrics=METRICS,
+    chunk_size=CHUNK_SIZE, partial=False):
+    '''
+    Computes several error metrics between two simulation outputs
+
+    Both outputs are read once, in chunks of `chunk_size` numbers, and every
+    metric is computed with numpy over each chunk. The memory used does not
+    depend on the amount of samples.
+
+    Parameters
+    ----------
+    original : string | array
+        path to the original results text file, or the output values returned
+        by `Circuit.simulate_native`
+    approximate : string | array
+        path to the approximate results text file, or the output values
+        returned by `Circuit.simulate_native`
+    metrics : array
+        metrics to compute, by default every metric in `METRICS`
+    chunk_size : int
+        amount of numbers compared at a time
+    partial : bool
+        allow an approximate output shorter than the original, like the
+        output of a testbench that stopped at the first vector above its
+        `max_error`. Only the first values of the original are compared.
+
+    Returns
+    -------
+    dict
+        maps every metric to its value
 
-    # Read original output content
-    original_output = extract_numbers(original)
+    Examples
+    -------
+        >>> errors = compute_errors([4, 0, 10], [5, 0, 2])
+        >>> errors["med"], errors["wce"], errors["er"], errors["hd"]
+        (3.0, 8, 0.667, 0.667)
+    '''
+    accumulator = ErrorAccumulator(metrics)
 
-    # Read modified output content
-    approximate_output = extract_numbers(approximate)
+    original_len = 0
+    approx_len = 0
+    for original_output, approximate_output in zip_longest(
+        iter_outputs(original, chunk_size),
+        iter_outputs(approximate, chunk_size)):
+        if original_output is None or approximate_output is None:
+            # keep counting to report the length of both outputs
+            original_len += 0 if original_output is None \
+                else len(original_output)
+            approx_len += 0 if approximate_output is None \
+                else len(approximate_output)
+            continue
+        if partial and len(approximate_output) < len(original_output):
+            original_output = original_output[:len(approximate_output)]
+        original_len += len(original_output)
+        approx_len += len(approximate_output)
+        if original_len == approx_len:
+            accumulator.update(original_output, approximate_output)
 
-    original_len = len(original_output)
-    approx_len = len(approximate_output)
+    if partial and approx_len < original_len:
+        original_len = approx_len
 
     assert original_len == approx_len, f"The output of the original and the approximate simulations doesn't match: {original_len}!={approx_len}. Make sure both outputs are being generated correctly."
 
-    # compute the error distance ED := |a - a'|
-    error_distance = [abs(original_output[x] - approximate_output[x])
-        for x in range(0,len(original_output))]
-
-    square_error_distance = [ error_distance[x]**2 for x in range(0,len(error_distance))]
-
-    # compute the relative error distance RED := ED / a
-    relative_error_distance = [
-        0 if original_output[x] == 0 else error_distance[x]/original_output[x]
-        for x in range(0,len(original_output))]
-
-    # Error Rate:
-    if (metric == "er"):
-        return round(sum((error>0 for error in error_distance))/total,3)
-
-    # Mean Hamming Distance see: https://stackoverflow.com/questions/40875282/fastest-way-to-get-hamming-distance-for-integer-array
-    if (metric == "hd"):
-        hamming_distance=np.bitwise_xor(original_output,approximate_output)
-        hamming_distance=[f'{hd:b}'.count('1') for hd in hamming_distance]
-        return round(np.mean(hamming_distance),3)
-
-    # Mean Error Distance MED := sum { ED(bj,b) * pj }
-    if (metric == "med"):
-        mean_error = sum(error_distance) / len(error_distance)
-        return round(mean_error,3)
-
-    # Worst Case Error
-    elif (metric == "wce"):
-        return max(error_distance)
-
-    # Mean Relative Error Distance
-    elif (metric == "mred"):
-        mred = sum(relative_error_distance)/len(relative_error_distance)
-        return round(mred,3)
-
-    # Mean Square Error Distance
-    elif (metric == "msed"):
-        msed = sum(square_error_distance)/len(square_error_distance)
-        return round(msed,3)
+    return accumulator.errors()
+
+
+class ErrorAccumulator:
+    '''
+    Running error metrics of two outputs that are compared in chunks
+
+    Sums are kept as python integers, so the result does not depend on the
+    size of the chunks.
+
+    Parameters
+    ----------
+    metrics : array
+        metrics to compute, options er, hd, med, wce, wcre, mred, msed
+
+    Examples
+    -------
+        >>> accumulator = ErrorAccumulator(["med", "wce"])
+        >>> accumulator.update([4, 0], [5, 0])
+        >>> accumulator.update([10], [2])
+        >>> accumulator.errors()
+        {'med': 3.0, 'wce': 8}
+    '''
+    def __init__(self, metrics=METRICS):
+        unknown = [m for m in metrics if m not in METRICS]
+        if unknown:
+            raise ValueError(f"Unknown error metric {unknown[0]}, options "
+                f"are {', '.join(METRICS)}")
+        self.metrics = list(metrics)
+        self.samples = 0
+        self.error_count = 0
+        self.distance_sum = 0
+        self.square_sum = 0
+        self.hamming_sum = 0
+        self.relative_sum = 0.0
+        self.worst_case = 0
+        self.worst_relative = 0.0
+
+    def update(self, original, approximate):
+        '''
+        Adds a chunk of output values to the metrics
+
+        Parameters
+        ----------
+        original : array
+            values of the original outputs
+        approximate : array
+            values of the approximate outputs, same length as `original`
+        '''
+        original = as_outputs(original)
+        approximate = as_outputs(approximate)
+        if original.dtype == object or approximate.dtype == object:
+            original = original.astype(object)
+            approximate = approximate.astype(object)
+        if len(original) == 0:
+            return
+        self.samples += len(original)
+
+        # compute the error distance ED := |a - a'|
+        error_distance = error_distances(original, approximate)
+        worst_case = int(error_distance.max())
+        self.worst_case = max(self.worst_case, worst_case)
+
+        # Error Rate
+        if "er" in self.metrics:
+            self.error_count += int(np.count_nonzero(error_distance))
+
+        # Hamming Distance
+        if "hd" in self.metrics:
+            ones = hamming_distances(original, approximate)
+            self.hamming_sum += exact_sum(ones, ones.max())
+
+        # Error Distance
+        if "med" in self.metrics:
+            self.distance_sum += exact_sum(error_distance, worst_case)
+
+        # Relative Error Distance RED := ED / a
+        if "wcre" in self.metrics or "mred" in self.metrics:
+            red = relative_error_distances(error_distance, original)
+            self.worst_relative = max(self.worst_relative, float(red.max()))
+            self.relative_sum += float(red.sum())
+
+        # Square Error Distance
+        if "msed" in self.metrics:
+            if error_distance.dtype == object or worst_case >= 2**32:
+                square = error_distance.astype(float) ** 2
+                self.square_sum += float(square.sum())
+            else:
+                square = error_distance * error_distance
+                self.square_sum += exact_sum(square, worst_case ** 2)
+
+    def errors(self):
+        '''
+        Returns a dict that maps every metric to its value over all the
+        chunks
+        '''
+        total = max(self.samples, 1)
+        values = {
+            # Error Rate
+            "er": lambda: round(self.error_count / total, 3),
+            # Mean Hamming Distance
+            "hd": lambda: round(self.hamming_sum / total, 3),
+            # Mean Error Distance MED := sum { ED(bj,b) * pj }
+            "med": lambda: round(self.distance_sum / total, 3),
+            # Worst Case Error
+            "wce": lambda: self.worst_case,
+            # Worst Case Relative Error
+            "wcre": lambda: round(self.worst_relative, 3),
+            # Mean Relative Error Distance
+            "mred": lambda: round(self.relative_sum / total, 3),
+            # Mean Square Error Distance
+            "msed": lambda: round(self.square_sum / total, 3),
+        }
+        return {metric: values[metric]() for metric in self.metrics}
+
+
+def read_summary(filename, metrics=METRICS):
+    '''
+    Reads the summary line written by a miter testbench, see
+    `Circuit.write_tb`, and returns the error metrics
+
+    The line has the amount of compared output values, the amount of
+    erroneous values, the sum of the hamming distances, the sums of the error
+    distances and of their squares, the worst case error, the sum of the
+    relative error distances and the worst case relative error.
+
+    Parameters
+    ----------
+    filename : string
+        path to the output file of the miter testbench
+    metrics : array
+        metrics to compute, options er, hd, med, wce, wcre, mred, msed
+
+    Returns
+    -------
+    dict
+        value of every metric, the same as `compute_errors` returns
+    '''
+    return read_summaries(filename, metrics)[0]
+
+
+def read_summaries(filename, metrics=METRICS):
+    '''
+    Reads every summary line written by a miter testbench with variants, see
+    `read_summary`
+
+    Returns
+    -------
+    array
+        dict with the metrics of every variant, in the order of the lines
+    '''
+    with open(filename) as file:
+        lines = [line.split() for line in file if line.strip()]
+    if not lines or any(len(fields) != 8 for fields in lines):
+        raise ValueError(f"{filename} is not the summary of a miter testbench")
+
+    summaries = []
+    for fields in lines:
+        accumulator = ErrorAccumulator(metrics)
+        accumulator.samples, accumulator.error_count, accumulator.hamming_sum, \
+            accumulator.distance_sum, accumulator.square_sum, \
+            accumulator.worst_case = [int(field) for field in fields[:6]]
+        accumulator.relative_sum, accumulator.worst_relative = \
+            [float(field) for field in fields[6:]]
+        summaries.append(accumulator.errors())
+    return summaries
+
+
+def sample_errors(metric, original, approximate):
+    '''
+    Returns the error of every output value for a metric that is a mean, the
+    metric is the mean of the returned array
+
+    Parameters
+    ----------
+    metric : string
+        one of MEAN_METRICS
+    original, approximate : array
+        output values of the original and the approximate circuits
+
+    Returns
+    -------
+    numpy.ndarray
+        float array with the error of every value
+    '''
+    if metric not in MEAN_METRICS:
+        raise ValueError(f"{metric} is not the mean of the sample errors, "
+            f"options are {', '.join(MEAN_METRICS)}")
+    original = as_outputs(original)
+    approximate = as_outputs(approximate)
+    if original.dtype == object or approximate.dtype == object:
+        original = original.astype(object)
+        approximate = approximate.astype(object)
+    error_distance = error_distances(original, approximate)
+    if metric == "er":
+        return (error_distance != 0).astype(float)
+    if metric == "hd":
+        return hamming_distances(original, approximate).astype(float)
+    if metric == "mred":
+        return relative_error_distances(error_distance, original)
+    error_distance = error_distance.astype(float)
+    return error_distance ** 2 if metric == "msed" else error_distance
+
+
+def required_samples(errors, confidence=0.95, tolerance=None,
+    relative_tolerance=0.05, independent=True):
+    '''
+    Estimates the amount of samples needed to measure a mean error within a
+    tolerance with some confidence
+
+    The pilot errors come from several replicates of the same sampling
+    method with different seeds. For independent samples the standard error
+    of the mean decreases as n^-1/2. For low-discrepancy samples its rate is
+    estimated from the spread of the replicate means with all the samples and
+    with half of them.
+
+    Parameters
+    ----------
+    errors : numpy.ndarray
+        matrix with a row per replicate and a column per sample, see
+        `sample_errors`
+    confidence : float
+        probability that the measured error is within the tolerance
+    tolerance : float
+        maximum absolute difference between the measured and the true error
+    relative_tolerance : float
+        tolerance as a fraction of the error, used if `tolerance` is None
+    independent : bool
+        whether the samples are independent, False for low-discrepancy
+        sampling
+
+    Returns
+    -------
+    dict
+        "samples" needed, the pilot "error", the half width of its confidence
+        "interval" and the convergence "rate" of the standard error
+
+    Examples
+    -------
+        >>> errors = np.array([[0., 2., 0., 2.], [2., 0., 2., 0.]])
+        >>> required_samples(errors, tolerance=0.1)["samples"]
+        440
+    '''
+    errors = np.asarray(errors, dtype=float)
+    replicates, samples = errors.shape
+    error = float(errors.mean())
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    if tolerance is None:
+        tolerance = relative_tolerance * abs(error)
+
+    if independent:
+        std = float(errors.std(ddof=1)) / samples ** 0.5
+        rate = 0.5
+    else:
+        if replicates < 2:
+            raise ValueError("Low-discrepancy samples need two replicates or "
+                "more to estimate the error")
+        std = float(errors.mean(axis=1).std(ddof=1))
+        half = float(errors[:, :samples // 2].mean(axis=1).std(ddof=1))
+        rate = float(np.clip(np.log2(half / std), 0.5, 1.5)) \
+            if std > 0 and half > 0 else 0.5
+
+    if std == 0:
+        needed = samples
+    elif tolerance <= 0:
+        raise ValueError("The tolerance must be positive")
+    else:
+        needed = int(np.ceil(samples * (z * std / tolerance) ** (1 / rate)))
+    return {"samples": needed, "error": error, "interval": z * std,
+        "rate": rate}
+
+
+class SequentialTest:
+    '''
+    Decides whether the error of a circuit is within a threshold while the
+    simulation results arrive in chunks
+
+    Mean metrics keep a confidence interval of the mean error of a test
+    vector, and the circuit is accepted or rejected as soon as the interval
+    is completely below or above the threshold. Worst case metrics can only
+    reject early, when the worst error found is already above the threshold.
+
+    er uses the Wilson score interval, which holds when no error has been
+    seen yet and needs about 3.84 / threshold error-free vectors to accept.
+    The other mean metrics use the normal interval of the mean with the
+    sample variance, once `min_samples` test vectors are simulated: the mean
+    of that many vectors is close to normal, and a circuit whose errors are
+    too rare to appear in them is not accepted early with a zero width
+    interval. The upper bound is clipped to the largest error of a test
+    vector, see `largest_error`, when the width of the outputs is given.
+
+    Parameters
+    ----------
+    metric : string
+        options er, hd, med, wce, wcre, mred, msed
+    threshold : float
+        maximum error of an accepted circuit
+    confidence : float
+        probability that an early decision is right
+    looks : int
+        how many times `decision` is called, the confidence of every
+        interval is raised so that the whole test keeps `confidence`
+    width : int
+        bits of the widest output, optional
+    min_samples : int
+        test vectors needed to accept a circuit, and to decide with the mean
+        metrics other than er
+
+    Examples
+    -------
+        >>> test = SequentialTest("er", 0.01)
+        >>> test.update(np.full((1000, 1), 100), np.full((1000, 1), 100))
+        >>> test.decision(), test.samples
+        (None, 1000)
+        >>> test.update(np.full((1000, 1), 100), np.full((1000, 1), 100))
+        >>> test.decision(), test.samples
+        (True, 2000)
+    '''
+    def __init__(self, metric, threshold, confidence=0.95, looks=1,
+        width=None, min_samples=1024):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown error metric {metric}, options are "
+                f"{', '.join(METRICS)}")
+        self.metric = metric
+        self.threshold = threshold
+        self.min_samples = min_samples
+        # probability that one of the intervals is wrong
+        self.delta = (1 - confidence) / looks
+        self.z = NormalDist().inv_cdf(1 - self.delta / 2)
+        self.largest = float("inf")
+        if metric in MEAN_METRICS and width is not None:
+            self.largest = largest_error(metric, width)
+        self.samples = 0
+        self.total = 0.0
+        self.square_total = 0.0
+        self.worst = ErrorAccumulator([metric]) \
+            if metric not in MEAN_METRICS else None
+
+    def update(self, original, approximate):
+        '''
+        Adds the outputs of some test vectors
+
+        Parameters
+        ----------
+        original, approximate : numpy.ndarray
+            output values of the original and the approximate circuits, with
+            a row per test vector and a column per output
+        '''
+        original = np.asarray(original)
+        self.samples += len(original)
+        if self.worst is not None:
+            self.worst.update(original, approximate)
+            return
+        # mean error of every test vector
+        errors = sample_errors(self.metric, original, approximate) \
+            .reshape(len(original), -1).mean(axis=1)
+        self.total += float(errors.sum())
+        self.square_total += float((errors ** 2).sum())
+
+    @property
+    def error(self):
+        '''
+        Error of the test vectors simulated so far
+        '''
+        if self.worst is not None:
+            return self.worst.errors()[self.metric]
+        return self.total / max(self.samples, 1)
+
+    @property
+    def bounds(self):
+        '''
+        Lower and upper bounds of the confidence interval of a mean error,
+        the error for worst case metrics
+        '''
+        if self.worst is not None:
+            return self.error, self.error
+        n = self.samples
+        if n < 2:
+            return 0.0, float("inf")
+        mean = self.total / n
+        if self.metric == "er":
+            # Wilson score interval, the error of a vector is in [0, 1]
+            z2 = self.z ** 2
+            center = (mean + z2 / (2 * n)) / (1 + z2 / n)
+            half = self.z / (1 + z2 / n) * \
+                (max(mean * (1 - mean), 0) / n + z2 / (4 * n * n)) ** 0.5
+            return max(center - half, 0.0), min(center + half, 1.0)
+        if n < self.min_samples:
+            return 0.0, float("inf")
+        # normal interval of the mean
+        variance = max(self.square_total / n - mean ** 2, 0) * n / (n - 1)
+        half = self.z * (variance / n) ** 0.5
+        return max(mean - half, 0.0), min(mean + half, self.largest)
+
+    @property
+    def interval(self):
+        '''
+        Half width of the confidence interval of a mean error, 0 for worst
+        case metrics
+        '''
+        lower, upper = self.bounds
+        return (upper - lower) / 2
+
+    def decision(self):
+        '''
+        Returns True if the circuit is accepted, False if it is rejected and
+        None if more test vectors are needed
+        '''
+        if self.worst is not None:
+            return False if self.error > self.threshold else None
+        lower, upper = self.bounds
+        if upper <= self.threshold and self.samples >= self.min_samples:
+            return True
+        if lower > self.threshold:
+            return False
+        return None
+
+
+def largest_error(metric, width):
+    '''
+    Returns the largest error of a test vector for a mean metric when the
+    outputs have at most `width` bits
+
+    Examples
+    -------
+        >>> largest_error("med", 8)
+        255
+    '''
+    largest = 2 ** width - 1
+    if metric == "er":
+        return 1
+    if metric == "hd":
+        return width
+    if metric == "msed":
+        return largest ** 2
+    if metric in ("med", "mred"):
+        return largest
+    raise ValueError(f"{metric} is not the mean of the sample errors, "
+        f"options are {', '.join(MEAN_METRICS)}")
+
+
+def error_distances(original, approximate):
+    '''
+    Returns the absolute difference of two arrays of unsigned values
+    '''
+    if original.dtype == object:
+        return np.abs(original - approximate)
+    return np.where(original > approximate, original - approximate,
+        approximate - original)
+
+
+def relative_error_distances(error_distance, original):
+    '''
+    Returns the error distances divided by the original values, 0 where the
+    original value is 0
+    '''
+    original = original.astype(float)
+    red = np.zeros(len(original))
+    np.divide(error_distance.astype(float), original, out=red,
+        where=original != 0)
+    return red
+
+
+def hamming_distances(original, approximate):
+    '''
+    Returns the amount of bits that differ in every pair of values
+    '''
+    if original.dtype == object:
+        return np.array([bin(a ^ b).count("1")
+            for a, b in zip(original, approximate)], dtype=np.uint64)
+    different = np.bitwise_xor(original, approximate)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(different)
+    ones = BYTE_ONES[np.ascontiguousarray(different).view(np.uint8)]
+    return ones.reshape(len(different), 8).sum(axis=1, dtype=np.uint64)
+
+
+def exact_sum(values, largest):
+    '''
+    Sums an array of non-negative integers, exactly while the sum fits in 64
+    bits and in floating point otherwise
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        values to add
+    largest : int
+        largest of the values, used to know if the sum can overflow
+    '''
+    if values.dtype != object and int(largest) * len(values) < 2**64:
+        return int(values.sum(dtype=np.uint64))
+    if values.dtype == object:
+        return sum(values.tolist())
+    return float(values.sum(dtype=float))
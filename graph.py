@@ -0,0 +1,341 @@
+import re
+
+import numpy as np
+
+
+class CircuitGraph:
+    '''
+    Indexed representation of the circuit graph
+
+    Every node and every wire of the netlist tree gets an integer id. The
+    connectivity is stored in CSR style arrays (a pointer array plus a flat
+    array of ids), so the inputs and outputs of a node, the driver of a wire
+    and the nodes a wire fans out to are found in O(1) instead of scanning the
+    whole xml tree with xpath.
+
+    The graph keeps a reference to the ElementTree.Element of every node, so
+    the xml tree remains the single source of truth for node attributes (for
+    example the `delete` label or the saif `t0`, `t1` and `tc` values).
+
+    Attributes
+    -----------
+    elements : list
+        ElementTree.Element of every node, indexed by node id
+    node_vars : list
+        instance name of every node, indexed by node id
+    node_names : list
+        technology cell name of every node, indexed by node id
+    node_ids : dict
+        maps a node instance name to its node id
+    wire_names : list
+        name of every wire, indexed by wire id
+    wire_ids : dict
+        maps a wire name to its wire id
+    in_ptr, in_wires : numpy.ndarray
+        wire ids connected to the inputs of node i are
+        in_wires[in_ptr[i]:in_ptr[i+1]]
+    in_pins : list
+        cell pin name of every entry of in_wires
+    out_ptr, out_wires : numpy.ndarray
+        wire ids connected to the outputs of node i are
+        out_wires[out_ptr[i]:out_ptr[i+1]]
+    out_pins : list
+        cell pin name of every entry of out_wires
+    fanout_ptr, fanout_nodes : numpy.ndarray
+        ids of the nodes that read wire w are
+        fanout_nodes[fanout_ptr[w]:fanout_ptr[w+1]], in node order
+    driver : numpy.ndarray
+        id of the node that drives each wire, -1 if no node drives it
+    circuit_inputs : numpy.ndarray
+        wire ids of the circuit inputs
+    circuit_outputs : numpy.ndarray
+        wire ids of the circuit outputs
+    ports : dict
+        maps a circuit input or output name to its ElementTree.Element
+    assignments : list
+        (lhs wire id, rhs value) pairs of the special assignments
+    source : numpy.ndarray
+        wire id that carries the value of each wire once the assignments
+        between wires are resolved
+    constant_wires : dict
+        maps the wire ids assigned to a constant to their logic value
+    '''
+
+    def __init__(self, netl_root):
+        '''
+        Builds the graph from the root of a circuit tree created by Netlist
+
+        Parameters
+        ----------
+        netl_root : ElementTree.Element
+            root element of the circuit tree
+        '''
+        self.elements = netl_root.findall("node")
+        self.node_vars = [n.attrib["var"] for n in self.elements]
+        self.node_names = [n.attrib["name"] for n in self.elements]
+        self.node_ids = {var: i for i, var in enumerate(self.node_vars)}
+
+        self.wire_names = []
+        self.wire_ids = {}
+
+        ports = netl_root.findall("./circuitinputs/input") \
+            + netl_root.findall("./circuitoutputs/output")
+        self.ports = {p.attrib["var"]: p for p in ports}
+
+        circuit_inputs = [self.add_wire(i.attrib["var"])
+            for i in netl_root.findall("./circuitinputs/input")]
+        circuit_outputs = [self.add_wire(o.attrib["var"])
+            for o in netl_root.findall("./circuitoutputs/output")]
+
+        in_ptr, in_wires, self.in_pins = [0], [], []
+        out_ptr, out_wires, self.out_pins = [0], [], []
+        for node in self.elements:
+            for pin in node:
+                if pin.tag == "input":
+                    in_wires.append(self.add_wire(pin.attrib["wire"]))
+                    self.in_pins.append(pin.attrib["name"])
+                elif pin.tag == "output":
+                    out_wires.append(self.add_wire(pin.attrib["wire"]))
+                    self.out_pins.append(pin.attrib["name"])
+            in_ptr.append(len(in_wires))
+            out_ptr.append(len(out_wires))
+
+        self.assignments = []
+        for a in netl_root.findall("./assignments/assign"):
+            lhs = self.add_wire(a.attrib["var"])
+            if parse_constant(a.attrib["val"]) is None:
+                self.add_wire(a.attrib["val"])
+            self.assignments.append((lhs, a.attrib["val"]))
+
+        self.in_ptr = np.array(in_ptr, dtype=np.int64)
+        self.in_wires = np.array(in_wires, dtype=np.int64)
+        self.out_ptr = np.array(out_ptr, dtype=np.int64)
+        self.out_wires = np.array(out_wires, dtype=np.int64)
+        self.circuit_inputs = np.array(circuit_inputs, dtype=np.int64)
+        self.circuit_outputs = np.array(circuit_outputs, dtype=np.int64)
+
+        wires_count = len(self.wire_names)
+
+        # the first node that writes a wire is its driver
+        self.driver = np.full(wires_count, -1, dtype=np.int64)
+        for node_id in range(len(self.elements) - 1, -1, -1):
+            for w in self.outputs(node_id):
+                self.driver[w] = node_id
+
+        # a node that reads a wire twice is only listed once in its fanout
+        fanout = [[] for _ in range(wires_count)]
+        for node_id in range(len(self.elements)):
+            for w in self.inputs(node_id):
+                children = fanout[w]
+                if not children or children[-1] != node_id:
+                    children.append(node_id)
+        self.fanout_ptr = np.zeros(wires_count + 1, dtype=np.int64)
+        self.fanout_ptr[1:] = np.cumsum([len(f) for f in fanout])
+        self.fanout_nodes = np.array(
+            [n for f in fanout for n in f], dtype=np.int64)
+
+        # follow the chains of assignments until a driven wire or a constant
+        self.source = np.arange(wires_count, dtype=np.int64)
+        self.constant_wires = {}
+        aliases = {}
+        for lhs, rhs in self.assignments:
+            constant = parse_constant(rhs)
+            if constant is None:
+                aliases[lhs] = self.wire_ids[rhs]
+            else:
+                self.constant_wires[lhs] = constant
+        for lhs in aliases:
+            wire, seen = lhs, set()
+            while wire in aliases and wire not in seen:
+                seen.add(wire)
+                wire = aliases[wire]
+            self.source[lhs] = wire
+            if wire in self.constant_wires:
+                self.constant_wires[lhs] = self.constant_wires[wire]
+
+    def add_wire(self, name):
+        '''
+        Returns the id of a wire, registering the wire if it is new
+
+        Parameters
+        ----------
+        name : string
+            name of the wire
+
+        Returns
+        -------
+        integer
+            wire id
+        '''
+        wire_id = self.wire_ids.get(name)
+        if wire_id is None:
+            wire_id = len(self.wire_names)
+            self.wire_ids[name] = wire_id
+            self.wire_names.append(name)
+        return wire_id
+
+    def __len__(self):
+        return len(self.elements)
+
+    def node(self, node_var):
+        '''
+        Returns the ElementTree object of a node, or None if it does not exist
+        '''
+        node_id = self.node_ids.get(node_var)
+        return None if node_id is None else self.elements[node_id]
+
+    def inputs(self, node_id):
+        '''
+        Returns the wire ids connected to the inputs of a node
+        '''
+        return self.in_wires[self.in_ptr[node_id]:self.in_ptr[node_id + 1]]
+
+    def outputs(self, node_id):
+        '''
+        Returns the wire ids connected to the outputs of a node
+        '''
+        return self.out_wires[self.out_ptr[node_id]:self.out_ptr[node_id + 1]]
+
+    def fanout(self, wire_id):
+        '''
+        Returns the ids of the nodes that read a wire
+        '''
+        return self.fanout_nodes[
+            self.fanout_ptr[wire_id]:self.fanout_ptr[wire_id + 1]]
+
+    def fanout_count(self):
+        '''
+        Returns the number of nodes that read each wire
+        '''
+        return np.diff(self.fanout_ptr)
+
+    def children(self, node_id):
+        '''
+        Returns the ids of the nodes that read any output of a node
+        '''
+        outputs = self.outputs(node_id)
+        if len(outputs) == 1:
+            return self.fanout(outputs[0])
+        if len(outputs) == 0:
+            return outputs
+        return np.unique(np.concatenate([self.fanout(w) for w in outputs]))
+
+    def parents(self, node_id):
+        '''
+        Returns the ids of the nodes that drive any input of a node
+        '''
+        drivers = self.driver[self.inputs(node_id)]
+        return np.unique(drivers[drivers >= 0])
+
+    def levels(self):
+        '''
+        Levelizes the circuit graph
+
+        Nodes fed only by circuit inputs or constants are in level 0, any
+        other node is one level above its deepest parent. Assignments between
+        wires are resolved, so they do not add levels.
+
+        Returns
+        -------
+        numpy.ndarray
+            level of every node
+
+        Raises
+        ------
+        ValueError
+            if the circuit has a combinational loop
+        '''
+        node_count = len(self.elements)
+        readers = np.repeat(np.arange(node_count), np.diff(self.in_ptr))
+        drivers = self.driver[self.source[self.in_wires]]
+        edges = drivers >= 0
+        drivers, readers = drivers[edges], readers[edges]
+
+        indegree = np.bincount(readers, minlength=node_count)
+        order = np.argsort(drivers, kind="stable")
+        edge_ptr = np.searchsorted(drivers[order], np.arange(node_count + 1))
+        successors = readers[order].tolist()
+        edge_ptr = edge_ptr.tolist()
+        indegree = indegree.tolist()
+
+        levels = [0] * node_count
+        ready = [n for n in range(node_count) if indegree[n] == 0]
+        visited = 0
+        while ready:
+            node_id = ready.pop()
+            visited += 1
+            level = levels[node_id] + 1
+            for child in successors[edge_ptr[node_id]:edge_ptr[node_id + 1]]:
+                if levels[child] < level:
+                    levels[child] = level
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    ready.append(child)
+
+        if visited != node_count:
+            raise ValueError("The circuit has a combinational loop")
+        return np.array(levels, dtype=np.int64)
+
+    def is_deleted(self, node_id):
+        '''
+        Returns true if the node is marked to be deleted
+        '''
+        return self.elements[node_id].get("delete") == "yes"
+
+    def deleted(self):
+        '''
+        Returns a boolean array with the nodes marked to be deleted
+        '''
+        return np.array([n.get("delete") == "yes" for n in self.elements],
+            dtype=bool)
+
+    def output_element(self, wire_name):
+        '''
+        Returns the output ElementTree object that drives a wire, or None if no
+        node drives it
+        '''
+        wire_id = self.wire_ids.get(wire_name)
+        if wire_id is None or self.driver[wire_id] < 0:
+            return None
+        for output in self.elements[self.driver[wire_id]].iter("output"):
+            if output.attrib["wire"] == wire_name:
+                return output
+
+
+def parse_constant(value):
+    '''
+    Returns the logic value of a verilog constant
+
+    Undefined (x) and high impedance (z) constants are read as 0.
+
+    Parameters
+    ----------
+    value : string
+        a verilog expression like "1'b1", "1'h0", "0" or "X[3]"
+
+    Returns
+    -------
+    integer | None
+        logic 1 or 0, or None if value is not a constant
+
+    Examples
+    -------
+        >>> parse_constant("1'b1")
+        1
+        >>> parse_constant("1'hx")
+        0
+        >>> parse_constant("X[3]") is None
+        True
+    '''
+    value = value.strip()
+    m = re.fullmatch(r"(\d*)'([bdhoBDHO])([0-9a-fA-FxXzZ]+)", value)
+    if m:
+        digits = m.group(3)
+        if any(d in "xXzZ" for d in digits):
+            return 0
+        base = {"b": 2, "o": 8, "d": 10, "h": 16}[m.group(2).lower()]
+        return int(digits, base) & 1
+    if value.isdigit():
+        return int(value) & 1
+    return None
+
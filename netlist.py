@@ -364,3 +364,36 @@ def parse_assigns(content):
             raise ValueError(f"Bit width mismatch: LHS {lhs_bits} != RHS {rhs_bits}")
         result.extend(zip(lhs_bits, rhs_bits))
     return result
+
+def parse_port(raw):
+    '''
+    Extracts the name and the bounds of a raw port declaration, like the ones
+    stored in `raw_inputs` and `raw_outputs`
+
+    Parameters
+    ----------
+    raw : string
+        A declaration like "input [7:0] a;" or "output z;".
+
+    Returns
+    -------
+    Tuple[string, int, int]
+        name, left and right bounds of the port. The bounds are None for one
+        bit ports.
+
+    Examples
+    -------
+        >>> parse_port("input [7:0] a;")
+        ('a', 7, 0)
+
+        >>> parse_port("output [0:3] y;")
+        ('y', 0, 3)
+
+        >>> parse_port("output z;")
+        ('z', None, None)
+    '''
+    m = re.match(r'\s*(?:input|output)\s*(?:\[(\d+):(\d+)\])?\s*([^\s;]+)\s*;',
+        raw)
+    if m.group(1) is None:
+        return m.group(3), None, None
+    return m.group(3), int(m.group(1)), int(m.group(2))
@@ -0,0 +1,455 @@
+from hashlib import sha256
+from itertools import permutations
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+
+# smallest cell of every logic function of a technology, see `cell_index`
+cell_indexes = {}
+
+
+def cell_index(technology):
+    '''
+    Indexes the combinational cells of a technology by their logic function
+
+    Every permutation of the inputs and of the outputs of a cell is indexed,
+    and only the smallest cell of every function is kept.
+
+    Parameters
+    ----------
+    technology : Technology
+        technology of the circuit
+
+    Returns
+    -------
+    dict
+        maps (amount of inputs, truth tables of the outputs) to (area, cell
+        name, input pins, output pins) of the smallest cell, where input pin
+        k reads the variable k of the truth tables and the output pins are in
+        the order of the truth tables
+    '''
+    index = cell_indexes.get(technology.tech)
+    if index is not None:
+        return index
+    index = {}
+    for cell in technology.cells:
+        if not cell.truth_tables or not cell.inputs:
+            continue
+        count = len(cell.inputs)
+        for order in permutations(range(count)):
+            tables = {pin: permute_table(table, order)
+                for pin, table in cell.truth_tables.items()}
+            for outputs in permutations(cell.outputs):
+                key = (count, tuple(tables[o] for o in outputs))
+                entry = (cell.area, cell.name,
+                    [cell.inputs[k] for k in order], list(outputs))
+                if key not in index or entry[0] < index[key][0]:
+                    index[key] = entry
+    cell_indexes[technology.tech] = index
+    return index
+
+
+def permute_table(table, order):
+    '''
+    Returns the truth table of a function whose variable k is the input
+    order[k] of a truth table
+    '''
+    result = 0
+    for row in range(1 << len(order)):
+        original = sum(((row >> k) & 1) << i for k, i in enumerate(order))
+        result |= ((table >> original) & 1) << row
+    return result
+
+
+def restrict_table(table, inputs, count):
+    '''
+    Returns the truth table of a cell output when its inputs are replaced by
+    constants or variables
+
+    Parameters
+    ----------
+    table : int
+        truth table of the output, see `TechLibCell.truth_tables`
+    inputs : array
+        (variable, constant) of every input of the cell, variable is -1 for
+        the inputs tied to the constant
+    count : int
+        amount of variables
+    '''
+    result = 0
+    for row in range(1 << count):
+        original = 0
+        for k, (variable, constant) in enumerate(inputs):
+            bit = constant if variable < 0 else (row >> variable) & 1
+            original |= bit << k
+        result |= ((table >> original) & 1) << row
+    return result
+
+
+def reduce_support(tables, variables):
+    '''
+    Removes the variables that none of the truth tables depend on
+
+    Parameters
+    ----------
+    tables : array
+        truth tables over `variables`
+    variables : array
+        wire ids of the variables
+
+    Returns
+    -------
+    (array, array)
+        truth tables and wire ids of the remaining variables
+    '''
+    tables, variables = list(tables), list(variables)
+    for k in range(len(variables) - 1, -1, -1):
+        rows = range(1 << len(variables))
+        if any(((t >> row) & 1) != ((t >> (row ^ (1 << k))) & 1)
+            for t in tables for row in rows):
+            continue
+        # keep the rows where the variable k is 0
+        tables = [sum(((t >> (((row >> k) << (k + 1)) | (row & ((1 << k) - 1))))
+            & 1) << row for row in range(1 << (len(variables) - 1)))
+            for t in tables]
+        del variables[k]
+    return tables, variables
+
+
+def simplify_netlist(circuit):
+    '''
+    Simplifies the circuit tree of a circuit in place, see
+    `simplification_plans`
+
+    The assignments of the tree are written again, only the circuit outputs
+    and the wires tied to a constant are assigned. The graph of the circuit
+    is not updated, see `Circuit.simplify`.
+
+    Parameters
+    ----------
+    circuit : Circuit
+        circuit to simplify
+
+    Returns
+    -------
+    dict
+        amount of nodes that were deleted, constant, buffers, dead, resized
+        or split
+    '''
+    plans, resolve, stats = simplification_plans(circuit)
+    write_plans(circuit, plans, resolve)
+    return stats
+
+
+def simplification_plans(circuit):
+    '''
+    Plans the simplification of a circuit without changing it
+
+    The nodes marked to be deleted are replaced by their constants (see
+    `Circuit.node_constants`). Then the nodes are visited in level order
+    and the truth table of every output is restricted to the constants and
+    the repeated wires of its inputs:
+
+    - outputs that became constant are propagated to their readers
+    - buffers, and inverters of inverters, are removed and their readers
+      read the original wire
+    - the cells whose function lost inputs are replaced by the smallest cell
+      with that function, a multiple output cell may also be split in one
+      cell per output
+
+    Finally the nodes that do not drive any circuit output are removed.
+
+    Parameters
+    ----------
+    circuit : Circuit
+        circuit to simplify
+
+    Returns
+    -------
+    (dict, function, dict)
+        the plans maps the id of every node that remains, in level order, to
+        a list of (cell name, inputs, outputs) with the cells that replace
+        it, the inputs are (pin, resolved wire) and the outputs (pin, wire
+        id) pairs. The function resolves a wire id to the wire that carries
+        its value, or to -1 - value if it is constant. The dict has the
+        amount of nodes that were deleted, constant, buffers, dead, resized
+        or split.
+    '''
+    graph = circuit.graph
+    cells = {cell.name: cell for cell in circuit.technology.cells}
+    index = cell_index(circuit.technology)
+    stats = dict.fromkeys(
+        ("deleted", "constant", "buffers", "dead", "resized", "split"), 0)
+
+    # wires whose value is used by a reader or a circuit output
+    outputs = graph.source[graph.circuit_outputs]
+    used = np.zeros(len(graph.wire_names), dtype=bool)
+    used[graph.source[graph.in_wires]] = True
+    used[outputs] = True
+
+    resolved = {w: -1 - value for w, value in graph.constant_wires.items()}
+    inverted = {}
+    deleted = graph.deleted()
+    for node_id in np.flatnonzero(deleted).tolist():
+        values = circuit.node_constants(graph.elements[node_id])
+        for w, value in zip(graph.source[graph.outputs(node_id)].tolist(),
+                values):
+            resolved[w] = -1 - value
+        stats["deleted"] += 1
+
+    # a wire resolved to a constant is encoded as -1 - value, any other
+    # resolved value is the id of the wire that carries it
+    def resolve(wire):
+        wire = int(graph.source[wire])
+        return resolved.get(wire, wire)
+
+    # node id: (cell name, input pins, output pins) of the nodes that remain,
+    # the inputs are (pin, resolved wire) and the outputs (pin, wire id)
+    plans = {}
+    levels = graph.levels()
+    for node_id in np.argsort(levels, kind="stable").tolist():
+        if deleted[node_id]:
+            continue
+        name = graph.node_names[node_id]
+        cell = cells.get(name)
+        begin, end = graph.in_ptr[node_id], graph.in_ptr[node_id + 1]
+        connections = {graph.in_pins[k]: resolve(graph.in_wires[k])
+            for k in range(begin, end)}
+        node_outputs = [(graph.out_pins[k], int(graph.source[graph.out_wires[k]]))
+            for k in range(graph.out_ptr[node_id], graph.out_ptr[node_id + 1])]
+        kept = [(name, list(connections.items()), node_outputs)]
+
+        if cell is None or not cell.truth_tables \
+            or set(cell.inputs) != set(connections):
+            plans[node_id] = kept
+            continue
+
+        variables, inputs = [], []
+        for pin in cell.inputs:
+            wire = connections[pin]
+            if wire < 0:
+                inputs.append((-1, -1 - wire))
+            else:
+                if wire not in variables:
+                    variables.append(wire)
+                inputs.append((variables.index(wire), 0))
+        changed = len(variables) < len(cell.inputs)
+
+        # outputs that are constant or copy a wire
+        outputs_resolved = {}
+        pending = []
+        for pin, wire in node_outputs:
+            if not used[wire]:
+                continue
+            table = restrict_table(cell.truth_tables[pin], inputs,
+                len(variables))
+            (table,), support = reduce_support([table], variables)
+            if not support:
+                outputs_resolved[wire] = -1 - table
+            elif len(support) == 1 and table == 2:
+                outputs_resolved[wire] = support[0]
+            elif len(support) == 1 and table == 1 and support[0] in inverted:
+                outputs_resolved[wire] = inverted[support[0]]
+            else:
+                pending.append((pin, wire, table, support))
+
+        if not pending:
+            resolved.update(outputs_resolved)
+            if not outputs_resolved:
+                stats["dead"] += 1
+            elif any(w < 0 for w in outputs_resolved.values()):
+                stats["constant"] += 1
+            else:
+                stats["buffers"] += 1
+            continue
+
+        if changed or outputs_resolved:
+            plan = replacement(index, cell, pending, variables)
+            if plan is not None:
+                resolved.update(outputs_resolved)
+                plans[node_id] = plan
+                stats["split" if len(plan) > 1 else "resized"] += 1
+            else:
+                plans[node_id] = kept
+        else:
+            plans[node_id] = kept
+
+        for _, wire, table, support in pending:
+            if len(support) == 1 and table == 1:
+                inverted[wire] = support[0]
+
+    # remove the nodes that do not drive a circuit output
+    needed = set(resolve(w) for w in graph.circuit_outputs)
+    for node_id in np.argsort(-levels, kind="stable").tolist():
+        plan = plans.get(node_id)
+        if plan is None:
+            continue
+        if not any(wire in needed for part in plan for _, wire in part[2]):
+            del plans[node_id]
+            stats["dead"] += 1
+            continue
+        for part in plan:
+            needed.update(wire for _, wire in part[1])
+
+    return plans, resolve, stats
+
+
+def replacement(index, cell, pending, variables):
+    '''
+    Returns the plan of the smallest cells that compute some outputs of a
+    node, or None if they are not smaller than the cell of the node
+
+    Parameters
+    ----------
+    index : dict
+        cells of the technology, see `cell_index`
+    cell : TechLibCell
+        cell of the node
+    pending : array
+        (pin, wire id, truth table, variables) of the outputs to compute
+    variables : array
+        wire ids of the variables of the node
+    '''
+    # all the outputs in one cell
+    tables = [restrict_to(table, support, variables)
+        for _, _, table, support in pending]
+    tables, support = reduce_support(tables, variables)
+    entry = index.get((len(support), tuple(tables)))
+    if entry is not None and entry[0] <= cell.area:
+        area, name, input_pins, output_pins = entry
+        return [(name, list(zip(input_pins, support)),
+            [(pin, wire) for pin, (_, wire, _, _) in zip(output_pins, pending)])]
+
+    # a cell per output
+    if len(pending) < 2:
+        return None
+    plan, total = [], 0.0
+    for _, wire, table, support in pending:
+        entry = index.get((len(support), (table,)))
+        if entry is None:
+            return None
+        area, name, input_pins, output_pins = entry
+        total += area
+        plan.append((name, list(zip(input_pins, support)),
+            [(output_pins[0], wire)]))
+    return plan if total <= cell.area else None
+
+
+def restrict_to(table, support, variables):
+    '''
+    Returns a truth table over `support` as a truth table over `variables`,
+    every wire of support must be in variables
+    '''
+    positions = [variables.index(w) for w in support]
+    result = 0
+    for row in range(1 << len(variables)):
+        original = sum(((row >> p) & 1) << k for k, p in enumerate(positions))
+        result |= ((table >> original) & 1) << row
+    return result
+
+
+def write_plans(circuit, plans, resolve):
+    '''
+    Writes the nodes of the plans and the assignments in the circuit tree
+    '''
+    graph = circuit.graph
+    root = circuit.netl_root
+    names = graph.wire_names
+
+    assignments = {}
+    for port in graph.circuit_outputs.tolist():
+        value = resolve(port)
+        if value != port:
+            assignments[port] = value
+
+    for node_id, element in enumerate(graph.elements):
+        plan = plans.get(node_id)
+        if plan is None:
+            root.remove(element)
+            continue
+        # the constants read by a node are carried by the original wire of
+        # the pin
+        originals = {graph.in_pins[k]: int(graph.source[graph.in_wires[k]])
+            for k in range(graph.in_ptr[node_id], graph.in_ptr[node_id + 1])}
+        # the outputs keep their saif annotations
+        annotations = {o.attrib["wire"]: o.attrib
+            for o in element.iter("output")}
+        position = list(root).index(element)
+        root.remove(element)
+        for count, (name, inputs, outputs) in enumerate(plan):
+            node = ET.Element("node", name=name, var=element.attrib["var"])
+            if len(plan) > 1:
+                node.set("var", f"{element.attrib['var']}_{outputs[0][0]}")
+            for pin, wire in inputs:
+                if wire < 0:
+                    assignments[originals[pin]] = wire
+                    wire = originals[pin]
+                ET.SubElement(node, "input", name=pin, wire=names[wire])
+            for pin, wire in outputs:
+                output = ET.SubElement(node, "output",
+                    annotations.get(names[wire], {}))
+                output.set("name", pin)
+                output.set("wire", names[wire])
+            root.insert(position + count, node)
+
+    assignments_element = root.find("assignments")
+    if assignments_element is None:
+        assignments_element = ET.SubElement(root, "assignments")
+    for assign in list(assignments_element):
+        assignments_element.remove(assign)
+    for wire, value in assignments.items():
+        ET.SubElement(assignments_element, "assign", var=names[wire],
+            val=f"1'b{-1 - value}" if value < 0 else names[value])
+
+
+def structural_hash(circuit):
+    '''
+    Computes a canonical hash of the logic of a circuit with its deletions
+
+    The hash is computed over the simplified circuit (see
+    `simplification_plans`), bottom up: the hash of a wire is that of the
+    cell and the output pin that drive it and of the hashes of the inputs of
+    the cell, in the order of their pin names. The circuit hash combines the
+    technology, the module and port names and the hash of every circuit
+    output. It does not depend on the names of the nodes and of the internal
+    wires, on the order of the nodes or on the logic that reaches no output,
+    so different deletion sets that leave the same logic get the same hash.
+
+    Parameters
+    ----------
+    circuit : Circuit
+        circuit to hash
+
+    Returns
+    -------
+    string
+        sha256 hex digest
+    '''
+    graph = circuit.graph
+    plans, resolve, _ = simplification_plans(circuit)
+    hashes = {}
+
+    def wire_hash(wire):
+        if wire < 0:
+            return f"1'b{-1 - wire}".encode()
+        return hashes.get(wire) or graph.wire_names[wire].encode()
+
+    # the plans are in level order, so the inputs are hashed first
+    for plan in plans.values():
+        for name, inputs, outputs in plan:
+            digest = sha256(name.encode())
+            for pin, wire in sorted(inputs):
+                digest.update(b"\0" + pin.encode() + b"\0" + wire_hash(wire))
+            for pin, wire in outputs:
+                output = digest.copy()
+                output.update(b"\0output\0" + pin.encode())
+                hashes[wire] = output.digest()
+
+    digest = sha256(f"{circuit.tech_file}\0{circuit.topmodule}".encode())
+    for name in circuit.inputs:
+        digest.update(b"\0input\0" + name.encode())
+    for name, wire in zip(circuit.outputs, graph.circuit_outputs.tolist()):
+        digest.update(b"\0output\0" + name.encode() + b"\0"
+            + wire_hash(resolve(wire)))
+    return digest.hexdigest()
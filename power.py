@@ -0,0 +1,245 @@
+import numpy as np
+
+from technology import LibertyTable
+
+
+class PowerModel:
+    '''
+    Static power estimation of a mapped circuit
+
+    The power of every node is the liberty leakage of its cell plus the
+    energy of its transitions times their rate. The toggle counts are the
+    `tc` values annotated by `Circuit.saif_parser`, divided by the saif
+    duration. Every toggle of a node output costs the internal energy of the
+    output pin, interpolated at the load of the wire, and the switching
+    energy C V^2 / 2 of that load. Every toggle of a node input costs the
+    internal (hidden) energy of the input pin. The internal energy of a pin
+    is the average of its rise and fall energies over all its internal power
+    groups, the `when` conditions are ignored.
+
+    The activity of the wires is kept fixed, so the model measures the
+    power of the cells that remain after the deletions with the activity of
+    the exact circuit. The readers of a deleted node see a constant, so
+    they do not toggle that input, and the load of the wires read by a
+    deleted node drops. The model observes the circuit, so
+    `Circuit.delete` and `Circuit.undodelete` only evaluate again the node,
+    the drivers of its inputs and the readers of its outputs.
+
+    Attributes
+    -----------
+    circuit : Circuit
+        estimated circuit
+    graph : CircuitGraph
+        graph of the circuit when the model was created
+    duration : float
+        seconds the toggle counts were measured over
+    transition : float
+        input transition used to read the internal energy tables, in the
+        time unit of the library, None for the smallest transition of every
+        table
+    voltage : float
+        supply voltage, in volts
+    rates : numpy.ndarray
+        toggles per second of every wire, 0 for the wires that are not
+        annotated
+    loads : numpy.ndarray
+        capacitance read by every wire, in farads
+    alive : numpy.ndarray
+        true for the nodes counted in `node_power`
+    node_power : numpy.ndarray
+        power of every node in watts, 0 for the deleted nodes
+    total : float
+        power of the circuit in watts
+    evaluated : int
+        amount of nodes evaluated by the last update
+    '''
+
+    def __init__(self, circuit, duration=None, transition=None):
+        '''
+        Computes the power of every node and starts observing the circuit
+
+        Parameters
+        ----------
+        circuit : Circuit
+            circuit to estimate
+        duration : float
+            seconds the toggle counts were measured over, by default the
+            duration of the saif file
+        transition : float
+            input transition used to read the internal energy tables, by
+            default the smallest transition of the tables
+
+        Raises
+        ------
+        ValueError
+            if there is no liberty file or the circuit has toggle counts but
+            no duration
+        '''
+        liberty = circuit.technology.liberty
+        if liberty is None:
+            raise ValueError(f"{circuit.tech_file} has no liberty file")
+        self.circuit = circuit
+        self.graph = graph = circuit.graph
+        capacitance = liberty.scale("capacitive_load_unit")
+        energy = capacitance * liberty.scale("voltage_unit") ** 2
+        self.voltage = liberty.voltage * liberty.scale("voltage_unit")
+        self.capacitance = capacitance
+        self.energy = energy
+        self.transition = transition
+        self.energy_tables = {}
+        if duration is None:
+            duration = circuit.saif_duration
+        self.duration = duration
+
+        # toggles per second of every wire
+        counts = np.zeros(len(graph.wire_names))
+        for w, name in enumerate(graph.wire_names):
+            element = graph.output_element(name)
+            if element is None:
+                element = graph.ports.get(name)
+            if element is not None and element.get("tc") is not None:
+                counts[w] = float(element.get("tc"))
+        if counts.any() and not duration:
+            raise ValueError("The toggle counts have no duration, "
+                "pass it or read a saif file with a DURATION")
+        self.rates = counts / duration if counts.any() else counts
+        self.rates = self.rates[graph.source]
+        for w in graph.constant_wires:
+            self.rates[w] = 0.0
+
+        # leakage of every node, capacitance and energy of every input
+        cells = [liberty.cells.get(name) for name in graph.node_names]
+        self.cells = cells
+        leakage_scale = liberty.scale("leakage_power_unit")
+        self.leakage = np.array([0.0 if cell is None else
+            cell.leakage * leakage_scale for cell in cells])
+        node_count = len(graph)
+        self.in_nodes = np.repeat(np.arange(node_count),
+            np.diff(graph.in_ptr))
+        pins = [None if cells[n] is None else cells[n].pins.get(pin)
+            for n, pin in zip(self.in_nodes, graph.in_pins)]
+        self.pin_capacitance = np.array([0.0 if pin is None else
+            pin.capacitance * capacitance for pin in pins])
+        self.input_energy = np.array([self.pin_energy(pin, 0.0) * energy
+            for pin in pins])
+        self.in_sources = graph.source[graph.in_wires]
+        self.readers = [[] for _ in graph.wire_names]
+        for n, w in zip(self.in_nodes.tolist(), self.in_sources.tolist()):
+            self.readers[w].append(n)
+
+        self.alive = ~graph.deleted()
+        self.loads = np.zeros(len(graph.wire_names))
+        np.add.at(self.loads, self.in_sources,
+            self.pin_capacitance * self.alive[self.in_nodes])
+        self.node_power = np.array([self.power(n) for n in range(node_count)])
+        self.total = float(self.node_power.sum())
+
+        self.evaluated = 0
+        circuit.add_observer(self.update)
+
+    def pin_energy(self, pin, load):
+        '''
+        Returns the average internal energy of a transition of a pin, in the
+        energy unit of the library
+
+        Parameters
+        ----------
+        pin : LibertyPin
+            pin of a liberty cell, None if the cell is unknown
+        load : float
+            load of the pin, in the capacitive load unit of the library
+        '''
+        if pin is None:
+            return 0.0
+        tables = self.energy_tables.get(id(pin))
+        if tables is None:
+            tables = self.energy_tables[id(pin)] = average_tables([table
+                for group in pin.internal_power
+                for table in group.tables.values()])
+        energy = 0.0
+        for table, weight in tables:
+            transition = self.transition
+            if transition is None:
+                index = table.transitions()
+                transition = index[0] if len(index) else 0.0
+            energy += weight * table.lookup(transition, load)
+        return energy
+
+    def power(self, node_id):
+        '''
+        Returns the power of a node in watts, 0 if it is deleted
+        '''
+        if not self.alive[node_id]:
+            return 0.0
+        graph = self.graph
+        cell = self.cells[node_id]
+        power = self.leakage[node_id]
+        for k in range(graph.out_ptr[node_id], graph.out_ptr[node_id + 1]):
+            w = graph.source[graph.out_wires[k]]
+            rate = self.rates[w]
+            if rate and cell is not None:
+                load = self.loads[w]
+                internal = self.pin_energy(cell.pins.get(graph.out_pins[k]),
+                    load / self.capacitance) * self.energy
+                power += rate * (internal + load * self.voltage ** 2 / 2)
+        for k in range(graph.in_ptr[node_id], graph.in_ptr[node_id + 1]):
+            w = self.in_sources[k]
+            driver = graph.driver[w]
+            if driver < 0 or self.alive[driver]:
+                power += self.rates[w] * self.input_energy[k]
+        return power
+
+    def update(self, node_id):
+        '''
+        Updates the power after the deletion or restoration of a node
+
+        Parameters
+        ----------
+        node_id : int
+            id of the node whose delete label changed
+        '''
+        graph = self.graph
+        alive = not graph.is_deleted(node_id)
+        self.evaluated = 0
+        if alive == self.alive[node_id]:
+            return
+        self.alive[node_id] = alive
+
+        # the loads of the wires read by the node change
+        begin, end = graph.in_ptr[node_id], graph.in_ptr[node_id + 1]
+        sign = 1 if alive else -1
+        np.add.at(self.loads, self.in_sources[begin:end],
+            sign * self.pin_capacitance[begin:end])
+
+        drivers = graph.driver[self.in_sources[begin:end]]
+        changed = {node_id, *drivers[drivers >= 0].tolist()}
+        for w in graph.source[graph.outputs(node_id)]:
+            changed.update(self.readers[w])
+        for n in changed:
+            self.node_power[n] = self.power(n)
+        self.total = float(self.node_power.sum())
+        self.evaluated = len(changed)
+
+
+def average_tables(tables):
+    '''
+    Returns the average of some liberty tables
+
+    The interpolation is linear in the values, so the tables that share
+    their indexes are replaced by the table of their average values.
+
+    Returns
+    -------
+    array
+        (LibertyTable, weight) pairs, the average of the tables is the
+        weighted sum of the lookups
+    '''
+    groups = {}
+    for table in tables:
+        key = (table.index_1.tobytes(), table.index_2.tobytes(),
+            table.variables, table.values.shape)
+        groups.setdefault(key, []).append(table)
+    return [(LibertyTable(group[0].index_1, group[0].index_2,
+            sum(t.values for t in group) / len(group), group[0].variables),
+            len(group) / len(tables))
+        for group in groups.values()]
@@ -1,9 +1,19 @@
 
-def get_parents(n, root):
+from graph import CircuitGraph
+
+def get_parents(n, root, graph=None):
     '''
     Check if node's children has ancestry in the cut
     '''
-    return [root.findall('node/output[@wire="'+i.attrib['wire']+'"]/..') for i in n.findall('input')]
+    graph=CircuitGraph(root) if graph is None else graph
+    drivers=[graph.driver[graph.wire_ids[i.attrib['wire']]] for i in n.findall('input')]
+    return [[graph.elements[d]] if d>=0 else [] for d in drivers]
+
+def get_children(n, graph):
+    '''
+    Returns the nodes that read the first output of node n
+    '''
+    return [graph.elements[c] for c in graph.fanout(graph.wire_ids[n.findall('output')[0].attrib['wire']])]
 
 def check_node_delete_status(n):
     #Auxiliary function to check if node is marked to be deleted
@@ -34,13 +44,17 @@ class Cut:
 
     circuit_root:
         Root of the circuit tree.
+
+    graph: CircuitGraph
+        Index of the circuit tree, it is built if not provided.
     '''
 
-    def __init__(self,netlroot):
+    def __init__(self,netlroot,graph=None):
         self.difference=0
         self.nodes=[]
         self.size=0
         self.circuit_root=netlroot
+        self.graph=CircuitGraph(netlroot) if graph is None else graph
 
     def addNode(self,node, diff):
         '''
@@ -108,17 +122,17 @@ class Cut:
             n_inputs= [n.attrib['wire'] for n in node.findall('input')] #inputs of node
 
             #Check if node is a children of the cut
-            children=[c for c in self.circuit_root.findall('node/input[@wire="'+node.findall('output')[0].attrib['wire']+'"]/..')]#children of node node
+            children=get_children(node,self.graph)#children of node node
             children=[c for c in children if check_node_delete_status(c)] #Exclude deleted nodes
             if not any([(i in wires) for i in n_inputs]):
                 if children==[]: #if empty, node's output is also a circuit output
-                    d+=float(self.circuit_root.findall(f'circuitoutputs/output[@var="{node.findall("output")[0].attrib["wire"]}"]')[0].attrib[diff])#its valid, and its significance correspond to the output's significance
+                    d+=float(self.graph.ports[node.findall("output")[0].attrib["wire"]].attrib[diff])#its valid, and its significance correspond to the output's significance
                     return d
                 else:
                     children=[c for c in children if c not in self.nodes] #filter children in cut
 
                     for c in children:
-                        parents=[i for k in get_parents(c,self.circuit_root) for i in k ]
+                        parents=[i for k in get_parents(c,self.circuit_root,self.graph) for i in k ]
                         parents=[p for p in parents if check_node_delete_status(p)] #filter parents
                         parents.remove(node)
                         while parents!=[]:
@@ -127,7 +141,7 @@ class Cut:
                                 children.remove(c)
                                 break
                             else:
-                                [parents.append(i) for k in get_parents(p,self.circuit_root) for i in k]
+                                [parents.append(i) for k in get_parents(p,self.circuit_root,self.graph) for i in k]
 
                     d+=sum([float(c.attrib[diff]) for c in children])
         return d
@@ -186,14 +200,12 @@ class Cut:
         must_include=[] #List of nodes that must be included to make cut close if n is added
 
         '''Check parents of node '''
-        parents=[]
-        for wire in node.findall('input'):
-            [parents.append(n) for n in self.circuit_root.findall('./node/output[@wire="' + wire.attrib['wire'] + '"]/..')]
+        parents=[p for k in get_parents(node,self.circuit_root,self.graph) for p in k]
         parents=[p for p in parents if (check_node_delete_status(p) and (p not in self.nodes))] #filter parents
 
         for p in parents: #Check not in cut parents
             '''get p's children'''
-            children=[c for c in self.circuit_root.findall(f'./node/input[@wire="{p.findall("output")[0].attrib["wire"]}"]/..') ]
+            children=get_children(p,self.graph)
             children.remove(node)
             children=[c for c in children if (check_node_delete_status(c) and (c not in self.nodes))] #filter children
 
@@ -202,11 +214,11 @@ class Cut:
                 must_include.append(p)
 
         '''Check children of node '''
-        children=self.circuit_root.findall(f'./node/input[@wire="{node.findall("output")[0].attrib["wire"]}"]/..')
+        children=get_children(node,self.graph)
         children=[c for c in children if (check_node_delete_status(c) and (c not in self.nodes))]
         for c in children:
             '''get c's parents'''
-            parents=[self.circuit_root.findall(f'./node/output[@wire="{i.attrib["wire"]}"]/..') for i in c.findall('input')]
+            parents=get_parents(c,self.circuit_root,self.graph)
             parents=[p for k in parents for p in k]
             parents.remove(node)
             parents=[p for p in parents if (check_node_delete_status(p) and (p not in self.nodes))]
@@ -305,6 +317,7 @@ def FindCut(netlroot, diff_threshold, diff='significance', harshness_level=0):
 
     '''Use threshold to limit cut exploration (Nodes with a difference greater than the threshold would never produce valid cuts)'''
     cut_list=[]
+    graph=CircuitGraph(netlroot)
     while True:
         all_nodes=netlroot.findall('./node') #get all nodes
         all_nodes=[n for n in all_nodes if float(n.attrib[diff])<diff_threshold] #filter nodes by difference
@@ -317,8 +330,8 @@ def FindCut(netlroot, diff_threshold, diff='significance', harshness_level=0):
         all_nodes.sort(key=lambda n: float(n.attrib[diff]),reverse=True)#sort nodes by difference criteria, greater first
 
         '''Create a cut object'''
-        cut=Cut(netlroot)
-        biggest_cut=Cut(netlroot)
+        cut=Cut(netlroot,graph)
+        biggest_cut=Cut(netlroot,graph)
         cut_record=0
         banned_nodes=[]
         '''Attempt to add a node in the cut and make it bigger'''
@@ -334,7 +347,7 @@ def FindCut(netlroot, diff_threshold, diff='significance', harshness_level=0):
                     else:
                         if cut.size>cut_record:
                             biggest_cut=None
-                            biggest_cut=Cut(netlroot)
+                            biggest_cut=Cut(netlroot,graph)
                             [biggest_cut.addNode(n,0) for n in cut.nodes]
                             biggest_cut.difference=cut.difference
                             cut_record=biggest_cut.size
@@ -342,7 +355,7 @@ def FindCut(netlroot, diff_threshold, diff='significance', harshness_level=0):
                         elif cut_record==cut.size:
                             if cut.difference<biggest_cut.difference:
                                 biggest_cut=None
-                                biggest_cut=Cut(netlroot)
+                                biggest_cut=Cut(netlroot,graph)
                                 [biggest_cut.addNode(n,0) for n in cut.nodes]
                                 biggest_cut.difference=cut.difference
                                 biggest_cut.size=cut.size
@@ -363,8 +376,8 @@ def FindCut(netlroot, diff_threshold, diff='significance', harshness_level=0):
 
                 #Clear for a new expansion
                 cut=None
-                cut=Cut(netlroot)
+                cut=Cut(netlroot,graph)
                 biggest_cut=None
-                biggest_cut=Cut(netlroot)
+                biggest_cut=Cut(netlroot,graph)
                 cut_record=0
     return cut_list
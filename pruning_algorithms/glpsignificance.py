@@ -1,3 +1,5 @@
+from graph import CircuitGraph
+
 
 def GetbySignificance(netlroot, output_significances=[]):
     '''
@@ -37,7 +39,7 @@ def GetbySignificance(netlroot, output_significances=[]):
 
     return nodes
 
-def GetSignificance(netlroot, node, overwrite=False):
+def GetSignificance(netlroot, node, overwrite=False, graph=None):
     '''
     A recursive function to calculate and set the significance attribute to each node in a circuit's tree
 
@@ -52,27 +54,29 @@ def GetSignificance(netlroot, node, overwrite=False):
     overwrite: boolean
         Whether to overwrite or not existing significance value in the nodes
 
+    graph: CircuitGraph
+        index of netlroot, it is built if not provided
+
     Returns
     -------
     significance: integer
         current node's significance value
     '''
 
-
-    circuit_outputs=[o for o in netlroot.findall("./circuitoutputs/output")] #All circuit outputs
-    co_names=[o.attrib["var"] for o in circuit_outputs] #circuit outputs names
+    graph=CircuitGraph(netlroot) if graph is None else graph
+    co_names={graph.wire_names[o] for o in graph.circuit_outputs} #circuit outputs names
     significance=0 #current node's significance
 
     for o in node.findall("output"): #for each output of the node...
         if o.attrib["wire"] in co_names: #if o matches with a circuit output, sum its significance
-            significance+=int(netlroot.findall("./circuitoutputs/output[@var='"+o.attrib["wire"]+"']")[0].attrib["significance"])
+            significance+=int(graph.ports[o.attrib["wire"]].attrib["significance"])
         else:
-            children=netlroot.findall("./node/input[@wire='"+o.attrib["wire"]+"']/..") #get nodes whose inputs are the same wire as the current output
+            children=[graph.elements[c] for c in graph.fanout(graph.wire_ids[o.attrib["wire"]])] #get nodes whose inputs are the same wire as the current output
             for child in children:
                 if overwrite:
-                    significance+=int(GetSignificance(netlroot,child))
+                    significance+=int(GetSignificance(netlroot,child,graph=graph))
                 elif 'significance' not in child.keys():
-                    significance+=int(GetSignificance(netlroot,child))
+                    significance+=int(GetSignificance(netlroot,child,graph=graph))
                 else:
                     significance+=child.attrib['significance']
 
@@ -108,14 +112,12 @@ def LabelCircuit(netlroot,output_significances=[], overwrite=False):
         o.attrib["significance"]=str(s)
 
     '''Get all the nodes connected to inputs'''
-    inputs=[i for i in netlroot.findall("./circuitinputs/input")]
-    parents=[]
-    for i in inputs:
-        [parents.append(p) for p in netlroot.findall("./node/input[@wire='"+i.attrib["var"]+"']/..") if p not in parents]
+    graph=CircuitGraph(netlroot)
+    parents=dict.fromkeys(p for i in graph.circuit_inputs for p in graph.fanout(i))
 
     '''Calculate significance for all the parent nodes (and thus, for all the children nodes due recursivity)'''
     for p in parents:
-        GetSignificance(netlroot,p,overwrite)
+        GetSignificance(netlroot,graph.elements[p],overwrite,graph)
 
     return 0
 
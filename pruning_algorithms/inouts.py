@@ -1,7 +1,9 @@
 
 from copy import copy
 
-def GetInputsAux(netl_root, node, constants, path):
+from graph import CircuitGraph
+
+def GetInputsAux(netl_root, node, constants, path, graph=None):
     '''
     Appends nodes that could be deleted to the path variable
     Those nodes can be deleted because their inputs are constant values
@@ -16,7 +18,10 @@ def GetInputsAux(netl_root, node, constants, path):
         list of wires that could be replaced by a constant value
     path : array
         list of ElementTree.Element nodes that can be deleted
+    graph : CircuitGraph
+        index of netl_root, it is built if not provided
     '''
+    graph = CircuitGraph(netl_root) if graph is None else graph
     node_inputs = node.findall("input")
     node_inputs = [i for i in node_inputs if i.attrib["wire"] not in constants]
     if (len(node_inputs) == 0):
@@ -27,9 +32,8 @@ def GetInputsAux(netl_root, node, constants, path):
             o = output.attrib["wire"]
             if (o not in constants):
                 constants.append(o)
-            children = netl_root.findall(f"./node/input[@wire='{o}']/..")
-            for child in children:
-                GetInputsAux(netl_root, child, constants, path)
+            for child in graph.fanout(graph.wire_ids[o]):
+                GetInputsAux(netl_root, graph.elements[child], constants, path, graph)
 
 
 def GetInputs(netl_root, inputs):
@@ -60,16 +64,19 @@ def GetInputs(netl_root, inputs):
         constants += constant_wires
     '''
     constants = copy(inputs) #Avoid circuit structure changes
+    graph = CircuitGraph(netl_root)
     # start iterating from the nodes that have constant inputs
     for c in constants:
-        children = netl_root.findall(f"./node/input[@wire='{c}']/..")
+        if c not in graph.wire_ids:
+            continue
+        children = [graph.elements[n] for n in graph.fanout(graph.wire_ids[c])]
         for c in children:
-            GetInputsAux(netl_root, c, constants, path)
+            GetInputsAux(netl_root, c, constants, path, graph)
 
     return path
 
 
-def GetOutputsAux(netl_root, node, constants, path):
+def GetOutputsAux(netl_root, node, constants, path, graph=None):
     '''
     Appends nodes that could be deleted to the path variable
     Those nodes can be deleted because their outputs only affect other constant
@@ -84,11 +91,14 @@ def GetOutputsAux(netl_root, node, constants, path):
         list of wires that could be replaced by a constant value
     path : array
         list of ElementTree.Element nodes that can be deleted
+    graph : CircuitGraph
+        index of netl_root, it is built if not provided
     '''
+    graph = CircuitGraph(netl_root) if graph is None else graph
     node_output = node.findall("output")[0].attrib["wire"]
 
-    children = netl_root.findall(
-        "./node/input[@wire='" + node_output + "']/..")
+    children = [graph.elements[c]
+        for c in graph.fanout(graph.wire_ids[node_output])]
 
     children_to_keep = [c for c in children if c.attrib["var"] not in constants]
 
@@ -101,10 +111,9 @@ def GetOutputsAux(netl_root, node, constants, path):
 
         # keep going back
         for input in node.findall("input"):
-            xpath = "./node/output[@wire='" + input.attrib["wire"] + "']/.."
-            parents = netl_root.findall(xpath)
-            for parent in parents:
-                GetOutputsAux (netl_root, parent, constants, path)
+            parent = graph.driver[graph.wire_ids[input.attrib["wire"]]]
+            if parent >= 0:
+                GetOutputsAux (netl_root, graph.elements[parent], constants, path, graph)
 
 
 def GetOutputs(netl_root, outputs):
@@ -126,9 +135,11 @@ def GetOutputs(netl_root, outputs):
     path = []
 
     constants = copy(outputs) #Avoid circuit structure changes
+    graph = CircuitGraph(netl_root)
     for output in outputs:
-        nodes = netl_root.findall(f"./node/output[@wire='{output}']/..")
-        for node in nodes:
-            GetOutputsAux(netl_root, node, constants, path)
+        wire = graph.wire_ids.get(output)
+        if wire is not None and graph.driver[wire] >= 0:
+            node = graph.elements[graph.driver[wire]]
+            GetOutputsAux(netl_root, node, constants, path, graph)
 
     return path
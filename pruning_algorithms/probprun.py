@@ -36,3 +36,40 @@ def GetOneNode(netl_root):
         result = nodes_info[0]
         nodes_info = nodes_info[1:]
         yield result
+
+
+def GetOneNodeByError(circuit, dataset_file, metric="med", exact_output=None,
+    constant=None):
+    '''
+    Each time is called, return the node whose replacement by a constant
+    causes the smallest error
+
+    The error of every node is measured in one pass with
+    `Circuit.get_node_errors`, instead of using the saif probabilities
+
+    Parameters
+    ----------
+    circuit : Circuit
+        circuit to prune
+    dataset_file : string
+        path to the dataset file created with `Circuit.generate_dataset`
+    metric : string
+        error used to sort the nodes: med, wce or er
+    exact_output : string | array
+        output of the exact circuit, by default the current circuit
+    constant : int | string
+        constant that replaces the nodes, see `Circuit.get_node_errors`
+
+    Returns
+    -------
+    array
+        node to be pruned, logic 1/0 it should be replaced with and the error
+        of the circuit without it
+    '''
+    errors = circuit.get_node_errors(dataset_file, exact_output, constant)
+    nodes_info = [[var, str(e["constant"]), e[metric]]
+        for var, e in errors.items()]
+    nodes_info = sorted(nodes_info, key=lambda z: z[2])
+
+    for result in nodes_info:
+        yield result
@@ -0,0 +1,699 @@
+import heapq
+
+import numpy as np
+
+from graph import parse_constant
+from netlist import parse_port
+from utils import read_dataset
+
+
+ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+class Simulator:
+    '''
+    Bit-parallel gate-level simulator of a mapped circuit
+
+    The circuit graph is levelized once. Every wire holds its values in
+    numpy uint64 words, each word packs 64 test vectors, and the nodes that
+    share level and cell are evaluated together with the evaluator of the
+    cell, see `TechLibCell.evaluate`. The nodes marked to be deleted are
+    read when the simulation runs, so the same simulator can be reused while
+    the circuit is pruned: the outputs of a deleted node take the constants given by
+    `Circuit.node_constants`, like in the netlist written to disk.
+
+    Attributes
+    -----------
+    circuit : Circuit
+        simulated circuit
+    graph : CircuitGraph
+        graph of the circuit when the simulator was created
+    groups : list
+        (cell evaluator, node ids, input wire ids, output wire ids) of the
+        nodes evaluated together, in level order
+    chunk_words : int
+        amount of uint64 words simulated at once, bounds the memory used
+    '''
+
+    def __init__(self, circuit, chunk_words=1024):
+        '''
+        Levelizes the circuit graph and groups its nodes by level and cell
+
+        Parameters
+        ----------
+        circuit : Circuit
+            circuit to simulate
+        chunk_words : int
+            amount of uint64 words (64 test vectors each) simulated at once
+
+        Raises
+        ------
+        ValueError
+            if the circuit uses a cell that is not a combinational gate
+        '''
+        self.circuit = circuit
+        self.graph = circuit.graph
+        self.chunk_words = chunk_words
+
+        graph = self.graph
+        cells = {c.name: c for c in circuit.technology.cells}
+        levels = graph.levels()
+
+        # wire names that are verilog constants are treated as constants
+        self.constant_wires = dict(graph.constant_wires)
+        for wire_id, name in enumerate(graph.wire_names):
+            constant = parse_constant(name)
+            if constant is not None:
+                self.constant_wires[wire_id] = constant
+
+        groups = {}
+        for node_id in np.argsort(levels, kind="stable"):
+            cell_name = graph.node_names[node_id]
+            groups.setdefault((levels[node_id], cell_name), []).append(node_id)
+
+        self.groups = []
+        for (level, cell_name), node_ids in sorted(groups.items(),
+                key=lambda g: g[0][0]):
+            cell = cells.get(cell_name)
+            if cell is None or not cell.is_combinational():
+                raise ValueError(f"Cell {cell_name} can not be simulated, "
+                    "only combinational cells are supported")
+            inputs = self.pin_wires(node_ids, cell.inputs,
+                graph.in_ptr, graph.in_wires, graph.in_pins)
+            outputs = self.pin_wires(node_ids, cell.outputs,
+                graph.out_ptr, graph.out_wires, graph.out_pins)
+            self.groups.append((cell.evaluate,
+                np.array(node_ids, dtype=np.int64), inputs, outputs))
+
+        self.inputs = [parse_port(i) for i in circuit.raw_inputs]
+        self.outputs = [parse_port(o) for o in circuit.raw_outputs]
+
+    def pin_wires(self, node_ids, pins, ptr, wires, pin_names):
+        '''
+        Returns the wires connected to the pins of a group of nodes
+
+        Parameters
+        ----------
+        node_ids : array
+            ids of nodes that instance the same cell
+        pins : array
+            names of the cell pins
+        ptr, wires, pin_names : numpy.ndarray, numpy.ndarray, list
+            CSR arrays of the node inputs or outputs of the graph
+
+        Returns
+        -------
+        numpy.ndarray
+            matrix with a row per pin and a column per node, unconnected pins
+            are -1
+        '''
+        result = np.full((len(pins), len(node_ids)), -1, dtype=np.int64)
+        pin_index = {p: i for i, p in enumerate(pins)}
+        for column, node_id in enumerate(node_ids):
+            for k in range(ptr[node_id], ptr[node_id + 1]):
+                row = pin_index.get(pin_names[k])
+                if row is not None:
+                    result[row, column] = self.graph.source[wires[k]]
+        return result
+
+    def simulate(self, dataset_file, samples=None, base=16):
+        '''
+        Simulates the circuit with the test vectors of a dataset file
+
+        Parameters
+        ----------
+        dataset_file : string
+            path to a dataset file created with `Circuit.generate_dataset`,
+            with a column per circuit input
+        samples : int
+            amount of rows of the dataset to simulate, by default every row
+        base : int
+            base of the numbers of the dataset
+
+        Returns
+        -------
+        numpy.ndarray
+            matrix with a row per test vector and a column per circuit output.
+            The columns follow the order of the testbench written by
+            `Circuit.write_tb`, so the flattened matrix matches the numbers of
+            its output file.
+        '''
+        data = read_dataset(dataset_file, base, samples)
+        return self.run(data)
+
+    def run(self, data, deleted=None):
+        '''
+        Simulates the circuit with a matrix of test vectors
+
+        Parameters
+        ----------
+        data : array
+            matrix with a row per test vector and a column per circuit input
+        deleted : numpy.ndarray
+            boolean array with the nodes to simulate as deleted, by default
+            the nodes marked to be deleted in the circuit
+
+        Returns
+        -------
+        numpy.ndarray
+            matrix with a row per test vector and a column per circuit output,
+            in the order of the testbench written by `Circuit.write_tb`
+        '''
+        data = np.asarray(data)
+        samples = len(data)
+        words = -(-samples // 64)
+
+        if deleted is None:
+            deleted = self.graph.deleted()
+        constant_wires = self.constant_values(deleted)
+        packed = self.pack_inputs(data, words)
+        results = self.new_results(samples)
+
+        for start in range(0, words, self.chunk_words):
+            stop = min(start + self.chunk_words, words)
+            values = self.initial_values(packed[:, start:stop], constant_wires)
+            self.evaluate_groups(values, deleted)
+            self.write_outputs(values, results[start * 64:stop * 64])
+
+        return results
+
+    def worst_case_error(self, data, exact, max_error, first_rows=64):
+        '''
+        Simulates the circuit with a matrix of test vectors until the error
+        of one vector is above a bound
+
+        The rows are simulated in chunks that double in size, starting with
+        `first_rows`, so a circuit that breaks the bound early costs only a
+        few words of simulation.
+
+        Parameters
+        ----------
+        data : array
+            matrix with a row per test vector and a column per circuit input
+        exact : numpy.ndarray
+            output values of the exact circuit, a row per test vector
+        max_error : int
+            bound of the worst case error
+        first_rows : int
+            rows of the first chunk
+
+        Returns
+        -------
+        int, int
+            worst case error of the simulated rows, which is above max_error
+            if the simulation stopped early, and the amount of rows simulated
+        '''
+        data = np.asarray(data)
+        worst = 0
+        start = 0
+        rows = first_rows
+        while start < len(data):
+            stop = min(start + rows, len(data))
+            results = self.run(data[start:stop])
+            worst = max(worst, error_statistics(exact[start:stop].ravel(),
+                results.ravel())[1])
+            start = stop
+            rows *= 2
+            if worst > max_error:
+                break
+        return worst, start
+
+    def constant_values(self, deleted):
+        '''
+        Returns the logic value of every constant wire, including the outputs
+        of the deleted nodes
+
+        Parameters
+        ----------
+        deleted : numpy.ndarray
+            boolean array with the nodes marked to be deleted
+
+        Returns
+        -------
+        dict
+            maps wire ids to logic 1 or 0
+        '''
+        graph = self.graph
+        constant_wires = dict(self.constant_wires)
+        for node_id in np.flatnonzero(deleted):
+            constants = self.circuit.node_constants(graph.elements[node_id])
+            for w, constant in zip(graph.outputs(node_id), constants):
+                constant_wires[w] = constant
+        return constant_wires
+
+    def pack_inputs(self, data, words):
+        '''
+        Packs the bits of every circuit input wire in uint64 words
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            matrix with a row per test vector and a column per circuit input
+        words : int
+            amount of words per wire
+
+        Returns
+        -------
+        numpy.ndarray
+            matrix with a row per wire and a column per word, the rows of the
+            wires that are not circuit inputs are zero
+        '''
+        graph = self.graph
+        packed = np.zeros((len(graph.wire_names), words), dtype=np.uint64)
+        for column, (name, left, right) in enumerate(self.inputs):
+            for wire_name, position in port_bits(name, left, right):
+                wire_id = graph.wire_ids.get(wire_name)
+                if wire_id is not None:
+                    shift = position if data.dtype == object \
+                        else np.uint64(position)
+                    bits = (data[:, column] >> shift) & 1
+                    packed[wire_id] = pack_bits(bits.astype(np.uint8), words)
+        return packed
+
+    def initial_values(self, packed, constant_wires):
+        '''
+        Returns the value matrix of a chunk before evaluating the nodes
+
+        The matrix has an extra last row that is always zero, the unconnected
+        pins read it.
+        '''
+        values = np.zeros((packed.shape[0] + 1, packed.shape[1]),
+            dtype=np.uint64)
+        values[:-1] = packed
+        for wire_id, constant in constant_wires.items():
+            values[wire_id] = ONES if constant else 0
+        return values
+
+    def evaluate_groups(self, values, deleted):
+        '''
+        Evaluates every node in level order, the outputs of the deleted nodes
+        keep their constant value
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            value matrix created by `initial_values`, updated in place
+        deleted : numpy.ndarray
+            boolean array with the nodes marked to be deleted
+        '''
+        for evaluate, node_ids, inputs, outputs in self.groups:
+            deleted_nodes = deleted[node_ids]
+            results = evaluate([values[row] for row in inputs])
+            for row, result in zip(outputs, results):
+                if deleted_nodes.any():
+                    result = np.broadcast_to(result,
+                        (len(row), values.shape[1])).copy()
+                    result[deleted_nodes] = values[row[deleted_nodes]]
+                values[row] = result
+            values[-1] = 0
+
+    def new_results(self, samples):
+        '''
+        Returns an empty matrix for the output values of the circuit
+        '''
+        widths = [len(port_bits(*o)) for o in self.outputs]
+        return np.zeros((samples, len(self.outputs)),
+            dtype=np.uint64 if max(widths, default=0) <= 64 else object)
+
+    def write_outputs(self, values, results, columns=None):
+        '''
+        Builds the circuit output values from the values of their wires
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            value matrix of the simulated test vectors
+        results : numpy.ndarray
+            rows of the output matrix that belong to the test vectors,
+            updated in place
+        columns : array
+            columns of the output matrix to update, by default every column
+        '''
+        if columns is None:
+            columns = range(len(self.outputs))
+        for column in columns:
+            results[:, column] = self.output_column(values, column,
+                len(results), results.dtype)
+
+    def output_column(self, values, column, samples, dtype, overlay=None):
+        '''
+        Returns the values of one circuit output
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            value matrix of the simulated test vectors
+        column : int
+            column of the output in the output matrix
+        samples : int
+            amount of test vectors
+        dtype : numpy.dtype
+            type of the output matrix
+        overlay : dict
+            values of some wires that replace their rows of `values`, by
+            default none
+
+        Returns
+        -------
+        numpy.ndarray
+            value of the output for every test vector
+        '''
+        graph = self.graph
+        overlay = {} if overlay is None else overlay
+        result = np.zeros(samples, dtype=dtype)
+        for wire_name, position in port_bits(*self.outputs[::-1][column]):
+            wire_id = graph.wire_ids.get(wire_name)
+            if wire_id is None:
+                continue
+            source = graph.source[wire_id]
+            row = overlay[source] if source in overlay else values[source]
+            bit = unpack_bits(row, samples)
+            if dtype == object:
+                result += bit.astype(object) << position
+            else:
+                result |= bit.astype(np.uint64) << np.uint64(position)
+        return result
+
+
+class IncrementalSimulator(Simulator):
+    '''
+    Native simulator that keeps the values of every wire for the whole dataset
+
+    After a node is deleted or restored only the nodes of its transitive
+    fanout are evaluated again, and the propagation stops at the nodes whose
+    outputs do not change. The simulator observes the circuit, so calling
+    `Circuit.delete` or `Circuit.undodelete` keeps `results` up to date.
+
+    Attributes
+    -----------
+    values : numpy.ndarray
+        value of every wire for the current circuit state, a row per wire and
+        a column per uint64 word
+    results : numpy.ndarray
+        output values of the current circuit state, in the order of the
+        testbench written by `Circuit.write_tb`
+    levels : numpy.ndarray
+        level of every node
+    evaluated : int
+        amount of nodes evaluated by the last update
+    '''
+
+    def __init__(self, circuit, data):
+        '''
+        Simulates the whole circuit once and starts observing it
+
+        Parameters
+        ----------
+        circuit : Circuit
+            circuit to simulate
+        data : array
+            matrix with a row per test vector and a column per circuit input
+        '''
+        super().__init__(circuit)
+        graph = self.graph
+        data = np.asarray(data)
+        words = -(-len(data) // 64)
+
+        deleted = graph.deleted()
+        self.values = self.initial_values(self.pack_inputs(data, words),
+            self.constant_values(deleted))
+        self.evaluate_groups(self.values, deleted)
+        self.results = self.new_results(len(data))
+        self.write_outputs(self.values, self.results)
+
+        # inputs and outputs of every node, the readers of every wire
+        self.levels = graph.levels()
+        self.node_logic = [None] * len(graph)
+        readers = [[] for _ in range(len(graph.wire_names) + 1)]
+        for evaluate, node_ids, inputs, outputs in self.groups:
+            for column, node_id in enumerate(node_ids):
+                self.node_logic[node_id] = (evaluate, inputs[:, column],
+                    outputs[:, column])
+                for w in set(inputs[:, column].tolist()):
+                    readers[w].append(node_id)
+        self.readers = readers
+
+        # output columns that read each wire
+        self.output_columns = {}
+        for column, port in enumerate(self.outputs[::-1]):
+            for wire_name, _ in port_bits(*port):
+                wire_id = graph.wire_ids.get(wire_name)
+                if wire_id is not None:
+                    self.output_columns.setdefault(
+                        graph.source[wire_id], set()).add(column)
+
+        self.evaluated = 0
+        circuit.add_observer(self.update)
+
+    def update(self, node_id):
+        '''
+        Propagates the deletion or restoration of a node
+
+        Parameters
+        ----------
+        node_id : int
+            id of the node whose delete label changed
+        '''
+        graph = self.graph
+        values = self.values
+        changed = []
+
+        if graph.is_deleted(node_id):
+            constants = self.circuit.node_constants(graph.elements[node_id])
+            for w, constant in zip(graph.outputs(node_id), constants):
+                w = graph.source[w]
+                new = ONES if constant else 0
+                if (values[w] != new).any():
+                    values[w] = new
+                    changed.append(w)
+            pending = set()
+        else:
+            pending = {node_id}
+        for w in changed:
+            pending.update(self.readers[w])
+
+        # evaluate the cone in level order
+        self.evaluated = 0
+        heap = [(self.levels[n], n) for n in pending]
+        heapq.heapify(heap)
+        while heap:
+            _, node = heapq.heappop(heap)
+            if node not in pending:
+                continue
+            pending.discard(node)
+            if graph.is_deleted(node):
+                continue
+            self.evaluated += 1
+            evaluate, inputs, outputs = self.node_logic[node]
+            results = evaluate([values[w] for w in inputs])
+            for w, result in zip(outputs, results):
+                if w < 0 or (values[w] == result).all():
+                    continue
+                values[w] = result
+                changed.append(w)
+                for reader in self.readers[w]:
+                    if reader not in pending:
+                        pending.add(reader)
+                        heapq.heappush(heap, (self.levels[reader], reader))
+
+        columns = set()
+        for w in changed:
+            columns.update(self.output_columns.get(w, ()))
+        self.write_outputs(values, self.results, sorted(columns))
+
+    def node_errors(self, exact=None, constant=None, nodes=None):
+        '''
+        Measures the error caused by replacing each node with a constant
+
+        Every node is replaced in turn, without changing the circuit, and only
+        the differences with the current wire values are propagated through
+        its fanout cone. The error is measured against `exact` the same way
+        `compute_error` compares the testbench outputs.
+
+        Parameters
+        ----------
+        exact : array
+            output values to compare against, by default the outputs of the
+            current circuit
+        constant : int | string
+            0 or 1 to tie every node to that value, None to use
+            `Circuit.node_constants`, or "best" to try both values and keep
+            the one with the smaller mean error distance. With None the
+            constant of the first output of the node is returned.
+        nodes : array
+            names of the nodes to evaluate, by default every node that is not
+            deleted
+
+        Returns
+        -------
+        dict
+            maps every node name to a dictionary with its "constant" and the
+            "med", "wce" and "er" of the circuit with that node replaced
+        '''
+        graph = self.graph
+        exact = self.results if exact is None else \
+            np.asarray(exact).reshape(self.results.shape)
+        samples, columns = self.results.shape
+        total = samples * columns
+
+        # error of the outputs of the current circuit, per column
+        base = [error_statistics(exact[:, c], self.results[:, c])
+            for c in range(columns)]
+
+        if nodes is None:
+            nodes = [graph.node_vars[n] for n in range(len(graph))
+                if not graph.is_deleted(n)]
+
+        table = {}
+        for var in nodes:
+            node_id = graph.node_ids[var]
+            if constant is None:
+                candidates = [self.circuit.node_constants(
+                    graph.elements[node_id])]
+            elif constant == "best":
+                candidates = [0, 1]
+            else:
+                candidates = [constant]
+
+            best = None
+            for c in candidates:
+                overlay = self.propagate_constant(node_id, c)
+                changed = set()
+                for w in overlay:
+                    changed.update(self.output_columns.get(w, ()))
+                statistics = list(base)
+                for column in changed:
+                    approximate = self.output_column(self.values, column,
+                        samples, self.results.dtype, overlay)
+                    statistics[column] = error_statistics(exact[:, column],
+                        approximate)
+                row = {
+                    "constant": c[0] if isinstance(c, list) else c,
+                    "med": round(sum(s[0] for s in statistics) / total, 3),
+                    "wce": max(s[1] for s in statistics),
+                    "er": round(sum(s[2] for s in statistics) / total, 3),
+                }
+                if best is None or row["med"] < best["med"]:
+                    best = row
+            table[var] = best
+        return table
+
+    def propagate_constant(self, node_id, constant):
+        '''
+        Returns the wire values that change when a node is tied to a constant
+
+        Parameters
+        ----------
+        node_id : int
+            id of the node
+        constant : int | array
+            logic 1 or 0, or a list with the constant of every output
+
+        Returns
+        -------
+        dict
+            new values of the changed wires, keyed by wire id
+        '''
+        graph = self.graph
+        values = self.values
+        overlay = {}
+        pending = set()
+        outputs = graph.outputs(node_id)
+        constants = constant if isinstance(constant, list) \
+            else [constant] * len(outputs)
+        for w, constant in zip(outputs, constants):
+            w = graph.source[w]
+            new = ONES if constant else np.uint64(0)
+            if (values[w] != new).any():
+                overlay[w] = np.full(values.shape[1], new, dtype=np.uint64)
+                pending.update(self.readers[w])
+
+        heap = [(self.levels[n], n) for n in pending]
+        heapq.heapify(heap)
+        while heap:
+            _, node = heapq.heappop(heap)
+            pending.discard(node)
+            if node == node_id or graph.is_deleted(node):
+                continue
+            evaluate, inputs, outputs = self.node_logic[node]
+            results = evaluate([overlay[w] if w in overlay else values[w]
+                for w in inputs])
+            for w, result in zip(outputs, results):
+                if w < 0 or (values[w] == result).all():
+                    continue
+                overlay[w] = result
+                for reader in self.readers[w]:
+                    if reader not in pending:
+                        pending.add(reader)
+                        heapq.heappush(heap, (self.levels[reader], reader))
+        return overlay
+
+    def close(self):
+        '''
+        Stops observing the circuit
+        '''
+        self.circuit.remove_observer(self.update)
+
+
+def error_statistics(exact, approximate):
+    '''
+    Returns the sum of the error distances, the worst case error and the
+    amount of errors between two arrays of output values
+    '''
+    if exact.dtype == object or approximate.dtype == object:
+        distance = np.abs(exact.astype(object) - approximate.astype(object))
+    else:
+        distance = np.where(exact > approximate, exact - approximate,
+            approximate - exact)
+    if len(distance) == 0:
+        return 0, 0, 0
+    return float(distance.sum(dtype=float)), int(distance.max()), \
+        int(np.count_nonzero(distance))
+
+
+def port_bits(name, left, right):
+    '''
+    Returns the wires of a port with the position of their bit in the value
+
+    Parameters
+    ----------
+    name : string
+        name of the port
+    left, right : int
+        bounds of the port, None for one bit ports
+
+    Returns
+    -------
+    array
+        list of (wire name, bit position) pairs
+
+    Examples
+    -------
+        >>> port_bits("a", 2, 0)
+        [('a[2]', 2), ('a[1]', 1), ('a[0]', 0)]
+        >>> port_bits("z", None, None)
+        [('z', 0)]
+    '''
+    if left is None:
+        return [(name, 0)]
+    step = -1 if left > right else 1
+    return [(f"{name}[{i}]", abs(i - right))
+        for i in range(left, right + step, step)]
+
+
+def pack_bits(bits, words):
+    '''
+    Packs an array of bits into uint64 words, 64 bits per word
+    '''
+    packed = np.packbits(bits, bitorder="little")
+    buffer = np.zeros(words * 8, dtype=np.uint8)
+    buffer[:len(packed)] = packed
+    return buffer.view("<u8").astype(np.uint64)
+
+
+def unpack_bits(words, count):
+    '''
+    Unpacks the first `count` bits of an array of uint64 words
+    '''
+    buffer = np.ascontiguousarray(words, dtype="<u8").view(np.uint8)
+    return np.unpackbits(buffer, count=count, bitorder="little")
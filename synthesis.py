@@ -1,8 +1,31 @@
 
+import atexit
 import os
 import re
+import subprocess
+import sys
+import tempfile
+import threading
 
-def synthesis (rtl, tech, topmodule):
+from cache import cache_folder, cache_key
+from technology import read_liberty_areas
+
+try:
+    from pyosys import libyosys
+except ImportError:
+    libyosys = None
+
+# line printed by a yosys session after every script
+SESSION_MARKER = "AXLS-SCRIPT-DONE"
+
+# yosys session of every thread, see `yosys_session`
+sessions = threading.local()
+
+# whether scripts that call abc run in the yosys sessions, see
+# `session_runs_abc`, it is checked on the first script
+abc_in_session = None
+
+def synthesis (rtl, tech, topmodule, workdir=None):
     '''
     Synthetizes a circuit file and map it to a specific techonolgy
 
@@ -16,125 +39,141 @@ def synthesis (rtl, tech, topmodule):
         name of the circuit we want to sintetize
     tool : str
         name of tool we are going to use to sintetize
+    workdir : str
+        folder where yosys runs and the netlist is written, by default the
+        netlist is written next to the rtl file
 
     Returns
     -------
     str
         path of the sintetized netlist file
 
+    The script runs in the yosys session of the process, see
+    `run_abc_script`.
     '''
 
     # - - - - - - - - - - - - - Copy the synth.ys file - - - - - - - - - - - -
-    current_dir=os.path.dirname(__file__)
+    current_dir=os.path.dirname(os.path.abspath(__file__))
     file = open(f"{current_dir}/templates/synth.ys","r")
     file_text = file.read()
     file.close()
 
-    netlist_path = os.path.dirname(rtl) + "/netlist.v"
+    rtl = os.path.abspath(rtl)
+    folder = os.path.dirname(rtl) if workdir is None else workdir
+    netlist_path = os.path.abspath(folder) + "/netlist.v"
 
     file_text = file_text.replace("[[RTLFILENAME]]", f'"{rtl}"')
     file_text = file_text.replace("[[TOPMODULE]]", topmodule)
     file_text = file_text.replace("[[NETLIST]]", f'"{netlist_path}"')
     file_text = file_text.replace("[[LIBRARY]]", f'"{current_dir}/templates/{tech}.lib"')
     file_text = file_text.replace("[[LIBRARYABC]]", f'"{current_dir}/templates/{tech}.lib"')
-
-    file = open('synth.ys',"w")
-    file.write(file_text)
-    file.close()
+    file_text = file_text.replace("[[ABCSCRIPT]]", f'"{current_dir}/templates/abc.script"')
 
     # - - - - - - - - - - - - - - - Execute yosys - - - - - - - - - - - - - -
 
-    os.system ('yosys synth.ys;')
-
-    # - - - - - - - - - - - - - Delete temporal Files - - - - - - - - - - - -
-
-    os.remove ("synth.ys")
+    run_abc_script(file_text, workdir)
 
     return netlist_path
 
-def resynthesis(netlist, tech, topmodule):
+def resynthesis(netlist, tech, topmodule, workdir=None):
 
     '''
 
     Pass a synthetized circuit to Yosys, reading the tech source file to repeat the synthesis.
 
+    The script runs in the yosys session of the process, see
+    `run_abc_script`, where the tech source file is read once.
+
     :param netlist: string
         Synthetized circuit netlist
     :param tech: string
         Name of the technology library
     :param topmodule: string
         Topmodule of the circuit
+    :param workdir: string
+        Folder where yosys runs and the netlist is written, by default the
+        folder of the input netlist
     :return:
         path-like string
             Path to re-synthetized netlist
     '''
 
 
-    current_dir=os.path.dirname(__file__)
+    current_dir=os.path.dirname(os.path.abspath(__file__))
     file = open(f"{current_dir}/templates/resynth.ys","r")
     file_text = file.read()
     file.close()
 
-    netlist_path = os.path.dirname(netlist) + "/netlist.v"
+    netlist = os.path.abspath(netlist)
+    folder = os.path.dirname(netlist) if workdir is None else workdir
+    netlist_path = os.path.abspath(folder) + "/netlist.v"
 
     file_text = file_text.replace("[[RTLFILENAME]]", netlist)
     file_text = file_text.replace("[[TOPMODULE]]", topmodule)
-    file_text = file_text.replace("[[TECHNOLOGY]]", f'{current_dir}/templates/{tech}.v')
     file_text = file_text.replace("[[NETLIST]]", netlist_path)
     file_text = file_text.replace("[[LIBRARY]]", f"{current_dir}/templates/{tech}.lib")
     file_text = file_text.replace("[[LIBRARYABC]]", f"{current_dir}/templates/{tech}.lib")
-
-    file = open('resynth.ys',"w")
-    file.write(file_text)
-    file.close()
+    file_text = file_text.replace("[[ABCSCRIPT]]", f"{current_dir}/templates/abc.script")
 
     # - - - - - - - - - - - - - - - Execute yosys - - - - - - - - - - - - - -
 
-    os.system ('yosys resynth.ys;')
-
-    # - - - - - - - - - - - - - Delete temporal Files - - - - - - - - - - - -
-
-    os.remove ("resynth.ys")
+    # the modules of the cells are read once per session and flattened into
+    # the netlist
+    run_abc_script(file_text, workdir, (f"{tech}_modules",
+        f'read_verilog "{current_dir}/templates/{tech}.v"'))
 
     return netlist_path
 
-def ys_get_area(netlist, tech, topmodule):
+def ys_get_area(netlist, tech, topmodule, workdir=None):
 
     '''
 
     Opens the circuit in Yosys and runs stat command to estimate area. Result is parsed
     from a temporary log file generated.
 
+    The yosys session of the process keeps the cells of the technology
+    loaded, and stat reads a liberty file with only the area of every cell,
+    see `area_liberty`.
+
     :param netlist: string
         Synthetized circuit netlist
     :param tech: string
         Name of the technology library
     :param topmodule: string
         Topmodule of the circuit
+    :param workdir: string
+        Folder where yosys runs and writes its log, by default the folder of
+        the netlist
     :return:
-        string
-            Area estimation obtained from yosys stat command
+        float
+            Area estimation obtained from yosys stat command, 0 if yosys
+            does not print it
     '''
 
-    current_dir=os.path.dirname(__file__)
+    current_dir=os.path.dirname(os.path.abspath(__file__))
     file = open(f"{current_dir}/templates/stat.ys","r")
     file_text = file.read()
     file.close()
 
-    yosys_log_path = os.path.dirname(netlist) + "/yosys_log.txt"
+    netlist = os.path.abspath(netlist)
+    folder = os.path.dirname(netlist) if workdir is None else workdir
+    log_file, yosys_log_path = tempfile.mkstemp(suffix=".txt", dir=folder)
+    os.close(log_file)
 
+    # the cells of the technology are read once per session
+    session = yosys_session()
+    cells = session.load(f"{tech}_cells",
+        f'read_verilog -lib "{current_dir}/templates/{tech}.v"')
+
+    file_text = file_text.replace("[[CELLS]]", cells)
     file_text = file_text.replace("[[RTLFILENAME]]", f'"{netlist}"')
-    file_text = file_text.replace("[[TECHNOLOGY]]", f'"{current_dir}/templates/{tech}.v"')
     file_text = file_text.replace("[[TOPMODULE]]", topmodule)
-    file_text = file_text.replace("[[LIBRARY]]", f'"{current_dir}/templates/{tech}.lib"')
-
-    file = open('stat.ys',"w")
-    file.write(file_text)
-    file.close()
+    file_text = file_text.replace("[[LIBRARY]]", f'"{area_liberty(tech)}"')
+    file_text = file_text.replace("[[LOG]]", f'"{yosys_log_path}"')
 
     # - - - - - - - - - - - - - - - Execute yosys - - - - - - - - - - - - - -
 
-    os.system (f'yosys stat.ys -l \"{yosys_log_path}\"')
+    session.run(file_text)
 
     # - - - - - - - - - - - - - - - Parse Area - - - - - - - - - - - - - - -
 
@@ -143,14 +182,268 @@ def ys_get_area(netlist, tech, topmodule):
         pattern = r'Chip area for module\s\'[\s\S]*\':\s([\d\.]*)'
         area_pattern = re.findall(pattern, text)
         if (area_pattern):
-            area = area_pattern[0]
+            area = float(area_pattern[0])
         else:
-            area = 0
+            area = 0.0
         read_file.close()
 
     # - - - - - - - - - - - - - Delete temporal Files - - - - - - - - - - - -
 
-    os.remove ("stat.ys")
     os.remove (yosys_log_path)
 
     return area
+
+def run_yosys(script, workdir=None, log=None):
+    '''
+    Runs a yosys script
+
+    The script is written to a file with a unique name, so several yosys
+    processes can run at the same time in the same folder.
+
+    Parameters
+    ----------
+    script : str
+        content of the yosys script
+    workdir : str
+        folder where yosys runs, by default the current working directory
+    log : str
+        path of the yosys log file, by default no log is written
+    '''
+    workdir = os.getcwd() if workdir is None else workdir
+    script_file, script_path = tempfile.mkstemp(suffix=".ys", dir=workdir)
+    with os.fdopen(script_file, "w") as file:
+        file.write(script)
+
+    command = ["yosys", script_path]
+    if log is not None:
+        command += ["-l", log]
+    subprocess.run(command, cwd=workdir)
+
+    os.remove(script_path)
+
+def session_runs_abc(timeout=30):
+    '''
+    Returns true if scripts that call abc can run in a yosys session
+
+    yosys starts abc as a child process in batch mode, so it runs in a
+    session like any other script. Some yosys builds, like the WebAssembly
+    one of YoWASP, run abc inside yosys reading the pipe of the session, and
+    abc waits for commands that never come. A small script tells both cases
+    apart, its session is killed if it has not finished after some seconds.
+
+    Parameters
+    ----------
+    timeout : float
+        seconds the script can take
+
+    Returns
+    -------
+    bool
+        true if the script finished in the session
+    '''
+    session = YosysSession()
+    if session.process is None:
+        return True
+
+    rtl_file, rtl_path = tempfile.mkstemp(suffix=".v")
+    with os.fdopen(rtl_file, "w") as file:
+        file.write("module probe(a, b, y); input a, b; output y;\n"
+            "assign y = a & b; endmodule\n")
+    timer = threading.Timer(timeout, session.process.kill)
+    timer.start()
+    try:
+        session.run(f'read_verilog "{rtl_path}"\nsynth -top probe\nabc -g AND')
+        return True
+    except RuntimeError:
+        return False
+    finally:
+        timer.cancel()
+        session.close()
+        os.remove(rtl_path)
+
+def run_abc_script(script, workdir=None, cells=None):
+    '''
+    Runs a yosys script that calls abc in the yosys session of the thread,
+    see `yosys_session`, or in a new yosys process if abc cannot run in a
+    session, see `session_runs_abc`
+
+    Parameters
+    ----------
+    script : str
+        content of the yosys script
+    workdir : str
+        folder where a new yosys process runs, see `run_yosys`
+    cells : tuple
+        (name, script) of a design that the script starts from, it replaces
+        the [[CELLS]] line of the script. A session creates it once, see
+        `YosysSession.load`.
+    '''
+    global abc_in_session
+    if abc_in_session is None:
+        abc_in_session = session_runs_abc()
+
+    if abc_in_session:
+        session = yosys_session()
+        session.run(script if cells is None
+            else script.replace("[[CELLS]]", session.load(*cells)))
+    else:
+        run_yosys(script if cells is None
+            else script.replace("[[CELLS]]", cells[1]), workdir)
+
+def area_liberty(tech):
+    '''
+    Returns the path of a liberty file with only the area of every cell of a
+    technology
+
+    Parsing the complete liberty file takes most of the time of a stat
+    command. The reduced file is created once in the cache folder, see
+    `cache.cache_folder`.
+
+    Parameters
+    ----------
+    tech : str
+        name of the technology library
+
+    Returns
+    -------
+    str
+        path of the area liberty file
+    '''
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    library = f"{current_dir}/templates/{tech}.lib"
+    key = cache_key([library], ["area-liberty"])
+    filename = os.path.join(cache_folder(), f"{key}.lib")
+    if os.path.exists(filename):
+        return filename
+
+    lines = [f"library ({tech}_area) {{"]
+    for cell, area in read_liberty_areas(tech).items():
+        lines.append(f"  cell ({cell}) {{ area : {area!r}; }}")
+    lines.append("}\n")
+
+    os.makedirs(cache_folder(), exist_ok=True)
+    entry_file, entry_path = tempfile.mkstemp(dir=cache_folder(), suffix=".tmp")
+    with os.fdopen(entry_file, "w") as file:
+        file.write("\n".join(lines))
+    os.replace(entry_path, filename)
+    return filename
+
+class YosysSession:
+    '''
+    A yosys process that runs many scripts
+
+    Starting yosys and reading the technology files takes longer than most
+    scripts, so a session keeps one yosys alive and sends it the scripts
+    through a pipe. pyosys is used instead of a process when it is installed.
+    Every script starts with an empty design, and designs saved with `load`
+    are kept between scripts. Paths in the scripts must be absolute.
+
+    Parameters
+    ----------
+    executable : str
+        yosys command
+    '''
+    def __init__(self, executable="yosys"):
+        self.saved = {}
+        self.process = None
+        self.design = None
+        if libyosys is not None:
+            self.design = libyosys.Design()
+        else:
+            self.process = subprocess.Popen([executable, "-Q", "-q"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                bufsize=1)
+
+    def run(self, script, reset=True):
+        '''
+        Runs a yosys script
+
+        Errors of the script are written to stderr, like yosys does.
+
+        Parameters
+        ----------
+        script : str
+            content of the yosys script
+        reset : bool
+            if true, the design is emptied before running the script
+        '''
+        commands = [line for line in script.splitlines() if line.strip()]
+        if reset:
+            commands.insert(0, "design -reset")
+
+        if self.design is not None:
+            for command in commands:
+                libyosys.run_pass(command, self.design)
+            return
+
+        if self.process.poll() is not None:
+            raise RuntimeError("The yosys session has finished")
+        try:
+            self.process.stdin.write("\n".join(commands)
+                + f"\nlog -stdout {SESSION_MARKER}\n")
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            raise RuntimeError("The yosys session has finished")
+        for line in self.process.stdout:
+            if line.rstrip().endswith(SESSION_MARKER):
+                return
+            if "ERROR:" in line:
+                sys.stderr.write(line[line.index("ERROR:"):])
+        raise RuntimeError("The yosys session has finished")
+
+    def load(self, name, script):
+        '''
+        Runs a script once per session and saves its design
+
+        Parameters
+        ----------
+        name : str
+            name of the saved design
+        script : str
+            yosys script that creates the design
+
+        Returns
+        -------
+        str
+            command that restores the saved design
+        '''
+        if name not in self.saved:
+            self.run(f"{script}\ndesign -save {name}")
+            self.saved[name] = f"design -load {name}"
+        return self.saved[name]
+
+    def finished(self):
+        '''
+        Returns true if the yosys process has finished
+        '''
+        return self.process is not None and self.process.poll() is not None
+
+    def close(self):
+        '''
+        Finishes the yosys process and closes its pipes
+        '''
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            # the process had finished
+            pass
+        self.process.wait()
+        self.process.stdout.close()
+
+def yosys_session():
+    '''
+    Returns the yosys session of the current thread, it is started on the
+    first call and again if it finished
+
+    Every thread and every worker of a process pool keeps its own yosys alive
+    for all its jobs, so sessions are never shared by two scripts at the same
+    time. Processes created with fork start their own session.
+    '''
+    session = getattr(sessions, "session", None)
+    if session is None or sessions.pid != os.getpid() or session.finished():
+        session = sessions.session = YosysSession()
+        sessions.pid = os.getpid()
+        atexit.register(session.close)
+    return session
@@ -1,8 +1,15 @@
-from re import match, findall
+from bisect import bisect_left
+from functools import lru_cache
+from re import compile as compile_pattern, match, findall, finditer, search, sub, DOTALL, \
+    MULTILINE, VERBOSE
 import xml.etree.cElementTree as ET
 
 from pathlib import Path
 
+import numpy as np
+
+from cache import cache_key, load, store
+
 class TechLibCell:
     '''
     Intermediate representation of a technology library cell
@@ -15,12 +22,38 @@ class TechLibCell:
         inputs of the technology library cell
     outputs : array
         outputs of the technology library cell
+    primitives : array
+        verilog gate primitives (gate, outputs, inputs) that describe the
+        logic of the cell, None if the cell is not purely combinational
+    functions : dict
+        liberty boolean function of every output pin
+    evaluate : function
+        evaluates the logic of the cell, receives a list with the values of
+        every input and returns a list with the values of every output. The
+        values can be integers or numpy arrays, every bit is evaluated in
+        parallel. None if the cell is not combinational.
+    truth_tables : dict
+        truth table of every output as an integer, bit i is the output when
+        the input k of the cell takes the value of bit k of i
+    area : float
+        area of the cell in the liberty file, 0 if it is unknown
     '''
 
-    def __init__ (self, name, inputs, outputs):
+    def __init__ (self, name, inputs, outputs, primitives=None):
         self.name = name
         self.inputs = inputs
         self.outputs = outputs
+        self.primitives = primitives
+        self.functions = {}
+        self.evaluate = None
+        self.truth_tables = {}
+        self.area = 0.0
+
+    def is_combinational(self):
+        '''
+        Returns true if the logic of the cell is known and combinational
+        '''
+        return self.evaluate is not None
 
 
 class Technology:
@@ -29,23 +62,41 @@ class Technology:
 
     Attributes
     -----------
+    tech : str
+        name of the technology library
     cells : array
         list of Technology Library Cells
+    udps : dict
+        truth table of the combinational user defined primitives of the
+        technology file, None for the sequential ones
+    areas : dict
+        area of every cell of the liberty file
+    liberty : Liberty
+        contents of the liberty file used by the cost models, see
+        `read_liberty`. None if the technology has no liberty file.
     root : ElementTree.Element
         object that references the root element of the Technology Library tree
     '''
 
+    def __reduce__(self):
+        # the compiled evaluators can not be pickled, the copy parses the
+        # technology files again
+        return (Technology, (self.tech,))
+
     def __init__(self, tech):
+        self.tech = tech
         self.cells = []
 
         with open(f"{Path(__file__).parent}/templates/{tech}.v", 'r') as technology_file:
             content = technology_file.read()
 
+            self.udps = get_udps(content)
+
             # split the technology file in modules
             modules = [f"module{line}module" for line in content.split('module')]
 
             for module in modules:
-                if ('input' not in module or 'output' not in module):
+                if ('output' not in module):
                     continue
                 elif ('primitive' in module):
                     continue
@@ -56,11 +107,22 @@ class Technology:
                     module_inputs = findall(r'input[\s\t]+(.+);', module)
                     module_outputs = findall(r'output[\s\t]+(.+);', module)
                     # there was a fix to remove commas here
+                    module_primitives = get_primitives(module, self.udps)
 
                     self.cells.append(
-                        TechLibCell(module_name,module_inputs,module_outputs)
+                        TechLibCell(module_name,module_inputs,module_outputs,
+                            module_primitives)
                     )
 
+        self.liberty = read_liberty(tech)
+        liberty = read_liberty_functions(tech)
+        for cell in self.cells:
+            compile_cell(cell, liberty.get(cell.name, {}), self.udps)
+
+        self.areas = read_liberty_areas(tech)
+        for cell in self.cells:
+            cell.area = self.areas.get(cell.name, 0.0)
+
         self.root = self.to_xml()
 
 
@@ -87,3 +149,916 @@ class Technology:
 
 
         return root
+
+
+PRIMITIVE_GATES = {"and", "nand", "or", "nor", "xor", "xnor", "buf", "not"}
+
+def get_primitives(module, udps=None):
+    '''
+    Extracts the gate primitives instanced inside a technology module
+
+    Parameters
+    ----------
+    module : string
+        verilog code of the module
+    udps : dict
+        user defined primitives of the technology file, see `get_udps`, by
+        default none
+
+    Returns
+    -------
+    array
+        list of (gate, outputs, inputs) tuples, or None if the module
+        instances something that is not a combinational primitive, like the
+        sequential UDPs or the tri-state buffers
+
+    Examples
+    -------
+        >>> get_primitives("module INV_X1 (I, ZN);\\n  not(ZN, I);\\nendmodule")
+        [('not', ['ZN'], ['I'])]
+    '''
+    udps = {} if udps is None else udps
+    primitives = []
+    statements = findall(r'^\s*([^\s(]+)\s*\((.*)\)\s*;', module, MULTILINE)
+    for gate, ports in statements:
+        if gate not in PRIMITIVE_GATES and udps.get(gate) is None:
+            return None
+        ports = [p.strip() for p in ports.split(',')]
+        if gate in ("buf", "not"):
+            # buf and not drive every port but the last one
+            primitives.append((gate, ports[:-1], ports[-1:]))
+        else:
+            primitives.append((gate, ports[:1], ports[1:]))
+    return primitives
+
+
+def get_udps(content):
+    '''
+    Extracts the user defined primitives of a verilog file
+
+    Parameters
+    ----------
+    content : string
+        verilog code
+
+    Returns
+    -------
+    dict
+        maps the name of every UDP to its truth table (see
+        `TechLibCell.truth_tables`), or to None if the UDP is sequential
+
+    Examples
+    -------
+        >>> get_udps("primitive mux (o, s, a, b);\\n table\\n"
+        ...     " 0 1 ? : 1;\\n 0 0 ? : 0;\\n 1 ? 1 : 1;\\n 1 ? 0 : 0;\\n"
+        ...     " endtable\\nendprimitive")
+        {'mux': 228}
+    '''
+    udps = {}
+    expreg = r'primitive\s+(\S+)\s*\(([^)]*)\)\s*;(.*?)endprimitive'
+    for name, ports, body in findall(expreg, content, DOTALL):
+        table = search(r'table(.*?)endtable', body, DOTALL)
+        rows = sub(r'//[^\n]*', '', table.group(1)).split(';')
+        truth_table = 0
+        for row in rows:
+            fields = row.split(':')
+            if len(fields) == 1:
+                continue
+            if len(fields) != 2:
+                # rows with the current state belong to sequential UDPs
+                truth_table = None
+                break
+            levels, output = fields[0].split(), fields[1].strip()
+            if output != '1':
+                continue
+            combinations = [0]
+            for k, level in enumerate(levels):
+                if level == '1':
+                    combinations = [c | 1 << k for c in combinations]
+                elif level in '?b':
+                    combinations += [c | 1 << k for c in combinations]
+                elif level != '0':
+                    combinations = []
+            for c in combinations:
+                truth_table |= 1 << c
+        udps[name] = truth_table
+    return udps
+
+
+# groups of a liberty cell that make it store state
+SEQUENTIAL_GROUPS = {"ff", "latch", "ff_bank", "latch_bank", "statetable"}
+
+# lookup tables of the timing groups
+TIMING_TABLES = ("cell_rise", "cell_fall", "rise_transition",
+    "fall_transition")
+
+# lookup tables of the internal power groups
+POWER_TABLES = ("rise_power", "fall_power", "power")
+
+# units assumed by liberty when a library does not define them
+DEFAULT_UNITS = {"time_unit": "1ns", "voltage_unit": "1V",
+    "current_unit": "1mA", "pulling_resistance_unit": "1kohm",
+    "capacitive_load_unit": "1pf", "leakage_power_unit": "1uW"}
+
+UNIT_NAMES = ("ohm", "w", "v", "a", "f", "s")
+
+UNIT_PREFIXES = {"": 1.0, "f": 1e-15, "p": 1e-12, "n": 1e-9, "u": 1e-6,
+    "m": 1e-3, "k": 1e3, "M": 1e6}
+
+# a statement of a liberty file: the end of a group, a simple attribute
+# `name : value ;` or a group or complex attribute `name (arguments)`
+LIBERTY_STATEMENT = compile_pattern(r'''\s*(?:
+    (?P<close>\})
+  | (?P<name>[A-Za-z_][\w.]*)\s*(?:
+        :\s*(?P<value>"[^"]*"|[^;"\n]*?)\s*;?[ \t]*(?=\n|\}|$)
+      | \(\s*(?P<arguments>(?:"[^"]*"|[^)"])*)\)\s*(?P<open>\{)?\s*;?
+    )
+)''', VERBOSE)
+
+class LibertyGroup:
+    '''
+    A group of a liberty file, like `cell (AND2_X1) { ... }`
+
+    Attributes
+    -----------
+    kind : str
+        type of the group, like cell or pin
+    arguments : array
+        strings between the parenthesis of the group
+    attributes : dict
+        value of the simple attributes, without quotes
+    complex : dict
+        arguments of the complex attributes, like index_1 or values
+    groups : array
+        nested groups
+    '''
+
+    def __init__(self, kind, arguments):
+        self.kind = kind
+        self.arguments = arguments
+        self.attributes = {}
+        self.complex = {}
+        self.groups = []
+
+    def find(self, kind):
+        '''
+        Returns the nested groups of a type
+        '''
+        return [group for group in self.groups if group.kind == kind]
+
+    def number(self, name, default=None):
+        '''
+        Returns a simple attribute as a float
+        '''
+        value = self.attributes.get(name)
+        return default if value is None else float(value)
+
+def parse_liberty(content):
+    '''
+    Parses the text of a liberty file into its groups
+
+    Parameters
+    ----------
+    content : str
+        text of the liberty file
+
+    Returns
+    -------
+    LibertyGroup
+        the library group
+    '''
+    content = sub(r'/\*.*?\*/', '', content, flags=DOTALL)
+    content = sub(r'\\\s*\n', ' ', content)
+
+    root = LibertyGroup("root", [])
+    stack = [root]
+    position = 0
+    while position < len(content):
+        statement = LIBERTY_STATEMENT.match(content, position)
+        if statement is None or statement.end() == position:
+            if content[position:].strip():
+                line = content.count("\n", 0, position) + 1
+                raise ValueError(f"Liberty syntax error in line {line}")
+            break
+        position = statement.end()
+        if statement.group("close"):
+            stack.pop()
+            continue
+        name = statement.group("name")
+        if statement.group("value") is not None:
+            stack[-1].attributes[name] = statement.group("value").strip('"')
+            continue
+        arguments = [a.strip().strip('"') for a in
+            findall(r'\s*("[^"]*"|[^,"]+)', statement.group("arguments"))]
+        if statement.group("open"):
+            group = LibertyGroup(name, arguments)
+            stack[-1].groups.append(group)
+            stack.append(group)
+        else:
+            stack[-1].complex[name] = arguments
+
+    libraries = root.find("library")
+    if not libraries:
+        raise ValueError("The liberty file has no library group")
+    return libraries[0]
+
+
+class LibertyTable:
+    '''
+    A lookup table of a liberty file
+
+    Attributes
+    -----------
+    index_1 : numpy.ndarray
+        values of the first variable
+    index_2 : numpy.ndarray
+        values of the second variable, empty in one dimensional tables
+    values : numpy.ndarray
+        table with a row per value of index_1 and a column per value of
+        index_2
+    variables : array
+        names of the variables of the indexes given by the template, like
+        input_net_transition or total_output_net_capacitance
+    '''
+
+    def __init__(self, index_1, index_2, values, variables=()):
+        self.index_1 = index_1
+        self.index_2 = index_2
+        self.values = values
+        self.variables = variables
+        # python lists interpolate faster than numpy scalars
+        self.lists = (index_1.tolist(), index_2.tolist(), values.tolist())
+
+    def lookup(self, transition, load=0.0):
+        '''
+        Interpolates the table at an input transition and an output load
+
+        The variables of the template decide which index is the transition
+        and which is the load, tables without template are read as
+        (transition, load). Values outside the indexes are extrapolated from
+        the closest segment, like static timing tools do.
+
+        Parameters
+        ----------
+        transition : float
+            input transition, in the time unit of the library
+        load : float
+            output capacitance, in the capacitive load unit of the library
+
+        Returns
+        -------
+        float
+            interpolated value, 0 if the table is empty
+        '''
+        return self.interpolate(self.segments(transition, load))
+
+    def segments(self, transition, load=0.0):
+        '''
+        Returns the segments of the indexes that interpolate a transition and
+        a load, see `table_segment`. Tables with the same indexes share them.
+        '''
+        x, y = float(transition), float(load)
+        if self.variables and "capacitance" in self.variables[0]:
+            x, y = y, x
+        return table_segment(self.lists[0], x) + table_segment(self.lists[1], y)
+
+    def interpolate(self, segments):
+        '''
+        Returns the value of the table at some segments of its indexes
+        '''
+        values = self.lists[2]
+        if not values:
+            return 0.0
+        i, u, j, v = segments
+        row, row2 = values[i], values[min(i + 1, len(values) - 1)]
+        j2 = min(j + 1, len(row) - 1)
+        return (row[j] * (1 - v) + row[j2] * v) * (1 - u) \
+            + (row2[j] * (1 - v) + row2[j2] * v) * u
+
+    def transitions(self):
+        '''
+        Returns the index of the transition variable of the table, see
+        `lookup`
+        '''
+        if self.variables and "capacitance" in self.variables[0]:
+            return self.index_2
+        return self.index_1
+
+def table_segment(index, x):
+    '''
+    Returns the position i of the segment index[i], index[i + 1] that is used
+    to interpolate x, and the weight of index[i + 1]
+    '''
+    if len(index) < 2:
+        return 0, 0.0
+    i = min(max(bisect_left(index, x) - 1, 0), len(index) - 2)
+    return i, (x - index[i]) / (index[i + 1] - index[i])
+
+def read_table(group, templates):
+    '''
+    Returns the LibertyTable of a table group, the indexes that are not in
+    the group are taken from its template
+    '''
+    template = templates.get(group.arguments[0] if group.arguments else "")
+    tables = {}
+    for name in ("index_1", "index_2"):
+        if name in group.complex:
+            tables[name] = group.complex[name]
+        elif template is not None and name in template.complex:
+            tables[name] = template.complex[name]
+        else:
+            tables[name] = []
+    index_1, index_2 = [np.array([float(v) for a in tables[name]
+        for v in a.split(",") if v.strip()]) for name in ("index_1", "index_2")]
+    values = np.array([[float(v) for v in row.split(",") if v.strip()]
+        for row in group.complex.get("values", [])])
+    if len(index_2) == 0:
+        values = values.reshape(-1, 1) if values.size else values
+    variables = () if template is None else tuple(
+        template.attributes[name] for name in ("variable_1", "variable_2")
+        if name in template.attributes)
+    return LibertyTable(index_1, index_2, values, variables)
+
+class LibertyTiming:
+    '''
+    A timing arc of an output pin
+
+    Attributes
+    -----------
+    related_pin : array
+        input pins of the arc
+    timing_sense : str
+        positive_unate, negative_unate or non_unate
+    timing_type : str
+        combinational by default
+    tables : dict
+        LibertyTable of the delays (cell_rise, cell_fall) and output slews
+        (rise_transition, fall_transition) in the group
+    '''
+
+    def __init__(self, related_pin, timing_sense, timing_type, tables):
+        self.related_pin = related_pin
+        self.timing_sense = timing_sense
+        self.timing_type = timing_type
+        self.tables = tables
+
+class LibertyPower:
+    '''
+    An internal power group of a pin
+
+    Attributes
+    -----------
+    related_pin : array
+        input pins that cause the transitions, empty for input pins
+    when : str
+        condition of the energy, empty if it is always consumed
+    tables : dict
+        LibertyTable of the energy of every transition (rise_power,
+        fall_power or power)
+    '''
+
+    def __init__(self, related_pin, when, tables):
+        self.related_pin = related_pin
+        self.when = when
+        self.tables = tables
+
+class LibertyPin:
+    '''
+    A pin of a liberty cell
+
+    Attributes
+    -----------
+    name : str
+        name of the pin
+    direction : str
+        input, output or inout
+    capacitance : float
+        input capacitance
+    rise_capacitance : float
+        input capacitance of rising transitions
+    fall_capacitance : float
+        input capacitance of falling transitions
+    max_capacitance : float
+        largest load of an output, None if it is not limited
+    function : str
+        boolean function of an output, None for inputs
+    three_state : str
+        condition that disables an output, None if it is always enabled
+    timing : array
+        LibertyTiming arcs of an output
+    internal_power : array
+        LibertyPower groups of the pin
+    '''
+
+    def __init__(self, group, templates):
+        self.name = group.arguments[0]
+        self.direction = group.attributes.get("direction", "input")
+        self.capacitance = group.number("capacitance", 0.0)
+        self.rise_capacitance = group.number("rise_capacitance",
+            self.capacitance)
+        self.fall_capacitance = group.number("fall_capacitance",
+            self.capacitance)
+        self.max_capacitance = group.number("max_capacitance")
+        self.function = group.attributes.get("function")
+        self.three_state = group.attributes.get("three_state")
+        self.timing = [LibertyTiming(
+                timing.attributes.get("related_pin", "").split(),
+                timing.attributes.get("timing_sense", "non_unate"),
+                timing.attributes.get("timing_type", "combinational"),
+                {table.kind: read_table(table, templates)
+                    for table in timing.groups if table.kind in TIMING_TABLES})
+            for timing in group.find("timing")]
+        self.internal_power = [LibertyPower(
+                power.attributes.get("related_pin", "").split(),
+                power.attributes.get("when", ""),
+                {table.kind: read_table(table, templates)
+                    for table in power.groups if table.kind in POWER_TABLES})
+            for power in group.find("internal_power")]
+
+class LibertyCell:
+    '''
+    A cell of a liberty file
+
+    Attributes
+    -----------
+    name : str
+        name of the cell
+    area : float
+        area of the cell, 0 if it is unknown
+    leakage : float
+        cell_leakage_power, the average leakage power of the cell
+    leakage_states : array
+        (when, value) pairs with the leakage power of every state of the
+        inputs
+    sequential : bool
+        true if the cell stores state (ff, latch or statetable)
+    pins : dict
+        LibertyPin of every pin name
+    '''
+
+    def __init__(self, group, templates):
+        self.name = group.arguments[0]
+        self.area = group.number("area", 0.0)
+        self.leakage = group.number("cell_leakage_power", 0.0)
+        self.leakage_states = [(state.attributes.get("when", ""),
+                state.number("value", 0.0))
+            for state in group.find("leakage_power")]
+        self.sequential = any(g.kind in SEQUENTIAL_GROUPS
+            for g in group.groups)
+        pins = group.find("pin") + [pin for bus in group.find("bus")
+            for pin in bus.find("pin")]
+        self.pins = {pin.name: pin for pin in
+            (LibertyPin(p, templates) for p in pins)}
+
+    def functions(self):
+        '''
+        Returns the boolean function of every output pin, None if the cell
+        stores state or has tri-state outputs
+        '''
+        if self.sequential or any(p.three_state is not None
+            for p in self.pins.values()):
+            return None
+        return {name: pin.function for name, pin in self.pins.items()
+            if pin.function is not None}
+
+class Liberty:
+    '''
+    The contents of a liberty file that are used by the cost models
+
+    Attributes
+    -----------
+    name : str
+        name of the library
+    units : dict
+        units of the library, like time_unit or leakage_power_unit
+    voltage : float
+        nominal voltage
+    cells : dict
+        LibertyCell of every cell name
+    '''
+
+    def __init__(self, library):
+        self.name = library.arguments[0] if library.arguments else ""
+        self.units = {name: value for name, value in
+            library.attributes.items() if name.endswith("_unit")}
+        for name, arguments in library.complex.items():
+            if name.endswith("_unit"):
+                self.units[name] = "".join(arguments)
+        self.voltage = library.number("nom_voltage", 0.0)
+        templates = {template.arguments[0]: template
+            for kind in ("lu_table_template", "power_lut_template")
+            for template in library.find(kind)}
+        self.cells = {cell.name: cell for cell in
+            (LibertyCell(c, templates) for c in library.find("cell"))}
+
+    def scale(self, unit):
+        '''
+        Returns the value of a library unit in SI units, for example 1e-12
+        for a time_unit of "1ps"
+
+        Parameters
+        ----------
+        unit : str
+            name of the unit, like time_unit or capacitive_load_unit. The
+            liberty default is used if the library does not define it.
+        '''
+        value = self.units.get(unit, DEFAULT_UNITS.get(unit, "1"))
+        number, prefix = match(r'\s*([0-9.eE+-]*)\s*([a-zA-Z]*)',
+            value.replace('"', '')).groups()
+        base = next((b for b in UNIT_NAMES if prefix.lower().endswith(b)), "")
+        prefix = prefix[:len(prefix) - len(base)]
+        return float(number or 1) * UNIT_PREFIXES.get(prefix,
+            UNIT_PREFIXES.get(prefix.lower(), 1.0))
+
+
+@lru_cache(maxsize=None)
+def read_liberty(tech):
+    '''
+    Reads the liberty file of a technology
+
+    The file is parsed once, the result is stored in the on-disk cache (see
+    `cache.py`), so the next processes load it in a few milliseconds.
+
+    Parameters
+    ----------
+    tech : string
+        name of the technology library, the liberty file is
+        templates/{tech}.lib
+
+    Returns
+    -------
+    Liberty
+        the cells of the library, None if there is no liberty file
+    '''
+    lib_file = Path(__file__).parent / "templates" / f"{tech}.lib"
+    if not lib_file.exists():
+        return None
+    key = cache_key([lib_file, __file__], ["liberty"])
+    liberty = load(key)
+    if liberty is not None:
+        return liberty
+
+    with open(lib_file, 'r') as liberty_file:
+        liberty = Liberty(parse_liberty(liberty_file.read()))
+
+    store(key, liberty)
+    return liberty
+
+
+def read_liberty_functions(tech):
+    '''
+    Reads the boolean function of the output pins of every liberty cell
+
+    Parameters
+    ----------
+    tech : string
+        name of the technology library, see `read_liberty`
+
+    Returns
+    -------
+    dict
+        maps the cell names to a dictionary with the function of every output
+        pin. The dictionary is None for the cells that store state (ff, latch
+        or statetable) or have tri-state outputs.
+    '''
+    liberty = read_liberty(tech)
+    if liberty is None:
+        return {}
+    return {name: cell.functions() for name, cell in liberty.cells.items()}
+
+
+def read_liberty_areas(tech):
+    '''
+    Reads the area of every liberty cell
+
+    Parameters
+    ----------
+    tech : string
+        name of the technology library, see `read_liberty`
+
+    Returns
+    -------
+    dict
+        maps the cell names to their area, cells without an area attribute
+        are not included
+    '''
+    liberty = read_liberty(tech)
+    if liberty is None:
+        return {}
+    return {name: cell.area for name, cell in liberty.cells.items()
+        if cell.area}
+
+
+def compile_cell(cell, functions, udps):
+    '''
+    Sets the evaluator and the truth tables of a technology cell
+
+    The liberty functions are used when every output has one, otherwise the
+    verilog primitives of the cell are compiled.
+
+    Parameters
+    ----------
+    cell : TechLibCell
+        cell of the technology library
+    functions : dict
+        liberty function of every output pin, empty if the cell is not in the
+        liberty file and None for sequential cells
+    udps : dict
+        user defined primitives of the technology file
+    '''
+    inputs, outputs = tuple(cell.inputs), tuple(cell.outputs)
+    evaluate = None
+    if functions is not None:
+        cell.functions = functions
+        if outputs and all(o in functions for o in outputs):
+            try:
+                evaluate = compile_functions(inputs,
+                    tuple(functions[o] for o in outputs))
+            except ValueError:
+                evaluate = None
+    if evaluate is None and cell.primitives is not None \
+            and functions is not None:
+        primitives = tuple((g, tuple(o), tuple(i))
+            for g, o, i in cell.primitives)
+        udp_tables = tuple((g, udps[g]) for g, _, _ in primitives if g in udps)
+        try:
+            evaluate = compile_primitives(inputs, outputs, primitives,
+                udp_tables)
+        except ValueError:
+            evaluate = None
+
+    cell.evaluate = evaluate
+    if evaluate is not None:
+        cell.truth_tables = dict(zip(outputs, truth_tables(evaluate,
+            len(inputs))))
+
+
+LIBERTY_TOKENS = r'\s*(?:([A-Za-z_][\w\[\]\.]*)|([01])|(.))'
+
+@lru_cache(maxsize=None)
+def compile_functions(inputs, functions):
+    '''
+    Compiles liberty boolean functions into a python evaluator
+
+    Parameters
+    ----------
+    inputs : tuple
+        names of the input pins, in the order of the evaluator arguments
+    functions : tuple
+        liberty function of every output, in the order of the evaluator
+        results
+
+    Returns
+    -------
+    function
+        evaluator, see `TechLibCell.evaluate`
+
+    Raises
+    ------
+    ValueError
+        if a function is malformed or uses something that is not an input
+
+    Examples
+    -------
+        >>> aoi = compile_functions(("A1", "A2", "B"), ("!((A1 & A2) | B)",))
+        >>> [v & 1 for v in aoi([1, 1, 0])]
+        [0]
+    '''
+    names = {name: f"v[{k}]" for k, name in enumerate(inputs)}
+    expressions = [LibertyExpression(f, names).parse() for f in functions]
+    return build_evaluator([], expressions)
+
+
+class LibertyExpression:
+    '''
+    Recursive descent parser of the liberty boolean functions
+
+    The operators from highest to lowest precedence are the negations (!a and
+    a'), the xor (^), the and (&, * or a blank) and the or (| or +).
+    '''
+
+    def __init__(self, function, names):
+        self.function = function
+        self.names = names
+        self.tokens = []
+        for name, constant, operator in findall(LIBERTY_TOKENS, function):
+            if name or constant or operator.strip():
+                self.tokens.append(name or constant or operator)
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        '''
+        Returns the function as a python expression of bitwise operators
+        '''
+        expression = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected {self.peek()} in {self.function}")
+        return expression
+
+    def parse_or(self):
+        expression = self.parse_and()
+        while self.peek() in ('|', '+'):
+            self.take()
+            expression = f"({expression} | {self.parse_and()})"
+        return expression
+
+    def parse_and(self):
+        expression = self.parse_xor()
+        while self.peek() in ('&', '*') or self.starts_operand():
+            if not self.starts_operand():
+                self.take()
+            expression = f"({expression} & {self.parse_xor()})"
+        return expression
+
+    def parse_xor(self):
+        expression = self.parse_not()
+        while self.peek() == '^':
+            self.take()
+            expression = f"({expression} ^ {self.parse_not()})"
+        return expression
+
+    def parse_not(self):
+        if self.peek() == '!':
+            self.take()
+            return f"(~{self.parse_not()})"
+        expression = self.parse_operand()
+        while self.peek() == "'":
+            self.take()
+            expression = f"(~{expression})"
+        return expression
+
+    def parse_operand(self):
+        token = self.take()
+        if token == '(':
+            expression = self.parse_or()
+            if self.take() != ')':
+                raise ValueError(f"Unbalanced parenthesis in {self.function}")
+            return expression
+        if token == '0':
+            return "zero"
+        if token == '1':
+            return "one"
+        if token in self.names:
+            return self.names[token]
+        raise ValueError(f"Unknown {token} in {self.function}")
+
+    def starts_operand(self):
+        token = self.peek()
+        return token is not None and (token in ('(', '!', '0', '1')
+            or token in self.names)
+
+
+PRIMITIVE_OPERATORS = {
+    "and": (" & ", False), "nand": (" & ", True),
+    "or": (" | ", False), "nor": (" | ", True),
+    "xor": (" ^ ", False), "xnor": (" ^ ", True),
+    "buf": ("", False), "not": ("", True),
+}
+
+@lru_cache(maxsize=None)
+def compile_primitives(inputs, outputs, primitives, udp_tables=()):
+    '''
+    Compiles the verilog gate primitives of a cell into a python evaluator
+
+    Parameters
+    ----------
+    inputs : tuple
+        names of the input pins, in the order of the evaluator arguments
+    outputs : tuple
+        names of the output pins, in the order of the evaluator results
+    primitives : tuple
+        (gate, outputs, inputs) tuples, in any order
+    udp_tables : tuple
+        (name, truth table) of the user defined primitives the cell uses
+
+    Returns
+    -------
+    function
+        evaluator, see `TechLibCell.evaluate`
+
+    Raises
+    ------
+    ValueError
+        if the primitives have a loop or an output is never driven
+
+    Examples
+    -------
+        >>> nand = compile_primitives(("A1", "A2"), ("ZN",),
+        ...     (("not", ("ZN",), ("i_0",)), ("and", ("i_0",), ("A1", "A2"))))
+        >>> [v & 1 for v in nand([1, 1])]
+        [0]
+    '''
+    udp_tables = dict(udp_tables)
+    names = {name: f"v[{k}]" for k, name in enumerate(inputs)}
+    names.update({"0": "zero", "1": "one", "1'b0": "zero", "1'b1": "one"})
+
+    # the primitives of the technology file are not in topological order
+    lines = []
+    pending = list(primitives)
+    while pending:
+        ready = [p for p in pending if all(i in names for i in p[2])]
+        if not ready:
+            raise ValueError(f"Loop or undriven net in {primitives}")
+        for gate, gate_outputs, gate_inputs in ready:
+            pending.remove((gate, gate_outputs, gate_inputs))
+            operands = [names[i] for i in gate_inputs]
+            if gate in udp_tables:
+                expression = sum_of_minterms(udp_tables[gate], operands)
+            else:
+                operator, inverted = PRIMITIVE_OPERATORS[gate]
+                expression = f"({operator.join(operands)})"
+                if inverted:
+                    expression = f"(~{expression})"
+            net = f"n{len(lines)}"
+            lines.append(f"{net} = {expression}")
+            for o in gate_outputs:
+                names[o] = net
+
+    if any(o not in names for o in outputs):
+        raise ValueError(f"Undriven output in {primitives}")
+    return build_evaluator(lines, [names[o] for o in outputs])
+
+
+def sum_of_minterms(truth_table, operands):
+    '''
+    Returns a python expression of bitwise operators that computes a truth
+    table
+
+    Examples
+    -------
+        >>> sum_of_minterms(0b0110, ["a", "b"])
+        '((a & ~b) | (~a & b))'
+    '''
+    minterms = []
+    for row in range(2 ** len(operands)):
+        if truth_table >> row & 1:
+            literals = [o if row >> k & 1 else f"~{o}"
+                for k, o in enumerate(operands)]
+            minterms.append(f"({' & '.join(literals)})" if literals else "one")
+    if not minterms:
+        return "zero"
+    return f"({' | '.join(minterms)})"
+
+
+def build_evaluator(lines, expressions):
+    '''
+    Creates the python function that evaluates a list of expressions
+
+    Parameters
+    ----------
+    lines : array
+        assignments to compute before the results
+    expressions : array
+        python expressions of the results, they can use the arguments `v[k]`,
+        the constants `zero` and `one` and the nets assigned by `lines`
+
+    Returns
+    -------
+    function
+        evaluator, see `TechLibCell.evaluate`
+    '''
+    source = "def evaluate(v):\n" \
+        "    zero = v[0] ^ v[0] if v else ZERO\n" \
+        "    one = ~zero\n"
+    for line in lines:
+        source += f"    {line}\n"
+    source += f"    return [{', '.join(expressions)}]\n"
+    namespace = {"ZERO": np.uint64(0)}
+    exec(source, namespace)
+    return namespace["evaluate"]
+
+
+def truth_tables(evaluate, inputs):
+    '''
+    Computes the truth table of every output of an evaluator
+
+    Parameters
+    ----------
+    evaluate : function
+        evaluator, see `TechLibCell.evaluate`
+    inputs : int
+        amount of inputs of the evaluator
+
+    Returns
+    -------
+    array
+        truth table of every output, see `TechLibCell.truth_tables`
+    '''
+    rows = np.arange(2 ** inputs, dtype=np.uint64)
+    values = [(rows >> np.uint64(k)) & np.uint64(1) for k in range(inputs)]
+    tables = []
+    for result in evaluate(values):
+        bits = np.broadcast_to(np.asarray(result, dtype=np.uint64) & 1,
+            rows.shape)
+        tables.append(sum(1 << int(r) for r in np.flatnonzero(bits)))
+    return tables
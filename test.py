@@ -1,9 +1,32 @@
 
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
 import unittest
 
+import numpy as np
+import xml.etree.ElementTree as ET
+
+from cache import cache_folder, cache_key, content_key, load, store
 from circuit import Circuit
-from pruning_algorithms.axls import GetInputs, GetOutputs
+from circuiterror import BINARY_MAGIC, BINARY_VERSION, METRICS, \
+    SequentialTest, compute_error, compute_errors, map_binary_outputs, \
+    read_outputs
+from graph import CircuitGraph
+from power import PowerModel
+from pruning_algorithms.inouts import GetInputs, GetOutputs
 from pruning_algorithms.probprun import GetOneNode
+from simulator import Simulator
+from synthesis import YosysSession, area_liberty, ys_get_area, yosys_session
+from technology import Technology, compile_functions, compile_primitives, \
+    read_liberty_areas, truth_tables
+from timing import TimingModel
+from utils import DATASET_CHUNK, STRATA, get_random, random_columns, \
+    read_dataset, write_dataset
 
 RTL='circuits/brent.kung.16b/UBBKA_15_0_15_0.v'
 SAIF='circuits/brent.kung.16b/UBBKA_15_0_15_0.saif' 
@@ -12,6 +35,88 @@ CIRCUIT_INPUTS = [ "X[15]", "X[14]", "X[13]", "X[12]", "X[11]", "X[10]", "X[9]",
 "Y[15]", "Y[14]", "Y[13]", "Y[12]", "Y[11]", "Y[10]", "Y[9]", "Y[8]", "Y[7]", "Y[6]", "Y[5]", "Y[4]", "Y[3]", "Y[2]", "Y[1]", "Y[0]" ]
 CIRCUIT_OUTPUTS = [ "S[16]", "S[14]", "S[13]", "S[12]", "S[11]", "S[10]", "S[9]", "S[8]", "S[7]", "S[6]", "S[5]", "S[4]", "S[3]", "S[2]", "S[1]", "S[0]" ]
 
+# small circuits synthesized by the tests
+MUL8 = """module mul8 (a, b, p);
+  input [7:0] a;
+  input [7:0] b;
+  output [15:0] p;
+  assign p = a * b;
+endmodule
+"""
+
+# outputs of one and two 32 bit words
+WIDE = """module wide (a, b, p, w);
+  input [7:0] a;
+  input [7:0] b;
+  output [15:0] p;
+  output [32:0] w;
+  wire [8:0] s;
+  assign p = a * b;
+  assign s = a + b;
+  assign w = {~p, s, a | b};
+endmodule
+"""
+
+requires_yosys = unittest.skipUnless(shutil.which("yosys"),
+    "yosys is not installed")
+requires_iverilog = unittest.skipUnless(shutil.which("iverilog"),
+    "icarus verilog is not installed")
+
+# folder of the circuits and of the on-disk cache used by the tests
+WORKDIR = None
+PREVIOUS_CACHE = None
+
+# a full adder cell, the cell is a blackbox so it is kept by the synthesis
+FULL_ADDER = """(* blackbox *)
+module FA_X1 (A, B, CI, CO, S);
+  input A, B, CI;
+  output CO, S;
+endmodule
+
+module fa (a, b, c, s, co);
+  input a, b, c;
+  output s, co;
+  FA_X1 cell (.A(a), .B(b), .CI(c), .CO(co), .S(s));
+endmodule
+"""
+
+def setUpModule():
+    global WORKDIR, PREVIOUS_CACHE
+    WORKDIR = tempfile.mkdtemp()
+    PREVIOUS_CACHE = os.environ.get("AXLS_CACHE_DIR")
+    os.environ["AXLS_CACHE_DIR"] = os.path.join(WORKDIR, "cache")
+
+def tearDownModule():
+    if PREVIOUS_CACHE is None:
+        os.environ.pop("AXLS_CACHE_DIR", None)
+    else:
+        os.environ["AXLS_CACHE_DIR"] = PREVIOUS_CACHE
+    shutil.rmtree(WORKDIR)
+
+def build_circuit(rtl, name="mul8"):
+    '''
+    Writes a rtl module to its own folder of the test folder and returns its
+    Circuit, the synthesized circuit is cached for the next tests
+    '''
+    folder = os.path.join(WORKDIR, name)
+    os.makedirs(folder, exist_ok=True)
+    rtl_file = os.path.join(folder, f"{name}.v")
+    with open(rtl_file, "w") as file:
+        file.write(rtl)
+    return Circuit(rtl_file, "NanGate15nm")
+
+def exhaustive_dataset(circuit, filename="exhaustive.txt"):
+    '''
+    Writes every combination of the inputs of a circuit with two 8 bit
+    inputs to a dataset file and returns its path and its matrix
+    '''
+    dataset = os.path.join(circuit.output_folder, filename)
+    values = np.arange(2**16)
+    with open(dataset, "w") as file:
+        file.writelines(f"{v >> 8:02x} {v & 0xff:02x}\n" for v in values)
+    return dataset, read_dataset(dataset)
+
+@unittest.skipUnless(os.path.exists(RTL), f"{RTL} is missing, see the README")
 class PoisonoakTest(unittest.TestCase):
 
     def test_circuit_inputs(self):
@@ -33,6 +138,1167 @@ class PoisonoakTest(unittest.TestCase):
         # print(our_circuit.get_circuit_xml())
         # our_circuit.show()    
 
+@requires_yosys
+class SimulatorTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.circuit = build_circuit(MUL8)
+        cls.dataset, cls.data = exhaustive_dataset(cls.circuit)
+
+    def test_native_product(self):
+        output = self.circuit.simulate_native(self.dataset)
+        expected = self.data[:, 0] * self.data[:, 1]
+        self.assertEqual(output.shape, (2**16, 1))
+        np.testing.assert_array_equal(output[:, 0], expected)
+
+    def test_chunks_and_samples(self):
+        full = self.circuit.simulate_native(self.dataset)
+        # chunks of 3 words, the last one incomplete
+        chunked = Simulator(self.circuit, chunk_words=3).run(self.data[:1000])
+        np.testing.assert_array_equal(chunked, full[:1000])
+        np.testing.assert_array_equal(
+            self.circuit.simulate_native(self.dataset, samples=100),
+            full[:100])
+
+    def test_deleted_nodes(self):
+        exact = self.circuit.simulate_native(self.dataset)
+        node = next(iter(self.circuit.get_circuit_nodes()))
+        self.circuit.delete(node)
+        try:
+            approximate = self.circuit.simulate_native(self.dataset)
+        finally:
+            self.circuit.undodelete(node)
+        self.assertFalse((approximate == exact).all())
+        np.testing.assert_array_equal(
+            self.circuit.simulate_native(self.dataset), exact)
+
+@requires_yosys
+class IncrementalSimulationTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.circuit = build_circuit(MUL8)
+        cls.dataset, _ = exhaustive_dataset(cls.circuit)
+
+    def test_matches_full_simulation(self):
+        circuit = self.circuit
+        nodes = list(circuit.get_circuit_nodes())
+        rng = np.random.default_rng(5)
+        simulation = circuit.incremental_simulation(self.dataset, samples=4096)
+        deleted = []
+        try:
+            for _ in range(30):
+                if deleted and rng.random() < 0.4:
+                    circuit.undodelete(deleted.pop(rng.integers(len(deleted))))
+                else:
+                    node = nodes[rng.integers(len(nodes))]
+                    if node not in deleted:
+                        circuit.delete(node)
+                        deleted.append(node)
+                np.testing.assert_array_equal(simulation.results,
+                    circuit.simulate_native(self.dataset, samples=4096))
+        finally:
+            simulation.close()
+            for node in deleted:
+                circuit.undodelete(node)
+
+    def test_close(self):
+        simulation = self.circuit.incremental_simulation(self.dataset,
+            samples=64)
+        results = simulation.results.copy()
+        simulation.close()
+        node = next(iter(self.circuit.get_circuit_nodes()))
+        self.circuit.delete(node)
+        self.circuit.undodelete(node)
+        np.testing.assert_array_equal(simulation.results, results)
+        self.assertNotIn(simulation.update, self.circuit.observers)
+
+@requires_yosys
+class NodeErrorsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.circuit = build_circuit(MUL8)
+        cls.dataset, _ = exhaustive_dataset(cls.circuit)
+        cls.exact = cls.circuit.simulate_native(cls.dataset)
+
+    def deletion_errors(self, node):
+        self.circuit.delete(node)
+        try:
+            return compute_errors(self.exact,
+                self.circuit.simulate_native(self.dataset),
+                ["med", "wce", "er"])
+        finally:
+            self.circuit.undodelete(node)
+
+    def test_matches_deletions(self):
+        table = self.circuit.get_node_errors(self.dataset, self.exact)
+        nodes = sorted(table)
+        self.assertEqual(len(nodes), len(list(
+            self.circuit.get_circuit_nodes())))
+        for node in nodes[::15]:
+            errors = self.deletion_errors(node)
+            self.assertAlmostEqual(table[node]["med"], errors["med"], 3, node)
+            self.assertEqual(table[node]["wce"], errors["wce"], node)
+            self.assertAlmostEqual(table[node]["er"], errors["er"], 3, node)
+
+    def test_best_constant(self):
+        table = self.circuit.get_node_errors(self.dataset, constant="best")
+        for constant in (0, 1):
+            fixed = self.circuit.get_node_errors(self.dataset,
+                constant=constant)
+            for node, row in table.items():
+                self.assertLessEqual(row["med"], fixed[node]["med"])
+
+@requires_yosys
+class EvaluateManyTest(unittest.TestCase):
+    '''
+    Checks that `Circuit.evaluate_many` returns the error of every candidate
+    in order, with and without a pool of processes
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.circuit = build_circuit(MUL8)
+        cls.dataset, _ = exhaustive_dataset(cls.circuit)
+        cls.exact = cls.circuit.simulate_native(cls.dataset)
+        nodes = sorted(cls.circuit.get_circuit_nodes())
+        # candidates of different errors, the last one repeats the first
+        cls.deletion_sets = [nodes[-3:], [], nodes[10:40:7], nodes[:1],
+            nodes[5:50:9], nodes[-3:]]
+        cls.expected = [cls.circuit.evaluate_deletions(d, "med", cls.dataset,
+            cls.exact) for d in cls.deletion_sets]
+
+    def test_order(self):
+        self.assertGreater(len(set(self.expected)), 3)
+        errors = self.circuit.evaluate_many(self.deletion_sets, "med",
+            self.dataset, self.exact, workers=1)
+        self.assertEqual(errors, self.expected)
+        self.assertEqual(self.circuit.get_nodes_to_delete(), [])
+
+    def test_parallel(self):
+        serial = self.circuit.evaluate_many(self.deletion_sets, "wce",
+            self.dataset, self.exact, workers=1)
+        parallel = self.circuit.evaluate_many(self.deletion_sets, "wce",
+            self.dataset, self.exact, workers=2)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(self.circuit.get_nodes_to_delete(), [])
+
+@requires_yosys
+class MultipleOutputTest(unittest.TestCase):
+    '''
+    Checks that every output of a deleted multiple output cell takes the
+    constant of its own probabilities
+    '''
+
+    def setUp(self):
+        self.circuit = build_circuit(FULL_ADDER, "fa")
+        self.node = self.circuit.get_circuit_nodes()[0]
+        self.element = self.circuit.graph.elements[0]
+        carry, total = self.element.findall("output")
+        carry.attrib.update(t0="10", t1="90")
+        total.attrib.update(t0="90", t1="10")
+
+    def test_constants(self):
+        self.assertEqual(self.circuit.node_to_constant(self.element), 1)
+        self.assertEqual(self.circuit.node_constants(self.element), [1, 0])
+        self.circuit.delete(self.node)
+        deleted, assigned = self.circuit.get_wires_to_be_deleted()
+        self.assertEqual(deleted, [])
+        self.assertEqual(assigned, {"co": 1, "s": 0})
+
+    def test_simulation(self):
+        dataset = os.path.join(self.circuit.output_folder, "fa.txt")
+        with open(dataset, "w") as file:
+            file.writelines(f"{v >> 2} {v >> 1 & 1} {v & 1}\n"
+                for v in range(8))
+        self.circuit.delete(self.node)
+        # the columns of the outputs are in the order of write_tb, co and s
+        np.testing.assert_array_equal(self.circuit.simulate_native(dataset),
+            [[1, 0]] * 8)
+
+    def test_mask(self):
+        self.circuit.delete(self.node)
+        mask = self.circuit.write_mask(os.path.join(
+            self.circuit.output_folder, "mask.txt"))
+        with open(mask) as file:
+            enable, value = file.read().split()
+        self.assertEqual(enable, "11")
+        # the most significant bit is the last output, the sum
+        self.assertEqual(value, "01")
+
+@requires_yosys
+@requires_iverilog
+class IcarusTest(unittest.TestCase):
+    '''
+    Runs the testbenches written by `Circuit.write_tb` and compares them with
+    the native simulation
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.circuit = build_circuit(MUL8)
+        cls.folder = cls.circuit.output_folder
+        cls.dataset = os.path.join(cls.folder, "random.txt")
+        cls.circuit.generate_dataset(cls.dataset, 2000, seed=3)
+        cls.exact = cls.circuit.simulate_native(cls.dataset)
+        cls.nodes = sorted(cls.circuit.get_circuit_nodes())
+
+    def native(self, deletion_set=()):
+        '''
+        Returns the native outputs of the circuit with some nodes deleted
+        '''
+        added = self.circuit.delete_extra(deletion_set)
+        try:
+            return read_outputs(self.circuit.simulate_native(self.dataset))
+        finally:
+            for n in added:
+                self.circuit.undodelete(n)
+
+    def test_testbench(self):
+        testbench = os.path.join(self.folder, "tb.v")
+        self.circuit.write_tb(testbench, self.dataset, progress=0)
+        output = self.circuit.run_testbench(testbench)
+        np.testing.assert_array_equal(read_outputs(output), self.native())
+
+    def test_masked(self):
+        testbench = os.path.join(self.folder, "tb_masked.v")
+        self.circuit.write_tb(testbench, self.dataset, progress=0)
+        workdir = tempfile.mkdtemp(dir=self.folder)
+        executable = self.circuit.compile_masked(testbench, workdir)
+        self.assertEqual(os.path.dirname(executable), workdir)
+        output = os.path.join(self.folder, "masked.txt")
+        for deletion_set in ([], self.nodes[:1], self.nodes[10:40:7]):
+            added = self.circuit.delete_extra(deletion_set)
+            try:
+                self.circuit.simulate_masked(output)
+            finally:
+                for n in added:
+                    self.circuit.undodelete(n)
+            np.testing.assert_array_equal(read_outputs(output),
+                self.native(deletion_set))
+
+    def test_masked_method(self):
+        deletion_sets = [[], self.nodes[:1], self.nodes[10:40:7]]
+        expected = [self.circuit.evaluate_deletions(d, "med", self.dataset,
+            self.exact) for d in deletion_sets]
+        errors = [self.circuit.evaluate_deletions(d, "med", self.dataset,
+            self.exact, method="masked") for d in deletion_sets]
+        self.assertEqual(errors, expected)
+        # every candidate reuses the executable of the first one
+        executable = self.circuit.masked_executable
+        self.circuit.evaluate_deletions(deletion_sets[2], "med",
+            self.dataset, self.exact, method="masked")
+        self.assertEqual(self.circuit.masked_executable, executable)
+        self.assertEqual(self.circuit.evaluate_many(deletion_sets, "med",
+            self.dataset, self.exact, workers=2, method="masked"), expected)
+
+    def test_binary_output(self):
+        circuit = build_circuit(WIDE, "wide")
+        dataset = os.path.join(circuit.output_folder, "random.txt")
+        circuit.generate_dataset(dataset, 500, seed=4)
+        native = read_outputs(circuit.simulate_native(dataset))
+        testbench = os.path.join(circuit.output_folder, "tb_binary.v")
+        circuit.write_tb(testbench, dataset, binary=True, progress=0)
+        output = circuit.run_testbench(testbench)
+        with open(output, "rb") as file:
+            self.assertEqual(struct.unpack("<5I", file.read(20)),
+                (BINARY_MAGIC, BINARY_VERSION, 2, 2, 1))
+        self.assertEqual(os.path.getsize(output), 20 + 500 * 12)
+        np.testing.assert_array_equal(read_outputs(output), native)
+
+    def test_wce_early_exit(self):
+        deletion_set = self.nodes[10:40:7]
+        exact = read_outputs(self.exact)
+        distances = np.abs(exact.astype(np.int64)
+            - self.native(deletion_set).astype(np.int64))
+        max_error = int(distances.max()) // 2
+        first = int(np.argmax(distances > max_error))
+        exact_file = os.path.join(self.folder, "exact.txt")
+        np.savetxt(exact_file, exact, fmt="%d")
+        testbench = os.path.join(self.folder, "tb_wce.v")
+        self.circuit.write_tb(testbench, self.dataset, progress=0,
+            exact_output=exact_file, max_error=max_error)
+        added = self.circuit.delete_extra(deletion_set)
+        try:
+            output = self.circuit.run_testbench(testbench)
+        finally:
+            for n in added:
+                self.circuit.undodelete(n)
+        # the output ends with the first vector above the bound
+        np.testing.assert_array_equal(read_outputs(output),
+            self.native(deletion_set)[:first + 1])
+        self.assertEqual(self.circuit.evaluate_deletions(deletion_set, "wce",
+            self.dataset, self.exact, method="iverilog",
+            max_error=max_error), int(distances[:first + 1].max()))
+        self.assertGreater(self.circuit.evaluate_deletions(deletion_set,
+            "wce", self.dataset, self.exact, max_error=max_error), max_error)
+        # the progress of the testbench ends at the same vector
+        self.circuit.write_tb(testbench, self.dataset, progress=1,
+            exact_output=exact_file, max_error=max_error)
+        added = self.circuit.delete_extra(deletion_set)
+        try:
+            executable = self.circuit.compile_testbench(testbench,
+                os.path.join(self.folder, "tb_wce"), self.folder)
+        finally:
+            for n in added:
+                self.circuit.undodelete(n)
+        try:
+            result = subprocess.run([executable], cwd=self.folder,
+                capture_output=True, text=True, check=True)
+        finally:
+            os.remove(executable)
+        progress = re.findall(r"Progress:\s*(\d+)/", result.stdout)
+        self.assertEqual(int(progress[-1]), first + 1)
+
+    def test_miter(self):
+        exact_netlist = self.circuit.exact_netlist("exact")
+        testbench = os.path.join(self.folder, "tb_miter.v")
+        self.circuit.write_tb(testbench, self.dataset, progress=0, miter=True)
+        for deletion_set in ([], self.nodes[10:40:7]):
+            added = self.circuit.delete_extra(deletion_set)
+            try:
+                errors = self.circuit.simulate_miter_and_compute_error(
+                    testbench, list(METRICS), exact_netlist)
+            finally:
+                for n in added:
+                    self.circuit.undodelete(n)
+            expected = compute_errors(self.exact, self.native(deletion_set))
+            for metric in METRICS:
+                self.assertAlmostEqual(errors[metric], expected[metric],
+                    delta=1e-3, msg=metric)
+
+    def test_variants(self):
+        deletion_sets = [[], self.nodes[:1], self.nodes[10:40:7],
+            self.nodes[5:60:11]]
+        exact_netlist = self.circuit.exact_netlist("exact")
+        for metric in ("med", "wce"):
+            expected = [self.circuit.evaluate_deletions(d, metric,
+                self.dataset, self.exact) for d in deletion_sets]
+            self.assertEqual(self.circuit.evaluate_variants(deletion_sets,
+                metric, self.dataset, self.exact), expected)
+            self.assertEqual(self.circuit.evaluate_variants(deletion_sets,
+                metric, self.dataset, exact_netlist, miter=True), expected)
+
+
+class BinaryOutputTest(unittest.TestCase):
+    '''
+    Reads binary output files built with the layout documented in
+    `circuiterror.map_binary_outputs`
+    '''
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, "output.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, words, records, magic=BINARY_MAGIC, tail=b""):
+        header = [magic, BINARY_VERSION, len(words)] + words
+        with open(self.filename, "wb") as file:
+            file.write(struct.pack(f"<{len(header)}I", *header))
+            for record in records:
+                file.write(struct.pack(f"<{len(record)}I", *record))
+            file.write(tail)
+
+    def test_words(self):
+        # a 16 bit output and a 40 bit output, least significant word first
+        self.write([1, 2], [[0xBEEF, 0x89ABCDEF, 0x45],
+            [7, 0xFFFFFFFF, 0xFF]], tail=b"\0\0")
+        self.assertEqual(read_outputs(self.filename).tolist(),
+            [0xBEEF, 0x4589ABCDEF, 7, 0xFFFFFFFFFF])
+        self.assertEqual(compute_errors(self.filename,
+            [0xBEEF, 0x4589ABCDEF, 7, 0xFFFFFFFFFF])["er"], 0)
+
+    def test_wide_outputs(self):
+        self.write([3], [[1, 2, 3]])
+        self.assertEqual(read_outputs(self.filename).tolist(),
+            [1 + (2 << 32) + (3 << 64)])
+
+    def test_bad_header(self):
+        self.write([1], [[1]], magic=0x12345678)
+        with self.assertRaises(ValueError):
+            map_binary_outputs(self.filename)
+        self.write([1], [[1]])
+        with open(self.filename, "r+b") as file:
+            file.seek(4)
+            file.write(struct.pack("<I", BINARY_VERSION + 1))
+        with self.assertRaises(ValueError):
+            map_binary_outputs(self.filename)
+
+class ErrorMetricsTest(unittest.TestCase):
+    '''
+    Compares `compute_errors` with the definitions of the metrics written in
+    plain python
+    '''
+
+    def reference(self, original, approximate):
+        distances = [abs(a - b) for a, b in zip(original, approximate)]
+        relative = [d / a if a else 0.0 for d, a in zip(distances, original)]
+        n = len(original)
+        return {
+            "er": round(sum(d != 0 for d in distances) / n, 3),
+            "hd": round(sum(bin(a ^ b).count("1")
+                for a, b in zip(original, approximate)) / n, 3),
+            "med": round(sum(distances) / n, 3),
+            "wce": max(distances),
+            "wcre": round(max(relative), 3),
+            "mred": round(sum(relative) / n, 3),
+            "msed": round(sum(d * d for d in distances) / n, 3),
+        }
+
+    def assertErrors(self, errors, expected):
+        for metric in METRICS:
+            self.assertAlmostEqual(errors[metric], expected[metric],
+                places=3, msg=metric)
+
+    def test_metrics(self):
+        generator = np.random.default_rng(5)
+        original = generator.integers(0, 2**16, 3000)
+        approximate = original ^ generator.integers(0, 2**16, 3000) \
+            * (generator.random(3000) < 0.3)
+        expected = self.reference(original.tolist(), approximate.tolist())
+        self.assertErrors(compute_errors(original, approximate), expected)
+        # the chunks do not change the result
+        self.assertErrors(compute_errors(original, approximate,
+            chunk_size=7), expected)
+
+        folder = tempfile.mkdtemp(dir=WORKDIR)
+        try:
+            files = [os.path.join(folder, f"{name}.txt")
+                for name in ("original", "approximate")]
+            for filename, values in zip(files, (original, approximate)):
+                np.savetxt(filename, values, fmt="%d")
+            self.assertErrors(compute_errors(*files), expected)
+            self.assertEqual(compute_error("med", *files), expected["med"])
+        finally:
+            shutil.rmtree(folder)
+
+    def test_wide_values(self):
+        original = [2**70 + 5, 3, 2**65]
+        approximate = [5, 3, 2**65 + 2**64]
+        self.assertErrors(compute_errors(original, approximate),
+            self.reference(original, approximate))
+
+    def test_partial(self):
+        with self.assertRaises(AssertionError):
+            compute_errors([4, 0, 10], [5, 0])
+        self.assertEqual(compute_errors([4, 0, 10], [5, 0], ["wce", "er"],
+            partial=True), {"wce": 1, "er": 0.5})
+        with self.assertRaises(ValueError):
+            compute_errors([1], [1], ["mae"])
+
+class SequentialTestTest(unittest.TestCase):
+
+    def test_error_rate(self):
+        # about 3.84 / threshold error free vectors accept the circuit
+        test = SequentialTest("er", 0.01, min_samples=1)
+        exact = np.zeros((300, 1), dtype=np.uint64)
+        test.update(exact, exact)
+        self.assertIsNone(test.decision())
+        test.update(exact, exact)
+        self.assertTrue(test.decision())
+        test = SequentialTest("er", 0.01, min_samples=1)
+        test.update(exact, exact + 1)
+        self.assertFalse(test.decision())
+
+    def test_wide_outputs(self):
+        # the mean metrics decide with 32 bit outputs too
+        generator = np.random.default_rng(9)
+        exact = generator.integers(0, 2**32, (1024, 1), dtype=np.uint64)
+        for metric, noise, decision in (("med", 10, True),
+            ("med", 10**6, False), ("msed", 10, True), ("mred", 10, True)):
+            test = SequentialTest(metric, 100, width=32)
+            test.update(exact, exact + generator.integers(0, noise,
+                exact.shape, dtype=np.uint64))
+            self.assertEqual(test.decision(), decision, metric)
+
+    def test_min_samples(self):
+        test = SequentialTest("med", 50, width=16)
+        exact = np.zeros((512, 1), dtype=np.uint64)
+        test.update(exact, exact)
+        self.assertIsNone(test.decision())
+        test.update(exact, exact)
+        self.assertTrue(test.decision())
+        self.assertEqual(test.interval, 0)
+        self.assertEqual(SequentialTest("wce", 5).bounds, (0, 0))
+        with self.assertRaises(ValueError):
+            SequentialTest("mae", 5)
+
+@requires_yosys
+class AdaptiveTest(unittest.TestCase):
+    '''
+    Checks that `Circuit.evaluate_adaptive` decides candidates far from the
+    threshold with a small part of the dataset
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.circuit = build_circuit(MUL8)
+        cls.dataset = os.path.join(cls.circuit.output_folder, "adaptive.txt")
+        cls.circuit.generate_dataset(cls.dataset, 2**16, seed=10)
+        cls.data = read_dataset(cls.dataset)
+        cls.exact = cls.circuit.simulate_native(cls.dataset)
+        cls.nodes = sorted(cls.circuit.get_circuit_nodes())
+
+    def test_early_decisions(self):
+        # med 0, 0.4, 22 and 970 over every input
+        for deletion_set, accepted in (([], True), (self.nodes[:1], True),
+            (self.nodes[10:40:7], True), (self.nodes[-3:], False)):
+            result = self.circuit.evaluate_adaptive(deletion_set, "med",
+                self.data, self.exact, threshold=50, min_samples=1024)
+            self.assertEqual(result["accepted"], accepted)
+            self.assertLessEqual(result["samples"], 4096)
+            error = self.circuit.evaluate_deletions(deletion_set, "med",
+                self.dataset, self.exact)
+            self.assertLessEqual(abs(result["error"] - error),
+                5 * result["interval"] + 1)
+
+    def test_close_to_threshold(self):
+        # a candidate at the threshold needs the whole dataset
+        error = self.circuit.evaluate_deletions(self.nodes[10:40:7], "med",
+            self.dataset, self.exact)
+        result = self.circuit.evaluate_adaptive(self.nodes[10:40:7], "med",
+            self.data, self.exact, threshold=error + 0.001)
+        self.assertEqual(result["samples"], len(self.data))
+        self.assertTrue(result["accepted"])
+
+class DatasetTest(unittest.TestCase):
+    '''
+    Checks the random datasets of `utils.write_dataset`, every column of a
+    seeded dataset is reproducible on its own
+    '''
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(dir=WORKDIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_get_random(self):
+        data = get_random(8, samples=1000, rng=np.random.default_rng(1),
+            low_limit=10, high_limit=20)
+        self.assertEqual(data.dtype, np.uint64)
+        self.assertEqual(set(data.tolist()), set(range(10, 20)))
+        np.testing.assert_array_equal(get_random(8, samples=1000,
+            rng=np.random.default_rng(1), low_limit=10, high_limit=20), data)
+        # wider inputs are python integers
+        wide = get_random(70, samples=100, rng=np.random.default_rng(1))
+        self.assertEqual(wide.dtype, object)
+        self.assertTrue(all(0 <= v < 2**70 for v in wide))
+        self.assertGreater(max(wide), 2**64)
+        # the first gaussian samples do not depend on the amount of samples
+        normal = get_random(8, "normal", 10, np.random.default_rng(1), std=20)
+        np.testing.assert_array_equal(get_random(8, "normal", 5,
+            np.random.default_rng(1), std=20), normal[:5])
+        self.assertTrue((normal < 256).all())
+        with self.assertRaises(ValueError):
+            get_random(8, "poisson")
+        with self.assertRaises(ValueError):
+            get_random(8, low_limit=20, high_limit=20)
+
+    def test_columns(self):
+        # a column only depends on the seed and its index
+        first = np.concatenate([c[0] for c in random_columns([8, 4], 100,
+            seed=3)])
+        second = np.concatenate([c[0] for c in random_columns([8, 12], 100,
+            seed=3)])
+        np.testing.assert_array_equal(first, second)
+        other = np.concatenate([c[0] for c in random_columns([8, 4], 100,
+            seed=4)])
+        self.assertFalse((first == other).all())
+
+    def test_write_dataset(self):
+        dataset = os.path.join(self.folder, "dataset.txt")
+        write_dataset(dataset, [8, 3], 10, seed=5)
+        with open(dataset) as file:
+            lines = file.read().splitlines()
+        self.assertEqual(len(lines), 10)
+        # every number is padded to the digits of its column
+        self.assertTrue(all(len(a) == 2 and len(b) == 1
+            for a, b in map(str.split, lines)))
+        values = read_dataset(dataset)
+        self.assertTrue((values[:, 1] < 8).all())
+
+        again = os.path.join(self.folder, "again.txt")
+        write_dataset(again, [8, 3], 10, seed=5)
+        with open(dataset) as file, open(again) as other:
+            self.assertEqual(file.read(), other.read())
+        write_dataset(again, [8, 3], 10, seed=5, format="d")
+        np.testing.assert_array_equal(read_dataset(again, 10), values)
+        np.testing.assert_array_equal(read_dataset(dataset, max_lines=4),
+            values[:4])
+        # wider numbers are python integers
+        write_dataset(again, [70], 10, seed=5)
+        self.assertEqual(read_dataset(again).dtype, object)
+
+    def test_shards(self):
+        # shards of a dataset are the rows of the whole dataset, also across
+        # the independent streams of DATASET_CHUNK rows
+        samples = DATASET_CHUNK + 100
+        dataset = os.path.join(self.folder, "dataset.txt")
+        write_dataset(dataset, [8, 8], samples, seed=7)
+        start = DATASET_CHUNK - 50
+        shards = []
+        for first, rows in ((0, start), (start, samples - start)):
+            shard = os.path.join(self.folder, f"shard{first}.txt")
+            write_dataset(shard, [8, 8], rows, seed=7, start=first)
+            with open(shard) as file:
+                shards.append(file.read())
+        with open(dataset) as file:
+            self.assertEqual(file.read(), "".join(shards))
+
+class LowDiscrepancyTest(unittest.TestCase):
+    '''
+    Checks that the low-discrepancy datasets of `utils.random_columns` cover
+    the input space evenly
+    '''
+
+    def columns(self, widths, samples, distribution, **kwargs):
+        return np.concatenate([np.column_stack(columns) for columns in
+            random_columns(widths, samples, distribution, **kwargs)])
+
+    def test_sobol(self):
+        # every cell of the 16x16 grid has one of the first 256 points
+        data = self.columns([4, 4], 256, "sobol", seed=1)
+        self.assertEqual(len(set(map(tuple, data.tolist()))), 256)
+        # the scrambling depends on the seed
+        self.assertFalse((self.columns([4, 4], 256, "sobol", seed=2)
+            == data).all())
+        data = self.columns([8], 256, "sobol", seed=1, low_limit=10,
+            high_limit=20)
+        self.assertEqual(set(data[:, 0].tolist()), set(range(10, 20)))
+        with self.assertRaises(ValueError):
+            self.columns([1] * 22, 4, "sobol")
+
+    def test_halton(self):
+        # the first column is a shifted van der Corput sequence
+        data = self.columns([8, 8], 256, "halton", seed=1)
+        self.assertEqual(len(set(data[:, 0].tolist())), 256)
+        self.assertTrue((data < 256).all())
+
+    def test_stratified(self):
+        # in a block of STRATA rows the top bits take every value once
+        data = self.columns([16, 10], 2 * STRATA, "stratified", seed=1)
+        for block in (data[:STRATA], data[STRATA:]):
+            self.assertEqual(len(set((block[:, 0] >> np.uint64(6)).tolist())),
+                STRATA)
+            self.assertEqual(len(set(block[:, 1].tolist())), STRATA)
+
+    def test_shards(self):
+        for distribution in ("sobol", "halton", "stratified"):
+            data = self.columns([8, 8], 300, distribution, seed=2)
+            np.testing.assert_array_equal(self.columns([8, 8], 200,
+                distribution, seed=2, start=100), data[100:])
+
+@requires_yosys
+class RequiredSamplesTest(unittest.TestCase):
+    '''
+    Checks the pilot estimates of `Circuit.required_samples`
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.circuit = build_circuit(MUL8)
+        cls.dataset, _ = exhaustive_dataset(cls.circuit)
+        cls.exact = cls.circuit.simulate_native(cls.dataset)
+        cls.deletion_set = sorted(cls.circuit.get_circuit_nodes())[10:40:7]
+
+    def required_samples(self, distribution, **kwargs):
+        for node in self.deletion_set:
+            self.circuit.delete(node)
+        try:
+            return self.circuit.required_samples("med", distribution, seed=1,
+                **kwargs)
+        finally:
+            for node in self.deletion_set:
+                self.circuit.undodelete(node)
+
+    def test_estimates(self):
+        # med 22 over every input
+        error = self.circuit.evaluate_deletions(self.deletion_set, "med",
+            self.dataset, self.exact)
+        for distribution in ("uniform", "sobol", "halton", "stratified"):
+            result = self.required_samples(distribution)
+            self.assertEqual(self.required_samples(distribution), result)
+            self.assertGreater(result["samples"], 0)
+            self.assertLess(abs(result["error"] - error),
+                3 * result["interval"] + 0.1, distribution)
+        self.assertEqual(self.required_samples("uniform")["rate"], 0.5)
+        with self.assertRaises(ValueError):
+            self.required_samples("sobol", replicates=1)
+
+    def test_exact(self):
+        # without deletions every pilot error is 0
+        result = self.circuit.required_samples("med", seed=1, pilot=1024)
+        self.assertEqual(result["error"], 0)
+        self.assertEqual(result["samples"], 1024)
+
+class GraphTest(unittest.TestCase):
+
+    # y = !a & b through the wire t, which is an alias of b
+    TREE = """<root>
+        <node name="AND2_X1" var="_2_"><input name="A1" wire="n" />
+            <input name="A2" wire="t" /><output name="Z" wire="y" /></node>
+        <node name="INV_X1" var="_1_"><input name="A" wire="a" />
+            <output name="ZN" wire="n" /></node>
+        <node name="INV_X1" var="_3_"><input name="A" wire="z" />
+            <output name="ZN" wire="k" /></node>
+        <circuitinputs><input var="a" /><input var="b" /></circuitinputs>
+        <circuitoutputs><output var="y" /><output var="k" /></circuitoutputs>
+        <assignments><assign var="t" val="b" /><assign var="z" val="1'b0" />
+        </assignments></root>"""
+
+    def setUp(self):
+        self.graph = CircuitGraph(ET.fromstring(self.TREE))
+
+    def test_connectivity(self):
+        graph = self.graph
+        wire = graph.wire_ids
+        self.assertEqual(graph.node_vars, ["_2_", "_1_", "_3_"])
+        self.assertEqual(graph.driver[wire["n"]], 1)
+        self.assertEqual(graph.driver[wire["a"]], -1)
+        self.assertEqual(graph.fanout(wire["n"]).tolist(), [0])
+        self.assertEqual(graph.children(1).tolist(), [0])
+        self.assertEqual(graph.parents(0).tolist(), [1])
+        self.assertEqual([graph.wire_names[w] for w in graph.inputs(0)],
+            ["n", "t"])
+
+    def test_assignments(self):
+        graph = self.graph
+        wire = graph.wire_ids
+        self.assertEqual(graph.source[wire["t"]], wire["b"])
+        self.assertEqual(graph.constant_wires, {wire["z"]: 0})
+
+    def test_levels(self):
+        self.assertEqual(self.graph.levels().tolist(), [1, 0, 0])
+        loop = ET.fromstring("""<root>
+            <node name="INV_X1" var="_1_"><input name="A" wire="q" />
+                <output name="ZN" wire="p" /></node>
+            <node name="INV_X1" var="_2_"><input name="A" wire="p" />
+                <output name="ZN" wire="q" /></node></root>""")
+        with self.assertRaises(ValueError):
+            CircuitGraph(loop).levels()
+
+    def test_deleted(self):
+        self.graph.node("_3_").set("delete", "yes")
+        self.assertEqual(self.graph.deleted().tolist(), [False, False, True])
+        self.assertTrue(self.graph.is_deleted(2))
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(dir=WORKDIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_keys(self):
+        first = os.path.join(self.folder, "first.txt")
+        with open(first, "w") as file:
+            file.write("1 2 3\n")
+        key = cache_key([first], ["mul8"])
+        self.assertEqual(cache_key([first], ["mul8"]), key)
+        self.assertNotEqual(cache_key([first], ["mul16"]), key)
+        # a missing file is hashed as empty
+        missing = os.path.join(self.folder, "missing.txt")
+        self.assertEqual(cache_key([missing]), cache_key([os.devnull]))
+        self.assertNotEqual(cache_key([missing]), cache_key([first]))
+
+        file_key = content_key(first)
+        with open(first, "a") as file:
+            file.write("4\n")
+        self.assertNotEqual(content_key(first), file_key)
+        self.assertEqual(content_key(np.arange(4)), content_key(np.arange(4)))
+        self.assertNotEqual(content_key(np.arange(4)),
+            content_key(np.arange(4, dtype=np.uint8)))
+
+    def test_load_and_store(self):
+        key = cache_key(values=["test_load_and_store"])
+        self.assertIsNone(load(key))
+        store(key, {"error": 1.5, "outputs": [1, 2]})
+        self.assertEqual(load(key), {"error": 1.5, "outputs": [1, 2]})
+        # a broken entry is a miss
+        with open(os.path.join(cache_folder(), f"{key}.pickle"), "wb") as file:
+            file.write(b"broken")
+        self.assertIsNone(load(key))
+        # an object that can not be pickled leaves no temporary file
+        key = cache_key(values=["test_unpicklable"])
+        with self.assertRaises(TypeError):
+            store(key, (n for n in range(3)))
+        self.assertIsNone(load(key))
+        self.assertEqual([f for f in os.listdir(cache_folder())
+            if f.endswith(".tmp")], [])
+
+    @requires_yosys
+    def test_synthesis(self):
+        circuit = build_circuit(MUL8)
+        modified = os.stat(circuit.netl_file).st_mtime_ns
+        cached = build_circuit(MUL8)
+        self.assertEqual(cached.netl_file, circuit.netl_file)
+        self.assertEqual(os.stat(cached.netl_file).st_mtime_ns, modified)
+        self.assertEqual(sorted(cached.get_circuit_nodes()),
+            sorted(circuit.get_circuit_nodes()))
+        # a changed netlist file is written again from the cache
+        with open(cached.netl_file, "w") as file:
+            file.write("// changed\n")
+        cached = build_circuit(MUL8)
+        with open(cached.netl_file) as file:
+            self.assertNotEqual(file.read(), "// changed\n")
+
+    @requires_yosys
+    def test_result_cache(self):
+        circuit = build_circuit(MUL8)
+        circuit.result_cache = True
+        nodes = sorted(circuit.get_circuit_nodes())
+        exact = circuit.structural_hash()
+        for node in nodes[10:60:5]:
+            circuit.delete(node)
+        deleted = circuit.structural_hash()
+        self.assertNotEqual(deleted, exact)
+        area = circuit.get_area("yosys")
+        self.assertEqual(circuit.get_area("yosys"), area)
+        # simplify keeps the logic but not the cells, the yosys area is
+        # computed again for the new netlist
+        circuit.simplify()
+        self.assertEqual(circuit.structural_hash(), deleted)
+        self.assertAlmostEqual(circuit.get_area("yosys"),
+            circuit.get_area(), places=4)
+        self.assertLess(circuit.get_area("yosys"), area)
+
+@requires_yosys
+class AreaTest(unittest.TestCase):
+
+    def test_native_matches_yosys(self):
+        circuit = build_circuit(MUL8)
+        nodes = sorted(circuit.get_circuit_nodes())
+        self.assertAlmostEqual(circuit.get_area(),
+            circuit.get_area("yosys"), places=4)
+        added = circuit.delete_extra(nodes[10:60:5])
+        try:
+            self.assertAlmostEqual(circuit.get_area(),
+                circuit.get_area("yosys"), places=4)
+        finally:
+            for n in added:
+                circuit.undodelete(n)
+        with self.assertRaises(ValueError):
+            circuit.get_area("abc")
+
+    def test_methods(self):
+        circuit = build_circuit(MUL8)
+        for method in ("native", "yosys", "resynth"):
+            self.assertIsInstance(circuit.get_area(method), float)
+
+@requires_yosys
+class SynthesisTest(unittest.TestCase):
+    '''
+    Checks the yosys session and the scripts that run in it
+    '''
+
+    def test_area_liberty(self):
+        filename = area_liberty("NanGate15nm")
+        self.assertEqual(area_liberty("NanGate15nm"), filename)
+        self.assertEqual(os.path.dirname(filename), cache_folder())
+        with open(filename) as file:
+            text = file.read()
+        areas = read_liberty_areas("NanGate15nm")
+        self.assertEqual(text.count("cell ("), len(areas))
+        for cell, area in areas.items():
+            self.assertIn(f"cell ({cell}) {{ area : {area!r}; }}", text)
+
+    def test_session(self):
+        circuit = build_circuit(MUL8)
+        listing = os.path.join(WORKDIR, "modules.txt")
+        session = YosysSession()
+        try:
+            loaded = session.load("mul8",
+                f'read_verilog "{os.path.abspath(circuit.netl_file)}"')
+            # a saved design is not created again
+            self.assertEqual(session.load("mul8", "read_verilog missing.v"),
+                loaded)
+            session.run(f'{loaded}\ntee -q -o "{listing}" ls')
+            with open(listing) as file:
+                self.assertIn(circuit.topmodule, file.read())
+            # every script starts with an empty design
+            session.run(f'tee -q -o "{listing}" ls')
+            with open(listing) as file:
+                self.assertNotIn(circuit.topmodule, file.read())
+        finally:
+            session.close()
+        if session.process is not None:
+            self.assertTrue(session.finished())
+            with self.assertRaises(RuntimeError):
+                session.run("ls")
+
+    def test_sessions(self):
+        session = yosys_session()
+        self.assertIs(yosys_session(), session)
+        # every thread has its own session
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(yosys_session()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(sessions[0], session)
+        sessions[0].close()
+
+    def test_ys_get_area(self):
+        circuit = build_circuit(MUL8)
+        folder = tempfile.mkdtemp(dir=WORKDIR)
+        try:
+            area = ys_get_area(circuit.netl_file, "NanGate15nm",
+                circuit.topmodule, folder)
+            self.assertAlmostEqual(area, circuit.get_area(), places=4)
+            # the log file of yosys is removed
+            self.assertEqual(os.listdir(folder), [])
+        finally:
+            shutil.rmtree(folder)
+
+    def test_resynth(self):
+        circuit = build_circuit(MUL8)
+        dataset, _ = exhaustive_dataset(circuit)
+        expected = circuit.simulate_native(dataset)
+        circuit.resynth()
+        np.testing.assert_array_equal(circuit.simulate_native(dataset),
+            expected)
+
+@requires_yosys
+class PowerTest(unittest.TestCase):
+    '''
+    Compares the incremental `PowerModel` of a circuit with a model built
+    again after every change
+    '''
+
+    def setUp(self):
+        self.circuit = build_circuit(MUL8)
+        self.nodes = sorted(self.circuit.get_circuit_nodes())
+
+    def annotate(self):
+        # toggle counts like the ones written by saif_parser
+        graph = self.circuit.graph
+        generator = np.random.default_rng(6)
+        for name in graph.wire_names:
+            element = graph.output_element(name)
+            if element is None:
+                element = graph.ports.get(name)
+            if element is not None:
+                element.set("tc", str(generator.integers(1, 500)))
+
+    def fresh(self):
+        model = PowerModel(self.circuit, 1e-6)
+        self.circuit.remove_observer(model.update)
+        return model.total
+
+    def test_leakage(self):
+        liberty = self.circuit.technology.liberty
+        scale = liberty.scale("leakage_power_unit")
+        leakage = lambda: sum(liberty.cells[self.circuit.get_node(n)
+            .get("name")].leakage * scale for n in self.nodes
+            if self.circuit.get_node(n).get("delete") != "yes")
+        self.assertAlmostEqual(self.circuit.get_power(), leakage(),
+            delta=1e-15)
+        self.circuit.delete(self.nodes[3])
+        self.assertAlmostEqual(self.circuit.get_power(), leakage(),
+            delta=1e-15)
+
+    def test_incremental(self):
+        self.annotate()
+        initial = self.circuit.get_power(1e-6)
+        self.assertAlmostEqual(initial, self.fresh(), delta=initial * 1e-9)
+        generator = np.random.default_rng(7)
+        deleted = []
+        for _ in range(40):
+            if deleted and generator.random() < 0.3:
+                self.circuit.undodelete(deleted.pop(
+                    generator.integers(len(deleted))))
+            else:
+                node = self.nodes[generator.integers(len(self.nodes))]
+                if node not in deleted:
+                    self.circuit.delete(node)
+                    deleted.append(node)
+            self.assertLess(self.circuit.power.evaluated, len(self.nodes))
+            self.assertAlmostEqual(self.circuit.get_power(1e-6),
+                self.fresh(), delta=initial * 1e-9)
+        for node in deleted:
+            self.circuit.undodelete(node)
+        self.assertAlmostEqual(self.circuit.get_power(1e-6), initial,
+            delta=initial * 1e-9)
+        # a new duration builds the model again
+        self.assertAlmostEqual(self.circuit.get_power(2e-6) * 2,
+            initial + self.circuit.power.leakage.sum(), delta=initial * 1e-9)
+
+@requires_yosys
+class TimingTest(unittest.TestCase):
+    '''
+    Compares the incremental `TimingModel` of a circuit with a model built
+    again after every change
+    '''
+
+    def setUp(self):
+        self.circuit = build_circuit(MUL8)
+        self.nodes = sorted(self.circuit.get_circuit_nodes())
+
+    def assertFresh(self):
+        timing = self.circuit.timing
+        fresh = TimingModel(self.circuit)
+        self.circuit.remove_observer(fresh.update)
+        self.assertAlmostEqual(self.circuit.get_delay(), fresh.delay)
+        np.testing.assert_allclose(timing.arrival, fresh.arrival)
+        np.testing.assert_allclose(timing.slew, fresh.slew)
+
+    def test_critical_path(self):
+        delay, path = self.circuit.get_delay(path=True)
+        self.assertGreater(delay, 0)
+        graph = self.circuit.graph
+        ids = [graph.node_ids[n] for n in path]
+        self.assertGreater(len(ids), 3)
+        for driver, reader in zip(ids, ids[1:]):
+            self.assertIn(reader, graph.children(driver))
+
+    def test_incremental(self):
+        initial = self.circuit.get_delay()
+        generator = np.random.default_rng(8)
+        deleted = []
+        for _ in range(40):
+            if deleted and generator.random() < 0.3:
+                self.circuit.undodelete(deleted.pop(
+                    generator.integers(len(deleted))))
+            else:
+                node = self.nodes[generator.integers(len(self.nodes))]
+                if node not in deleted:
+                    self.circuit.delete(node)
+                    deleted.append(node)
+            self.assertFresh()
+        for node in deleted:
+            self.circuit.undodelete(node)
+        self.assertAlmostEqual(self.circuit.get_delay(), initial)
+        # a node on the critical path is deleted and restored
+        node = self.circuit.get_delay(path=True)[1][-1]
+        self.circuit.delete(node)
+        self.assertFresh()
+        self.assertLess(self.circuit.timing.evaluated, len(self.nodes))
+        self.circuit.undodelete(node)
+        self.assertAlmostEqual(self.circuit.get_delay(), initial)
+
+@requires_yosys
+class SimplifyTest(unittest.TestCase):
+    '''
+    Checks that `Circuit.simplify` keeps the outputs of the circuit with its
+    deletions
+    '''
+
+    def setUp(self):
+        self.circuit = build_circuit(MUL8)
+        self.dataset, _ = exhaustive_dataset(self.circuit)
+        self.nodes = sorted(self.circuit.get_circuit_nodes())
+
+    def simplify(self, deletion_set):
+        for node in deletion_set:
+            self.circuit.delete(node)
+        expected = self.circuit.simulate_native(self.dataset)
+        area = self.circuit.get_area()
+        stats = self.circuit.simplify()
+        np.testing.assert_array_equal(
+            self.circuit.simulate_native(self.dataset), expected)
+        self.assertFalse(self.circuit.graph.deleted().any())
+        self.assertLessEqual(self.circuit.get_area(), area)
+        # the written netlist is read by yosys with the same area
+        self.assertAlmostEqual(self.circuit.get_area(),
+            self.circuit.get_area("yosys"), places=4)
+        return stats
+
+    def test_exact(self):
+        nodes = len(self.nodes)
+        stats = self.simplify([])
+        self.assertEqual(stats["deleted"], 0)
+        self.assertLessEqual(len(self.circuit.get_circuit_nodes()), nodes)
+
+    def test_deletions(self):
+        stats = self.simplify(self.nodes[10:60:5])
+        self.assertEqual(stats["deleted"], 10)
+        self.assertLess(len(self.circuit.get_circuit_nodes()),
+            len(self.nodes) - 10)
+        # a second pass has nothing left to remove
+        before = self.circuit.write_to_disk(in_memory="str")
+        self.simplify([])
+        self.assertEqual(self.circuit.write_to_disk(in_memory="str"), before)
+
+class TechnologyTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.technology = Technology("NanGate15nm")
+        cls.cells = {cell.name: cell for cell in cls.technology.cells}
+
+    def test_known_truth_tables(self):
+        # bit k of a table is the output for the inputs of row k
+        self.assertEqual(self.cells["AND2_X1"].truth_tables, {"Z": 0b1000})
+        self.assertEqual(self.cells["INV_X1"].truth_tables, {"ZN": 0b01})
+        self.assertEqual(self.cells["FA_X1"].truth_tables,
+            {"S": 0x96, "CO": 0xE8})
+
+    def test_liberty_functions(self):
+        tables = lambda *functions: truth_tables(
+            compile_functions(("A", "B", "C"), functions), 3)
+        self.assertEqual(tables("A + B * C"), tables("A | (B & C)"))
+        self.assertEqual(tables("A B' ^ C"), tables("A & (!B ^ C)"))
+        self.assertEqual(tables("!(A | B) & 1", "0"), [0x11, 0])
+        with self.assertRaises(ValueError):
+            compile_functions(("A",), ("A & D",))
+
+    def test_functions_match_primitives(self):
+        compared = 0
+        for cell in self.technology.cells:
+            if cell.evaluate is None or not cell.primitives:
+                continue
+            primitives = tuple((g, tuple(o), tuple(i))
+                for g, o, i in cell.primitives)
+            udp_tables = tuple((g, self.technology.udps[g])
+                for g, _, _ in primitives if g in self.technology.udps)
+            evaluate = compile_primitives(tuple(cell.inputs),
+                tuple(cell.outputs), primitives, udp_tables)
+            self.assertEqual(
+                truth_tables(evaluate, len(cell.inputs)),
+                [cell.truth_tables[o] for o in cell.outputs], cell.name)
+            compared += 1
+        self.assertGreater(compared, 40)
+
+    def test_sequential_cells(self):
+        for name in ("DFFRNQ_X1", "LHQ_X1"):
+            self.assertIsNone(self.cells[name].evaluate)
+            self.assertFalse(self.cells[name].is_combinational())
+
+    def test_liberty_cell(self):
+        liberty = self.technology.liberty
+        self.assertEqual(liberty.scale("time_unit"), 1e-12)
+        self.assertEqual(liberty.scale("capacitive_load_unit"), 1e-15)
+        self.assertEqual(liberty.scale("leakage_power_unit"), 1e-12)
+        self.assertEqual(liberty.voltage, 0.8)
+
+        cell = liberty.cells["AND2_X1"]
+        self.assertEqual(cell.area, 0.294912)
+        self.assertEqual(cell.leakage, 15419.351876)
+        self.assertEqual(cell.leakage_states[0], ("!A1 & !A2", 8790.510919))
+        self.assertEqual(cell.functions(), {"Z": "(A1 & A2)"})
+        self.assertEqual(cell.pins["A1"].capacitance, 0.697988)
+        self.assertEqual(cell.pins["A1"].rise_capacitance, 0.738351)
+        self.assertEqual(self.cells["AND2_X1"].area, cell.area)
+
+        arc = cell.pins["Z"].timing[0]
+        self.assertEqual((arc.related_pin, arc.timing_sense),
+            (["A1"], "positive_unate"))
+        # the table points are returned as they are, between them the
+        # values are interpolated
+        table = arc.tables["cell_fall"]
+        self.assertAlmostEqual(table.lookup(0.4, 0.4), 2.546611)
+        self.assertAlmostEqual(table.lookup(3.75, 0.797632), 3.623167)
+        self.assertAlmostEqual(table.lookup(2.075, 0.4),
+            (2.546611 + 3.295482) / 2)
+        self.assertEqual(read_liberty_areas("NanGate15nm")["AND2_X1"],
+            cell.area)
+
+
 if __name__ == '__main__':
     unittest.main()
     
@@ -0,0 +1,310 @@
+import heapq
+
+import numpy as np
+
+
+# edges of a transition, indexes of the arrival and slew columns
+RISE, FALL = 0, 1
+
+# delay and slew tables of the transitions of an output
+EDGE_TABLES = (("cell_rise", "rise_transition"),
+    ("cell_fall", "fall_transition"))
+
+
+class TimingModel:
+    '''
+    Static timing analysis of a mapped circuit with the liberty NLDM tables
+
+    The nodes are evaluated in level order. The arrival time and the slew of
+    every output are the worst ones over the timing arcs of the cell, the
+    delay and the output slew of an arc are interpolated at the slew of its
+    input and the load of the output, for the rise and the fall transitions
+    separately. The unateness of the arcs decides which input transition
+    causes each output transition. The circuit inputs arrive at time 0 with
+    the `transition` slew.
+
+    The outputs of a deleted node and the wires assigned to a constant never
+    switch, so they do not take part in any path, and the load of the wires
+    read by a deleted node drops. The model observes the circuit, so after
+    `Circuit.delete` and `Circuit.undodelete` only the node, the drivers of
+    its inputs and their fanout cones are evaluated again, and the
+    propagation stops at the nodes whose outputs do not change.
+
+    Attributes
+    -----------
+    circuit : Circuit
+        analyzed circuit
+    graph : CircuitGraph
+        graph of the circuit when the model was created
+    transition : float
+        slew of the circuit inputs, in the time unit of the library
+    output_load : float
+        load of the circuit outputs, in the capacitive load unit of the
+        library
+    levels : numpy.ndarray
+        level of every node
+    loads : numpy.ndarray
+        capacitance read by every wire, in the capacitive load unit of the
+        library
+    arrival : numpy.ndarray
+        rise and fall arrival times of every wire, -inf if it never switches
+    slew : numpy.ndarray
+        rise and fall slews of every wire
+    delay : float
+        arrival time of the latest circuit output, in the time unit of the
+        library
+    evaluated : int
+        amount of nodes evaluated by the last update
+    '''
+
+    def __init__(self, circuit, transition=None, output_load=0.0):
+        '''
+        Computes the arrival times of every wire and starts observing the
+        circuit
+
+        Parameters
+        ----------
+        circuit : Circuit
+            circuit to analyze
+        transition : float
+            slew of the circuit inputs, by default the smallest slew of the
+            delay tables
+        output_load : float
+            load of the circuit outputs
+
+        Raises
+        ------
+        ValueError
+            if there is no liberty file or the circuit has a combinational
+            loop
+        '''
+        liberty = circuit.technology.liberty
+        if liberty is None:
+            raise ValueError(f"{circuit.tech_file} has no liberty file")
+        self.circuit = circuit
+        self.graph = graph = circuit.graph
+        self.output_load = output_load
+        self.levels = graph.levels()
+        wires_count = len(graph.wire_names)
+
+        # timing arcs of every node: (output entry, input entry, unateness,
+        # (edge, delay table, slew table, the tables share indexes) of every
+        # output transition)
+        node_count = len(graph)
+        self.arcs = [[] for _ in range(node_count)]
+        in_nodes = np.repeat(np.arange(node_count), np.diff(graph.in_ptr))
+        pins = [None] * len(graph.in_pins)
+        smallest = []
+        for n, name in enumerate(graph.node_names):
+            cell = liberty.cells.get(name)
+            if cell is None:
+                continue
+            begin, end = graph.in_ptr[n], graph.in_ptr[n + 1]
+            entries = {graph.in_pins[k]: k for k in range(begin, end)}
+            for k in range(begin, end):
+                pins[k] = cell.pins.get(graph.in_pins[k])
+            for k_out in range(graph.out_ptr[n], graph.out_ptr[n + 1]):
+                pin = cell.pins.get(graph.out_pins[k_out])
+                if pin is None:
+                    continue
+                for arc in pin.timing:
+                    if arc.timing_type != "combinational":
+                        continue
+                    edges = []
+                    for edge, (delay, slew) in enumerate(EDGE_TABLES):
+                        delay = arc.tables.get(delay)
+                        slew = arc.tables.get(slew)
+                        if delay is not None:
+                            edges.append((edge, delay, slew, slew is not None
+                                and slew.lists[:2] == delay.lists[:2]
+                                and slew.variables == delay.variables))
+                    for related in arc.related_pin:
+                        if related in entries:
+                            self.arcs[n].append((k_out, entries[related],
+                                arc.timing_sense, edges))
+                    smallest += [table.transitions()[0]
+                        for table in arc.tables.values()
+                        if len(table.transitions())]
+        if transition is None:
+            transition = min(smallest) if smallest else 0.0
+        self.transition = transition
+
+        self.in_sources = graph.source[graph.in_wires]
+        self.readers = [[] for _ in range(wires_count)]
+        for n, w in zip(in_nodes.tolist(), self.in_sources.tolist()):
+            if not self.readers[w] or self.readers[w][-1] != n:
+                self.readers[w].append(n)
+        self.pin_capacitance = np.array([0.0 if pin is None else
+            pin.capacitance for pin in pins])
+        self.in_nodes = in_nodes
+        self.outputs = graph.source[graph.circuit_outputs]
+
+        self.alive = ~graph.deleted()
+        self.loads = np.zeros(wires_count)
+        np.add.at(self.loads, self.in_sources,
+            self.pin_capacitance * self.alive[in_nodes])
+        self.loads[self.outputs] += output_load
+
+        self.arrival = np.full((wires_count, 2), -np.inf)
+        self.slew = np.zeros((wires_count, 2))
+        inputs = graph.source[graph.circuit_inputs]
+        self.arrival[inputs] = 0.0
+        self.slew[inputs] = transition
+        for w in graph.constant_wires:
+            self.arrival[w] = -np.inf
+        for n in np.argsort(self.levels, kind="stable").tolist():
+            for w, arrival, slew in self.evaluate(n):
+                self.arrival[w] = arrival
+                self.slew[w] = slew
+        self.delay = self.circuit_delay()
+
+        self.evaluated = 0
+        circuit.add_observer(self.update)
+
+    def evaluate(self, node_id):
+        '''
+        Returns the arrival times and slews of the outputs of a node
+
+        Returns
+        -------
+        array
+            (wire id, arrival, slew) of every output, the arrival and the slew
+            are (rise, fall) pairs
+        '''
+        graph = self.graph
+        results = []
+        begin, end = graph.out_ptr[node_id], graph.out_ptr[node_id + 1]
+        outputs = {k: [-np.inf, -np.inf, 0.0, 0.0] for k in range(begin, end)}
+        if self.alive[node_id]:
+            for k_out, k_in, sense, edges in self.arcs[node_id]:
+                w = self.in_sources[k_in]
+                arrivals, slews = self.arrival[w].tolist(), self.slew[w].tolist()
+                timing = outputs[k_out]
+                load = self.loads[graph.source[graph.out_wires[k_out]]]
+                for edge, delay_table, slew_table, shared in edges:
+                    for in_edge in input_edges(sense, edge):
+                        arrival = arrivals[in_edge]
+                        if arrival == -np.inf:
+                            continue
+                        segments = delay_table.segments(slews[in_edge], load)
+                        arrival += delay_table.interpolate(segments)
+                        if arrival > timing[edge]:
+                            timing[edge] = arrival
+                        if slew_table is None:
+                            continue
+                        slew = slew_table.interpolate(segments) if shared \
+                            else slew_table.lookup(slews[in_edge], load)
+                        if slew > timing[2 + edge]:
+                            timing[2 + edge] = slew
+        for k in range(begin, end):
+            timing = outputs[k]
+            results.append((graph.source[graph.out_wires[k]], timing[:2],
+                timing[2:]))
+        return results
+
+    def circuit_delay(self):
+        '''
+        Returns the arrival time of the latest circuit output, 0 if no output
+        switches
+        '''
+        if len(self.outputs) == 0:
+            return 0.0
+        delay = self.arrival[self.outputs].max()
+        return float(delay) if delay > -np.inf else 0.0
+
+    def update(self, node_id):
+        '''
+        Propagates the deletion or restoration of a node
+
+        Parameters
+        ----------
+        node_id : int
+            id of the node whose delete label changed
+        '''
+        graph = self.graph
+        alive = not graph.is_deleted(node_id)
+        self.evaluated = 0
+        if alive == self.alive[node_id]:
+            return
+        self.alive[node_id] = alive
+
+        # the loads of the wires read by the node change
+        begin, end = graph.in_ptr[node_id], graph.in_ptr[node_id + 1]
+        sign = 1 if alive else -1
+        np.add.at(self.loads, self.in_sources[begin:end],
+            sign * self.pin_capacitance[begin:end])
+        drivers = graph.driver[self.in_sources[begin:end]]
+        pending = {node_id, *drivers[drivers >= 0].tolist()}
+
+        # evaluate the cone in level order
+        heap = [(self.levels[n], n) for n in pending]
+        heapq.heapify(heap)
+        while heap:
+            _, node = heapq.heappop(heap)
+            if node not in pending:
+                continue
+            pending.discard(node)
+            self.evaluated += 1
+            for w, arrival, slew in self.evaluate(node):
+                if (self.arrival[w] == arrival).all() and \
+                    (self.slew[w] == slew).all():
+                    continue
+                self.arrival[w] = arrival
+                self.slew[w] = slew
+                for reader in self.readers[w]:
+                    if reader not in pending:
+                        pending.add(reader)
+                        heapq.heappush(heap, (self.levels[reader], reader))
+        self.delay = self.circuit_delay()
+
+    def critical_path(self):
+        '''
+        Returns the names of the nodes of the critical path, from the circuit
+        input to the latest circuit output
+        '''
+        graph = self.graph
+        if len(self.outputs) == 0 or self.arrival[self.outputs].max() == -np.inf:
+            return []
+        w, edge = np.unravel_index(
+            np.argmax(self.arrival[self.outputs]), (len(self.outputs), 2))
+        w = self.outputs[w]
+        path = []
+        while graph.driver[w] >= 0:
+            node_id = graph.driver[w]
+            path.append(graph.node_vars[node_id])
+            best = None
+            for k_out, k_in, sense, edges in self.arcs[node_id]:
+                if graph.source[graph.out_wires[k_out]] != w:
+                    continue
+                source = self.in_sources[k_in]
+                for delay_table in [e[1] for e in edges if e[0] == edge]:
+                    for in_edge in input_edges(sense, edge):
+                        arrival = self.arrival[source, in_edge]
+                        if arrival == -np.inf:
+                            continue
+                        arrival += delay_table.lookup(
+                            self.slew[source, in_edge], self.loads[w])
+                        if best is None or arrival > best[0]:
+                            best = (arrival, source, in_edge)
+            if best is None:
+                break
+            _, w, edge = best
+        return path[::-1]
+
+
+def input_edges(sense, edge):
+    '''
+    Returns the input transitions that cause a transition of an output
+
+    Parameters
+    ----------
+    sense : str
+        timing_sense of the arc: positive_unate, negative_unate or non_unate
+    edge : int
+        RISE or FALL transition of the output
+    '''
+    if sense == "positive_unate":
+        return (edge,)
+    if sense == "negative_unate":
+        return (1 - edge,)
+    return (RISE, FALL)
@@ -1,10 +1,9 @@
 
 from datetime import datetime
+from itertools import islice
 import random
 import string
 import numpy as np
-import math
-from random import uniform, gauss, triangular
 
 def get_name(length):
     timestamp = datetime.now().strftime("%H%M%S")
@@ -13,7 +12,63 @@ def get_name(length):
         unique += random.choice(string.ascii_letters)
     return f"{timestamp}{unique}"
 
-def get_random(bits: int, distribution='uniform', samples=1, **kwargs):
+# rows of every independent random stream of a dataset, see `random_columns`
+DATASET_CHUNK = 2**16
+
+# rows of every block of the stratified distribution, in a block every input
+# takes one value of each of STRATA intervals of the same size
+STRATA = 2**10
+
+# distributions that draw the columns of a dataset together
+LOW_DISCREPANCY = ('sobol', 'halton', 'stratified')
+
+# primitive polynomials (degree, coefficients) and initial direction numbers
+# of the dimensions 2 to 21 of the Sobol sequence, from the new-joe-kuo-6
+# table of S. Joe and F. Y. Kuo. Dimension 1 is the van der Corput sequence.
+SOBOL_DIRECTIONS = [
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)),
+    (5, 2, (1, 1, 5, 5, 17)),
+    (5, 4, (1, 1, 5, 5, 5)),
+    (5, 7, (1, 1, 7, 11, 19)),
+    (5, 11, (1, 1, 5, 1, 1)),
+    (5, 13, (1, 1, 1, 3, 11)),
+    (5, 14, (1, 3, 5, 5, 31)),
+    (6, 1, (1, 3, 3, 9, 7, 49)),
+    (6, 13, (1, 1, 1, 15, 21, 21)),
+    (6, 16, (1, 3, 1, 13, 27, 49)),
+    (6, 19, (1, 1, 1, 15, 7, 5)),
+    (6, 22, (1, 3, 1, 15, 13, 25)),
+    (6, 25, (1, 1, 5, 5, 19, 61)),
+    (7, 1, (1, 3, 7, 11, 23, 15, 103)),
+    (7, 4, (1, 3, 7, 13, 13, 15, 69)),
+]
+
+# base of every number format of a dataset
+FORMAT_BASES = {'x': 16, 'X': 16, 'd': 10, 'b': 2, 'o': 8}
+
+def value_limits(bits, **kwargs):
+    '''
+    Returns the lower and upper limit of the values of an input of some bits,
+    from the low_limit and high_limit parameters of `get_random`
+    '''
+    if 'low_limit' not in kwargs:
+        low_limit=0 #Lower threshold for generated numbers
+    else:
+        low_limit=min(int(kwargs['low_limit']),2**bits)
+    if 'high_limit' not in kwargs:
+        high_limit=2**bits #Upper threshold for the generated data
+    else:
+        high_limit=min(int(kwargs['high_limit']),2**bits)
+    if low_limit>=high_limit:
+        raise ValueError(f'Empty range of values [{low_limit},{high_limit})')
+    return low_limit, high_limit
+
+def get_random(bits: int, distribution='uniform', samples=1, rng=None, **kwargs):
     '''
 
     Generates samples of integer randomly distributed data.
@@ -27,59 +82,371 @@ def get_random(bits: int, distribution='uniform', samples=1, **kwargs):
             "gaussian" or "normal" for a normal distribution.
             "uniform" or "rectangular" for a uniform distribution.
             "triangular" for a triangular distribution.
+            The low-discrepancy distributions of `random_columns` draw all
+            the columns of a dataset together.
             TODO: Add more distributions
     samples: int
         Number of samples.
+    rng: numpy.random.Generator
+        Generator to draw the samples from, by default a new unseeded one.
 
     **kwargs (optional)
         median: int
             The center of the distribution (works only for certain distributions)
         std: int
-            Standard deviation of the destribution (only gaussian/normal distribution)
-        limits: int tuple
-            Lower and upper limit of the dataset. By default it takes the whole range of numbers: [0,2^n-1]
+            Standard deviation of the destribution (only gaussian/normal
+            distribution), also accepted as `variance`
+        low_limit, high_limit: int
+            Lower and upper limit of the dataset, the upper limit is not
+            included. By default it takes the whole range of numbers: [0,2^n-1]
 
     Returns
     -------
     data
-        Randomized data sampled from the specified random distribution
+        numpy array with the samples of the specified random distribution,
+        uint64 or object for more than 64 bits. Samples outside the limits of
+        the gaussian distribution are drawn again.
 
     '''
     '''Pasing kwargs'''
-    if 'low_limit' not in kwargs:
-        low_limit=0 #Lower threshold for generated numbers
-    else:
-        low_limit=np.min([kwargs['low_limit'],2**bits])
-    if 'high_limit' not in kwargs:
-        high_limit=2**bits #Upper threshold for the generated data
-    else:
-        high_limit=np.min([kwargs['high_limit'],2**bits])
+    low_limit, high_limit=value_limits(bits, **kwargs)
     if 'median' not in kwargs:
         median=(high_limit+low_limit)/2 #by default is centered at the mean
     else:
         median=kwargs['median']
-    if 'variance' not in kwargs:
-        variance=1
-    else:
-        variance=kwargs['variance']
+    std=kwargs.get('std', kwargs.get('variance', 1))
+    if rng is None:
+        rng=np.random.default_rng()
 
     '''Distributions case'''
-    data=[]
     if distribution in {'uniform', 'rectangular'}:
-        data=(int(math.floor(uniform(low_limit,high_limit))) for _ in range(samples))
+        if high_limit<=2**64:
+            return rng.integers(low_limit, high_limit, samples, dtype=np.uint64)
+        # draw 64 more bits than needed to make the modulo bias negligible
+        words=rng.integers(0, 2**32, (samples, (bits+95)//32), dtype=np.uint64)
+        data=np.zeros(samples, dtype=object)
+        for w in range(words.shape[1]):
+            data+=words[:, w].astype(object)<<(32*w)
+        return data%(high_limit-low_limit)+low_limit
     elif distribution=='triangular':
-        data=(int(math.floor(triangular(low_limit,high_limit,mode=median))) for _ in range(samples))
+        data=rng.triangular(low_limit, median, high_limit, samples)
     elif distribution in {'normal', 'gaussian'}:
-        while len(data)<samples:
-            random_value=int(math.floor(gauss(median,variance)))
-            if low_limit<=random_value<=high_limit:
-                data.append(random_value)
+        # rejection in batches of a fixed size, so the first samples do not
+        # depend on how many samples are requested
+        batches=[]
+        accepted=0
+        while accepted<samples:
+            batch=rng.normal(median, std, DATASET_CHUNK)
+            batch=batch[(batch>=low_limit)&(batch<high_limit)]
+            batches.append(batch)
+            accepted+=len(batch)
+        data=np.concatenate(batches)[:samples]
     else:
         raise ValueError(f'{distribution} is not a valid distribution name')
 
-    return data
+    data=np.clip(np.floor(data), low_limit, high_limit-1)
+    if high_limit<=2**64:
+        return data.astype(np.uint64)
+    return np.array([int(d) for d in data], dtype=object)
+
+def column_rng(seed, column, chunk):
+    '''
+    Returns the random generator of a chunk of DATASET_CHUNK rows of a
+    column of a dataset
+
+    Every chunk of every column has an independent stream derived from the
+    seed, so any range of rows can be generated on its own.
+
+    Parameters
+    ----------
+    seed: int
+        Seed of the whole dataset.
+    column: int
+        Index of the column.
+    chunk: int
+        Index of the chunk, row // DATASET_CHUNK.
+    '''
+    sequence=np.random.SeedSequence(seed, spawn_key=(column, chunk))
+    return np.random.Generator(np.random.PCG64(sequence))
+
+def random_columns(widths, samples, distribution='uniform', seed=None, start=0, **kwargs):
+    '''
+    Generates the rows of a random dataset in chunks
+
+    Rows `start` to `start+samples` are the same rows a single call from row 0
+    generates for the same seed, so shards of a dataset can be generated by
+    independent workers and concatenated.
+
+    Parameters
+    ----------
+    widths: array
+        Bitwidth of every column.
+    samples: int
+        Number of rows.
+    distribution: string
+        Name of the random distribution, see `get_random`.
+    seed: int
+        Seed of the dataset, by default a random one.
+    start: int
+        Index of the first row.
+    **kwargs:
+        Parameters of the distribution, see `get_random`.
+
+    The low-discrepancy distributions spread the rows over the whole input
+    space more evenly than independent uniform samples, so the mean errors
+    converge with fewer rows:
+        "sobol" for a Sobol sequence, with a random nested scrambling per
+        column. Up to 21 columns. Use a power of 2 of rows.
+        "halton" for a Halton sequence, with a random shift per column.
+        "stratified" for independent random columns where, in every block
+        of STRATA rows, the top bits of each column take every value the
+        same amount of times.
+    They take the low_limit and high_limit parameters.
+
+    Returns
+    -------
+    generator
+        lists with an array of values per column, of up to DATASET_CHUNK rows
+    '''
+    if seed is None:
+        seed=np.random.SeedSequence().entropy
+    if distribution=='sobol' and len(widths)>len(SOBOL_DIRECTIONS)+1:
+        raise ValueError(f'The sobol distribution supports up to {len(SOBOL_DIRECTIONS)+1} inputs, use halton or stratified')
+    row=start
+    while row<start+samples:
+        chunk=row//DATASET_CHUNK
+        skip=row-chunk*DATASET_CHUNK
+        rows=min(DATASET_CHUNK-skip, start+samples-row)
+        if distribution in LOW_DISCREPANCY:
+            yield [scale_fraction(unit_fractions(distribution, seed, c, chunk)[skip:skip+rows], *value_limits(bits, **kwargs))
+                for c, bits in enumerate(widths)]
+        else:
+            yield [get_random(bits, distribution, skip+rows, column_rng(seed, c, chunk), **kwargs)[skip:]
+                for c, bits in enumerate(widths)]
+        row+=rows
+
+def unit_fractions(distribution, seed, column, chunk):
+    '''
+    Returns the points of a column of a low-discrepancy distribution in a
+    chunk of DATASET_CHUNK rows, as 64 bit binary fractions of [0,1)
+
+    Parameters
+    ----------
+    distribution: string
+        "sobol", "halton" or "stratified", see `random_columns`.
+    seed: int
+        Seed of the dataset.
+    column: int
+        Index of the column, that is the dimension of the sequence.
+    chunk: int
+        Index of the chunk.
+
+    Returns
+    -------
+    numpy.ndarray
+        uint64 array of DATASET_CHUNK fractions
+    '''
+    index=np.arange(chunk*DATASET_CHUNK, (chunk+1)*DATASET_CHUNK, dtype=np.uint64)
+    # the randomization of the column is the same for every chunk
+    state=np.random.SeedSequence(seed, spawn_key=(column,)).generate_state(5, np.uint64)
+    shift=state[0]
+    if distribution=='sobol':
+        directions=sobol_directions(column)
+        gray=index^(index>>np.uint64(1))
+        fractions=np.zeros(DATASET_CHUNK, dtype=np.uint64)
+        for bit in range(int(gray.max()).bit_length()):
+            fractions^=np.where((gray>>np.uint64(bit))&np.uint64(1), directions[bit], np.uint64(0))
+        return nested_scramble(fractions, state)
+    if distribution=='halton':
+        base=nth_prime(column)
+        fractions=np.zeros(DATASET_CHUNK)
+        weight=1/base
+        while index.any():
+            fractions+=weight*(index%np.uint64(base))
+            index=index//np.uint64(base)
+            weight/=base
+        fractions=(fractions+shift/2**64)%1
+        return np.minimum(fractions*2**64, np.nextafter(2**64, 0)).astype(np.uint64)
+    if distribution=='stratified':
+        rng=column_rng(seed, column, chunk)
+        strata=rng.permuted(np.tile(np.arange(STRATA, dtype=np.uint64), (DATASET_CHUNK//STRATA, 1)), axis=1).ravel()
+        low_bits=64-(STRATA.bit_length()-1)
+        return (strata<<np.uint64(low_bits))|rng.integers(0, 2**low_bits, DATASET_CHUNK, dtype=np.uint64)
+    raise ValueError(f'{distribution} is not a low-discrepancy distribution')
+
+# bits of every byte value in reverse order
+REVERSED_BYTES=np.array([int(f'{b:08b}'[::-1], 2) for b in range(256)], dtype=np.uint8)
 
-def read_dataset(filename, base, max_lines=None):
+def reverse_bits(values):
+    '''
+    Reverses the order of the 64 bits of an uint64 array
+    '''
+    data=REVERSED_BYTES[np.ascontiguousarray(values, dtype=np.uint64).view(np.uint8)]
+    return data.reshape(-1, 8)[:, ::-1].copy().view(np.uint64).ravel()
+
+def nested_scramble(fractions, state):
+    '''
+    Randomizes 64 bit binary fractions with a hash based approximation of
+    Owen's nested uniform scrambling
+
+    Every bit is flipped depending on the bits above it, so the fractions
+    that shared an interval of size 2^-k still share one and the
+    stratification of a digital net is kept. Unlike a plain digital shift,
+    the scrambling does not align with the bitwise functions of a circuit.
+
+    Parameters
+    ----------
+    fractions: numpy.ndarray
+        uint64 fractions
+    state: numpy.ndarray
+        5 random uint64 words, the seed of the scrambling
+    '''
+    values=reverse_bits(fractions)+state[0]
+    for multiplier in state[1:]:
+        # even multipliers make bit k depend only on bits 0 to k
+        values^=values*(multiplier&~np.uint64(1))
+    return reverse_bits(values)
+
+def sobol_directions(column):
+    '''
+    Returns the 64 direction numbers of a dimension of the Sobol sequence, as
+    64 bit binary fractions
+
+    Examples
+    -------
+        >>> [int(v)>>60 for v in sobol_directions(1)[:4]]
+        [8, 12, 10, 15]
+    '''
+    if column==0:
+        numbers=[1]*64
+    else:
+        degree, coefficients, numbers=SOBOL_DIRECTIONS[column-1]
+        numbers=list(numbers)
+        for k in range(degree, 64):
+            m=numbers[k-degree]^(numbers[k-degree]<<degree)
+            for j in range(1, degree):
+                if (coefficients>>(degree-1-j))&1:
+                    m^=numbers[k-j]<<j
+            numbers.append(m)
+    return np.array([m<<(63-k) for k, m in enumerate(numbers)], dtype=np.uint64)
+
+def nth_prime(n):
+    '''
+    Returns the prime number n, starting at 2 for n=0
+    '''
+    primes=[]
+    candidate=2
+    while len(primes)<=n:
+        if all(candidate%p for p in primes if p*p<=candidate):
+            primes.append(candidate)
+        candidate+=1
+    return primes[n]
+
+def scale_fraction(fractions, low_limit, high_limit):
+    '''
+    Maps 64 bit binary fractions of [0,1) to integers of [low_limit,high_limit)
+
+    Examples
+    -------
+        >>> scale_fraction(np.array([0, 2**63, 2**64-1], dtype=np.uint64), 0, 16)
+        array([ 0,  8, 15], dtype=uint64)
+    '''
+    span=high_limit-low_limit
+    if span==1:
+        return np.full(len(fractions), low_limit, dtype=np.uint64 if high_limit<=2**64 else object)
+    if span&(span-1)==0 and high_limit<=2**64:
+        # the top bits of the fraction
+        values=fractions>>np.uint64(64-(span.bit_length()-1)) if span<2**64 else fractions.copy()
+        return values+np.uint64(low_limit)
+    if span<=2**53 and high_limit<=2**64:
+        values=np.floor((fractions>>np.uint64(11)).astype(float)*(span/2**53))
+        return np.minimum(values, span-1).astype(np.uint64)+np.uint64(low_limit)
+    return np.array([(int(f)*span>>64)+low_limit for f in fractions], dtype=object)
+
+def digit_count(bits, format):
+    '''
+    Returns the amount of digits of the largest number of some bits in a
+    format of FORMAT_BASES
+    '''
+    base=FORMAT_BASES[format]
+    return max(len(np.base_repr(2**bits-1, base)), 1) if bits<=64 \
+        else len(f'{2**bits-1:{format}}')
+
+def format_columns(columns, widths, format='x'):
+    '''
+    Formats the rows of some columns as text lines
+
+    Every number is written with the digits of the largest number of its
+    column, padded with zeros, and the columns are separated with spaces.
+
+    Parameters
+    ----------
+    columns: array
+        Array of values per column, all with the same length.
+    widths: array
+        Bitwidth of every column.
+    format: string
+        A format identifier of FORMAT_BASES.
+
+    Returns
+    -------
+    bytes
+        text of the rows
+
+    Examples
+    -------
+        >>> format_columns([np.array([10, 1]), np.array([3, 0])], [8, 2], 'x')
+        b'0a 3\\n01 0\\n'
+    '''
+    if format not in FORMAT_BASES:
+        raise ValueError(f'{format} is not a valid dataset format')
+    base=FORMAT_BASES[format]
+    symbols=np.frombuffer(b'0123456789ABCDEF' if format=='X' else b'0123456789abcdef', dtype=np.uint8)
+    digits=[digit_count(bits, format) for bits in widths]
+    samples=len(columns[0]) if columns else 0
+    text=np.full((samples, sum(digits)+len(digits)), ord(' '), dtype=np.uint8)
+    text[:, -1]=ord('\n')
+    position=0
+    for values, bits, count in zip(columns, widths, digits):
+        if bits<=64:
+            values=np.asarray(values).astype(np.uint64)
+            for d in range(count-1, -1, -1):
+                text[:, position+d]=symbols[values%np.uint64(base)]
+                values=values//np.uint64(base)
+        else:
+            lines=b''.join(f'{v:0{count}{format}}'.encode() for v in values)
+            text[:, position:position+count]=np.frombuffer(lines, dtype=np.uint8).reshape(samples, count)
+        position+=count+1
+    return text.tobytes()
+
+def write_dataset(filename, widths, samples, distribution='uniform', seed=None, start=0, format='x', **kwargs):
+    '''
+    Writes a random dataset with a column per circuit input
+
+    Parameters
+    ----------
+    filename: string
+        Path to the dataset file, it is overwritten.
+    widths: array
+        Bitwidth of every column.
+    samples: int
+        Number of rows.
+    distribution: string
+        Name of the random distribution, see `get_random`.
+    seed: int
+        Seed of the dataset, by default a random one.
+    start: int
+        Index of the first row, see `random_columns`.
+    format: string
+        A format identifier of FORMAT_BASES.
+    **kwargs:
+        Parameters of the distribution, see `get_random`.
+    '''
+    with open(filename, 'wb') as file:
+        for columns in random_columns(widths, samples, distribution, seed, start, **kwargs):
+            file.write(format_columns(columns, widths, format))
+
+def read_dataset(filename, base=16, max_lines=None):
     """
     Reads a dataset or circuit output file like those generated by the
     `Circuit.generate_dataset` file or `Circuit.exact_output`.
@@ -96,12 +463,17 @@ def read_dataset(filename, base, max_lines=None):
     max_lines : None | int
         The maximum amount of lines to read, in case the user doesn't want to
         use the entire dataset.
+
+    Returns
+    -------
+    numpy.ndarray
+        matrix with a row per line and a column per number, uint64 or object
+        if some number has more than 64 bits
     """
     with open(filename, "r") as f:
-        if max_lines is not None:
-            return [
-                [int(x, base) for x in line.split()]
-                for _, line in zip(range(max_lines), f)
-            ]
-        else:
-            return [[int(x, base) for x in line.split()] for line in f]
+        lines = f if max_lines is None else islice(f, max_lines)
+        rows = [[int(x, base) for x in line.split()] for line in lines
+            if not line.isspace()]
+    dtype = np.uint64 if all(v < 2**64 for row in rows for v in row) \
+        else object
+    return np.array(rows, dtype=dtype)